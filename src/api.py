@@ -1,21 +1,22 @@
-from src.tools.config_loader import Configuration
+from src.tools.config_loader import current_config, use_config, override
 import pandas as pd
 from src.curveproduction.geo_distribution_data import CostDistribution, column_map_pp, column_map_cement, \
     column_map_iron
 from src.scenarios.scenario_development import create_index_for_scenario_mapping
 from src.harmonize import harmonization
 from src.assumptions import create as cost_values
-from src.homogenize import create_power_plant_file, create_cost_potential_curve_pp_input
+from src.homogenize import create_power_plant_file, create_cost_potential_curve_pp_input, update_power_plant_files
+from src.homogenization.snapshots import SnapshotStore
 from src.homogenization.cost_of_carbon_capture_iron import create as iron_and_steel
 from src.homogenization.cost_of_carbon_capture_cement import create as cement
 from src.curveproduction.cost_potential_curve import CostCurve
-import warnings
+from src.sensitivity.grid import PlantTable
+from src.sensitivity.montecarlo import run_monte_carlo
+from src.sensitivity.tornado import run_tornado
+from src.sensitivity.sobol import run_sobol
+from src.tools.pipeline import Pipeline, Stage
+from src.tools.tabular import read_table
 import logging
-from matplotlib import rc
-
-rc('text', usetex=False)
-config = Configuration.get_instance()
-io = config["IO"]
 
 logging.basicConfig(
     format='%(asctime)s %(levelname)-8s %(message)s',
@@ -23,31 +24,101 @@ logging.basicConfig(
     datefmt='%Y-%m-%d %H:%M:%S')
 
 
-def initialize(industrial=config["InputHomogenization"]["IncludeIndustrial"]):
+INDEX_SOURCES = ["ihs_path", "cepci_path", "coalidx_path", "eurusd_path", "ngidx_path"]
+
+
+def pipeline_stages(industrial=True):
     """
-    Produces the datasets by executing the main steps of data processing framework
+    Main steps of the data processing framework with the files and configuration values each of them reads
+    :param industrial: If True the iron and steel and cement stages are included
+    :return: List of stages
+    """
+    stages = [
+        Stage("harmonization", harmonization,
+              inputs=["harmonization_input_path", "harmonization_fuels_defalut_path"] + INDEX_SOURCES,
+              outputs=["harmonization_df_output_path", "harmonization_fingerprint_path"],
+              config_keys=[("HarmonizationTool", "Options"), ("HarmonizationTool", "FuelEquivalentNames"),
+                           ("InputConfig", "index")]),
+        Stage("cost_values", cost_values,
+              inputs=["harmonization_df_output_path"],
+              outputs=["harmonization_output_assumption_path", "harmonization_output_regression_path"]),
+        Stage("power_plant_file", create_power_plant_file,
+              inputs=["LOCAL_PPM_PATH", "LOCAL_OPSD_DE_PATH"],
+              outputs=["processed_pp_input_path"],
+              config_keys=[("InputHomogenization", "RegressionConfig"), ("InputHomogenization", "RandomForest"),
+                           ("InputHomogenization", "HistGradientBoosting"), ("InputHomogenization", "IncludeBio"),
+                           ("InputHomogenization", "FillYear"), ("InputHomogenization", "Snapshots")],
+              retries=1),
+        Stage("power_plant_cost", create_cost_potential_curve_pp_input,
+              inputs=["processed_pp_input_path", "harmonization_output_assumption_path",
+                      "harmonization_output_regression_path", "harmonization_fuels_defalut_path"] + INDEX_SOURCES,
+              outputs=["cc_pp_output_path"],
+              config_keys=[("InputHomogenization", "CostLevel"), ("InputHomogenization", "HRLevel"),
+                           ("InputHomogenization", "CostMatching"), ("InputHomogenization", "CostOfCCConfig"),
+                           ("InputHomogenization", "FuelCorrection"), ("InputHomogenization", "IncludeBio"),
+                           ("InputHomogenization", "RegressionConfig"), ("HarmonizationTool", "Options"),
+                           ("InputConfig", "index")])]
+    if industrial:
+        stages += [
+            Stage("iron_and_steel", iron_and_steel,
+                  inputs=["IRON_INPUT_PATH"] + INDEX_SOURCES,
+                  outputs=["steel_output_path"],
+                  config_keys=[("InputHomogenization", "SteelMethod"), ("HarmonizationTool", "Options"),
+                               ("InputConfig", "iron"), ("InputConfig", "index")],
+                  ignore_warnings=True),
+            Stage("cement", cement,
+                  inputs=["CEMENT_INPUT_PATH"] + INDEX_SOURCES,
+                  outputs=["cement_output_path"],
+                  config_keys=[("InputHomogenization", "CementMethod"), ("InputHomogenization", "CostOfCCConfig"),
+                               ("HarmonizationTool", "Options"), ("InputConfig", "iron"), ("InputConfig", "index")],
+                  ignore_warnings=True)]
+    return stages
+
+
+def initialize(industrial=None, force=False, config=None):
+    """
+    Produces the datasets by executing the main steps of data processing framework, the steps whose input files and
+    configuration values did not change since their last run are skipped or restored from the cache. The steps that
+    do not depend on each other are executed in parallel processes
+    :param industrial: If True the iron and steel and cement datasets are produced, by default it is configured
+    :param force: If True every step is executed
+    :param config: ConfigSnapshot the steps are executed with, by default the current configuration
+    :return: List with the names of the executed steps
+    """
+    config = current_config() if config is None else config
+    io = config["IO"]
+    if industrial is None:
+        industrial = config["InputHomogenization"]["IncludeIndustrial"]
+    pipeline = Pipeline(pipeline_stages(industrial), io, config, io["pipeline_cache_path"],
+                        io["pipeline_manifest_path"], config["Pipeline"]["KeepArtifacts"],
+                        config["Pipeline"]["Workers"])
+    return pipeline.run(force)
+
+
+def update_harmonization():
     """
-    logging.info("Starting harmonization")
-    harmonization()
+    Harmonizes only the new or changed studies of the harmonization input and refreshes the assumption and
+    regression maps with the merged result
+    """
+    logging.info("Updating harmonization")
+    harmonization(incremental=True)
     logging.info("Calculating cost values")
     cost_values()
-    logging.info("Creating power plant input file")
-    try:
-        create_power_plant_file()
-    except ValueError:
-        msg = "There was an initialization error, please run again"
-        logging.error(msg)
-
-    logging.info("Creating power plant cost potential file")
-    create_cost_potential_curve_pp_input()
-    if industrial:
-        with warnings.catch_warnings():
-            warnings.simplefilter("ignore")
-            logging.info("Creating iron and steel cost potential file")
-            iron_and_steel()
-            logging.info("Creating cement cost potential file")
-            cement()
-    return
+
+
+def update_power_plants(old_snapshot, new_snapshot, config=None):
+    """
+    Refreshes the power plant files for a new PPM snapshot, only the plants that changed since the old snapshot are
+    recalculated. The new snapshot is pinned for the update
+    :param old_snapshot: Id of the PPM snapshot the power plant files were created from
+    :param new_snapshot: Id of the new PPM snapshot
+    :param config: ConfigSnapshot, by default the current configuration
+    :return: Index of the ids of the recalculated plants
+    """
+    config = current_config() if config is None else config
+    changes = SnapshotStore(config["IO"]["snapshot_store_path"]).diff(old_snapshot, new_snapshot)
+    logging.info(changes)
+    return update_power_plant_files(changes, config.override(new_snapshot, "InputHomogenization", "Snapshots", "PPM"))
 
 
 custom_map = {"id": "index",
@@ -71,14 +142,18 @@ def column_maps(source):
     return loader_map[source]
 
 
-def loader(source):
+def loader(source, filters=None):
     """
-    Generic csv loading
+    Generic loading of the datasets, the stored index is returned as a column
+    :param source: Name of the dataset
+    :param filters: Filters in the form [("Country", "in", ["Germany"])], the partitions that do not match are not read
     """
+    io = current_config()["IO"]
     loader_map = {"power_plant": io["cc_pp_output_path"],
                   "cement": io["cement_output_path"],
                   "iron": io["steel_output_path"]}
-    return pd.read_csv(loader_map[source])
+    df = read_table(loader_map[source], filters=filters)
+    return df.reset_index() if df.index.name is not None else df
 
 
 def matcher(source):
@@ -159,14 +234,20 @@ def aggregate_nuts(distribution, level):
     return distribution
 
 
-def cost_potential_distribution(sources="basic", territories="Europe", agg_nuts_level=-1):
+def cost_potential_distribution(sources="basic", territories="Europe", agg_nuts_level=-1, config=None):
     """
     Wrapper function to generate a cost potential distribution
     :param sources: List or string of distributions
     :param territories: Geographical labels of the desired territories, if "Europe" will take all
     :param agg_nuts_level: NUTS level aggregation, if -1 no aggregation will be perfomed
+    :param config: ConfigSnapshot, by default the current configuration
     :return: CostDistribution with the desired parameters
     """
+    with use_config(config):
+        return _cost_potential_distribution(sources, territories, agg_nuts_level)
+
+
+def _cost_potential_distribution(sources, territories, agg_nuts_level):
     # import sources
 
     joined = create_joined_data(sources)
@@ -187,6 +268,58 @@ def cost_potential_distribution(sources="basic", territories="Europe", agg_nuts_
     return distribution
 
 
+def sensitivity_grid(grid, config=None):
+    """
+    Cost of carbon capture of the power plants for every combination of the parameter values of the grid, the power
+    plant input is loaded and matched once
+    :param grid: Dictionary of parameter names to lists of values, e.g. {"cost": ["range_low", "range_high"],
+    "capefficiency": [0.8, 0.9]}, the names are the keys of src.sensitivity.grid.PARAMETERS
+    :param config: ConfigSnapshot of the parameters that are not in the grid, by default the current configuration
+    :return: GridResult with the variants, the costs and amounts and their CostDistributions
+    """
+    return PlantTable.from_file(config).run(grid)
+
+
+def cost_curve_uncertainty(samples=None, config=None):
+    """
+    Monte Carlo percentile bands of the cost potential curve of the power plants, the uncertain parameters are sampled
+    from the assumption and regression maps and the bounds of the Sensitivity configuration
+    :param samples: Number of samples, by default the configured one
+    :param config: ConfigSnapshot, by default the current configuration
+    :return: MonteCarloResult, its bands method gives the P5, P50 and P95 cost at each cumulative amount
+    """
+    config = current_config() if config is None else config
+    return run_monte_carlo(PlantTable.from_file(config), samples, config=config)
+
+
+def tornado_analysis(bounds=None, price=None, target=None, config=None):
+    """
+    One at a time sensitivity of the cost potential of the power plants
+    :param bounds: Dictionary of parameter names to low and high values, by default the configured bounds
+    :param price: Price the capturable amount is reported at, by default the configured one
+    :param target: Amount the cost is reported at, by default the configured one
+    :param config: ConfigSnapshot with the reference values, by default the current configuration
+    :return: TornadoResult, its table method gives the change of each metric for the low and high bounds
+    """
+    config = current_config() if config is None else config
+    return run_tornado(PlantTable.from_file(config), bounds, price, target, config)
+
+
+def sobol_analysis(samples=None, industrial=None, config=None):
+    """
+    First order and total Sobol indices of the parameters of the cost models for the capturable amount below a price
+    and the cost at a target amount
+    :param samples: Number of base samples, by default the configured one
+    :param industrial: If True the cement and iron and steel plants are included, by default it is configured
+    :param config: ConfigSnapshot, by default the current configuration
+    :return: SobolResult, its table method gives the indices of each metric
+    """
+    config = current_config() if config is None else config
+    if industrial is None:
+        industrial = config["InputHomogenization"]["IncludeIndustrial"]
+    return run_sobol(PlantTable.from_file(config), samples, industrial, config=config)
+
+
 def scenario_development_one_hot_encoded(sources, scenarios, territory="Europe"):
     """
     Creates a dataframe with the operation of a production facility encoded to its activity in the given
@@ -242,7 +375,7 @@ def produce_scenario_collection(df, scenario, ax):
 
 
 if __name__ == '__main__':
-    config.set_value("range_high", "InputHomogenization", "CostLevel")
-    initialize()
-    Distribution = cost_potential_distribution(["gas", "iron", "cement"], agg_nuts_level=-1)
+    with override("range_high", "InputHomogenization", "CostLevel"):
+        initialize()
+        Distribution = cost_potential_distribution(["gas", "iron", "cement"], agg_nuts_level=-1)
     Distribution.plot()
@@ -1,18 +1,10 @@
 import pandas as pd
 import numpy as np
-from scipy.stats import describe, trim_mean, t
-from sklearn.linear_model import LinearRegression
-import matplotlib.pyplot as plt
-from matplotlib import rc
-import seaborn as sns
-import statsmodels.api as sm
-from src.tools.config_loader import Configuration
-
-config = Configuration.get_instance()
-rc('font', **{'family': 'serif', 'serif': ['Palatino']})
-rc('text', usetex=True)
+from src.tools.config_loader import use_config
+from src.tools.tabular import read_table
+import logging
+
 pd.set_option('display.max_columns', None)
-io = config["IO"]
 
 columns = ["fuel_type", "value", "range_low", "range_high", "reference_value", "units"]
 values = ["delta_capex", "delta_om", "delta_heatrate"]
@@ -49,6 +41,7 @@ def value_stats(values):
     :param bot_per: lower percentile to be considered, default is 25
     :return: mean of the mix of values, trimmed mean with 50% of the values, standard deviation of the mix, top and bottom percentile values
     """
+    from scipy.stats import describe, trim_mean, t
     stats = describe(values)
     mean = stats.mean
     std = np.sqrt(stats.variance)
@@ -68,7 +61,7 @@ def prepare_dataframe(input_path, index_col="label"):
     :param index_col: Name of the index column
     :return: DataFrame with delta values
     """
-    df = pd.read_csv(input_path, index_col=index_col)
+    df = read_table(input_path, index_col=index_col)
     df = df[df.power_technology != "IGCC"]
     df = df[df.region != "China"]
 
@@ -117,6 +110,7 @@ def heat_rate_regression(df, x_cols, y_col):
     :param y_col: Objective column of the regression
     :return: regression model
     """
+    from sklearn.linear_model import LinearRegression
     df = df[~ np.isnan(df[y_col])]
     for col in x_cols:
         df = df[~ np.isnan(df[col])]
@@ -133,6 +127,7 @@ def other_regression(df, x_cols, y_col):
     """
     Alternative regression model, this time using statsmodel
     """
+    import statsmodels.api as sm
     df = df[~ np.isnan(df[y_col])]
     for col in x_cols:
         df = df[~ np.isnan(df[col])]
@@ -173,6 +168,9 @@ def _box_plot_deltas(df, ax, value, fuel, label, retrofit=True):
     """
     Plot deltas as boxplots
     """
+    from scipy.stats import describe, t
+    import matplotlib.pyplot as plt
+    import seaborn as sns
     if retrofit:
         values = df[(df.retrofit) & (df.fuel_type == fuel)][value].dropna().values
     else:
@@ -211,6 +209,10 @@ def _regression_to_latex(regression_map):
 
 
 def _create_plots(df):
+    import matplotlib.pyplot as plt
+    from matplotlib import rc
+    rc('font', **{'family': 'serif', 'serif': ['Palatino']})
+    rc('text', usetex=True)
     params = [("delta_capex", "natural_gas", "CAPEX from implementing CO2 capture [€/KW]", False),
               ("delta_capex", "coal", "CAPEX from implementing CO2 capture [€/KW]", True),
               ("delta_om", "natural_gas", "Specific OM costs from implementing CO2 capture [€/KWh]", False),
@@ -223,16 +225,17 @@ def _create_plots(df):
         figs.append(fig)
     plt.show()
 
-def create():
-    df = prepare_dataframe(io["harmonization_df_output_path"], index_col="label")
-    assumption_map = create_assumption_map(columns, df)
-    assumption_map.to_csv(io["harmonization_output_assumption_path"], index = False)
-
 
-def create():
+def create(config=None):
     """
     Main function to create the assumption maps as csv files.
+    :param config: ConfigSnapshot, by default the current configuration
     """
+    with use_config(config) as config:
+        _create(config["IO"])
+
+
+def _create(io):
     df = prepare_dataframe(io["harmonization_df_output_path"], index_col="label")
     assumption_map = create_assumption_map(columns, df)
     assumption_map.to_csv(io["harmonization_output_assumption_path"], index=False)
@@ -243,7 +246,7 @@ def create():
     res = other_regression(df[df["fuel_type"] == "coal"], ["heat_rate"], "delta_heatrate")
     regression_map["intersect_err"] = res.bse[0]
     regression_map["slope_err"] = res.bse[1]
-    print(regression_map)
+    logging.info("Heat rate regression map:\n%s", regression_map)
     regression_map.to_csv(io["harmonization_output_regression_path"], index=False)
 
 
@@ -1,6 +1,5 @@
 from src.curveproduction.geo_distribution_data import CostDistribution
 from src.tools.algorithms import list_combination
-import matplotlib.pyplot as plt
 import numpy as np
 
 
@@ -26,6 +25,7 @@ class CurveCollection:
         return collection
 
     def plot(self, ax=None):
+        import matplotlib.pyplot as plt
         if ax:
             ax = ax
         else:
@@ -35,6 +35,7 @@ class CurveCollection:
 
     @staticmethod
     def plot_curve_collection(ax, *collection):
+        import matplotlib.pyplot as plt
         lines = ["solid", "dashdot", "dotted", "dashed"]
         regions = set([curve.metadata["region"] for curve in collection])
         colors = get_cmap(len(regions))
@@ -171,4 +172,5 @@ class ScenarioCollection(CurveCollection):
 def get_cmap(n, name='Paired'):
     """Returns a function that maps each index in 0, 1, ..., n-1 to a distinct
     RGB color; the keyword argument name must be a standard mpl colormap name."""
+    import matplotlib.pyplot as plt
     return plt.cm.get_cmap(name, n)
@@ -1,21 +1,15 @@
-from src.tools.config_loader import Configuration
+from src.tools.config_loader import current_config
 from src.homogenization.data_operations import DataSource
-from src.curveproduction.plot import plot_point_distribution
-import geopandas as gpd
+from src.tools.tabular import FORMATS, read_table, write_table, is_geo_table
+from pathlib import Path
 import pandas as pd
-import matplotlib.pyplot as plt
 import warnings
-config = Configuration.get_instance()
+import os
 pd.set_option('display.max_columns', None)
-io = config["IO"]
-costcurveconfig = config["CostCurveConfig"]
-
-nuts_paths = {0: io["countries_borders_path"],
-              1: io["nuts_1_path"],
-              2: io["nuts_2_path"],
-              3: io["nuts_3_path"]}
-
-test_output_path = io["test_output_csv"]
+NUTS_KEYS = {0: "countries_borders_path",
+             1: "nuts_1_path",
+             2: "nuts_2_path",
+             3: "nuts_3_path"}
 
 DEFAULT_COLUMNS = ["id", "source", "geographical_label", "year", "production_capacity", "amount", "cost"]
 
@@ -51,7 +45,8 @@ column_map_iron = {"id": "ID",
 
 
 def poly_case(case):
-    poly = gpd.read_file(nuts_paths[case])
+    import geopandas as gpd
+    poly = gpd.read_file(current_config()["IO"][NUTS_KEYS[case]])
     if case == 0:
         ID = "NUTS_ID"
     else:
@@ -61,6 +56,7 @@ def poly_case(case):
 
 
 def do_geographical_join_nuts(data, level=0):
+    import geopandas as gpd
     assert isinstance(data, gpd.GeoDataFrame), "input must be a GeoDataFrame with points"
 
     poly = poly_case(level)
@@ -68,6 +64,51 @@ def do_geographical_join_nuts(data, level=0):
     return joined
 
 
+def nuts_fingerprint(level):
+    """
+    Modification time and size of the regions file of a NUTS level, the cached assignments of a level are dropped
+    when its file changes
+    """
+    stat = Path(current_config()["IO"][NUTS_KEYS[level]]).stat()
+    return "{}-{}".format(stat.st_mtime_ns, stat.st_size)
+
+
+def cached_nuts_assignments(points, level, cache_path=None):
+    """
+    NUTS regions of point coordinates. Only the coordinates that are not in the assignment cache yet are joined with
+    the regions, the cache is then extended with them
+    :param points: GeoDataFrame with point geometries
+    :param level: NUTS level, key of NUTS_KEYS
+    :param cache_path: Path of the assignment cache, by default the configured one
+    :return: DataFrame with the x and y coordinates and the MAIN_ID of every match, the coordinates outside of every
+    region have a missing MAIN_ID
+    """
+    cache_path = Path(current_config()["IO"]["nuts_assignment_cache_path"] if cache_path is None else cache_path)
+    columns = ["level", "fingerprint", "x", "y", "MAIN_ID"]
+    fingerprint = nuts_fingerprint(level)
+    cache = read_table(cache_path) if cache_path.exists() else pd.DataFrame(columns=columns)
+    cache = cache[(cache["level"] != level) | (cache["fingerprint"] == fingerprint)]
+    coordinates = pd.DataFrame({"x": points.geometry.x, "y": points.geometry.y}).drop_duplicates()
+    known = cache.loc[cache["level"] == level, ["x", "y", "MAIN_ID"]]
+    new = coordinates.merge(known[["x", "y"]].drop_duplicates(), how="left", indicator=True)
+    new = new.loc[new["_merge"] == "left_only", ["x", "y"]]
+    if len(new):
+        import geopandas as gpd
+        new_points = gpd.GeoDataFrame(new, geometry=gpd.points_from_xy(new.x, new.y), crs=points.crs)
+        joined = do_geographical_join_nuts(new_points, level)
+        # The coordinates without a region are kept with a missing MAIN_ID so that they are not joined again
+        assigned = new.merge(pd.DataFrame(joined[["x", "y", "MAIN_ID"]]), how="left")
+        assigned["level"] = level
+        assigned["fingerprint"] = fingerprint
+        cache = pd.concat([cache, assigned[columns]], ignore_index=True)
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_path.with_name("{}.{}{}".format(cache_path.stem, os.getpid(), cache_path.suffix))
+        write_table(cache, tmp_path, index=False)
+        os.replace(tmp_path, cache_path)
+        known = cache.loc[cache["level"] == level, ["x", "y", "MAIN_ID"]]
+    return coordinates.merge(known)
+
+
 class CostDistribution(DataSource):
     # Call with super, take a look
     def __init__(self, data=None, column_map=None, local_path=None, geo=False, input_geo=False):
@@ -104,6 +145,7 @@ class CostDistribution(DataSource):
 
     # pseudo class method
     def aggregate(self, geo=True):
+        import geopandas as gpd
         df = self.data.groupby(["source", "geographical_label"]).agg({"amount": "sum",
                                                                       "cost": "mean",
                                                                       "year": "max",
@@ -124,22 +166,24 @@ class CostDistribution(DataSource):
         output = CostDistribution(gdf, column_map, geo=geo, input_geo=True)
         return output
 
-    def export_data(self, path, geo):
-        if geo:
-            assert path.split(".")[-1] == "shp", "File must end with .shp"
+    def export_data(self, path, geo, partition_cols=None):
+        ending = Path(path).suffix
+        if geo and ending == ".shp":
             self.data.to_file(path)
         else:
-            assert path.split(".")[-1] == "csv", "File must end with .csv"
-            super().export_data(path)
+            assert ending in FORMATS[:2] or not geo and ending in FORMATS, \
+                "File must end with .parquet or .feather, or with .shp for geo and .csv for table exports"
+            super().export_data(path, partition_cols)
 
     def fetch_from_local(self, **kwargs):
-        ending = self.local_path.split(".")[-1]
-        if ending == "csv":
-            data = pd.read_csv(self.local_path, **kwargs)
-        elif ending == "shp":
+        ending = Path(self.local_path).suffix
+        if ending == ".shp":
+            import geopandas as gpd
             data = gpd.read_file(self.local_path, **kwargs)
+        elif ending in FORMATS:
+            data = read_table(self.local_path, **kwargs)
         else:
-            raise ValueError(f'Ending {ending} should be either csv or shp')
+            raise ValueError(f'Ending {ending} should be one of {", ".join(FORMATS + [".shp"])}')
         return data
 
     def switch(self):
@@ -151,22 +195,24 @@ class CostDistribution(DataSource):
             self.geo = not self.geo
 
     def plot(self, **kwargs):
+        import matplotlib.pyplot as plt
+        from src.curveproduction.plot import plot_point_distribution
         plot_point_distribution(self, **kwargs)
         plt.show()
 
     @classmethod
     def from_file(cls, path, geo, **kwargs):
-        ending = path.split(".")[-1]
-        if ending == "csv":
-            input_geo = False
+        ending = Path(path).suffix
+        input_geo = ending == ".shp" or ending != ".csv" and is_geo_table(path)
+        if not input_geo:
             default_columns = DEFAULT_COLUMNS + ["lat", "lon"]
             column_map = {x: y for x, y in zip(default_columns, default_columns)}
         else:
-            input_geo = True
             default_columns = DEFAULT_COLUMNS + ["geometry"]
             column_map = {x: y for x, y in zip(default_columns, default_columns)}
-            column_map["geographical_label"] = "geographic"
-        instance = cls(local_path=path, column_map=column_map, input_geo=input_geo, geo=geo)
+            if ending == ".shp":
+                column_map["geographical_label"] = "geographic"
+        instance = cls(local_path=str(path), column_map=column_map, input_geo=input_geo, geo=geo)
         return instance
 
     @staticmethod
@@ -175,7 +221,9 @@ class CostDistribution(DataSource):
             output = df
             output["geographical_label"] = "EURO"
             return output
-        joined = do_geographical_join_nuts(df, level)
+        points = df.assign(x=df.geometry.x, y=df.geometry.y).reset_index()
+        joined = points.merge(cached_nuts_assignments(df, level), on=["x", "y"]).dropna(subset=["MAIN_ID"])
+        joined = joined.set_index(points.columns[0]).rename_axis(df.index.name)
         output = joined[["source", "MAIN_ID", "year", "production_capacity", "amount", "cost", "geometry"]]
         output = output.rename(columns={"MAIN_ID": "geographical_label"})
         return output
@@ -192,21 +240,23 @@ class CostDistribution(DataSource):
         idf = df.rename(columns=inv_map)
         sdf = idf[default_columns]
         if input_geo:
-            sdf = gpd.GeoDataFrame(sdf, crs=costcurveconfig["CRS"])
+            import geopandas as gpd
+            sdf = gpd.GeoDataFrame(sdf, crs=current_config()["CostCurveConfig"]["CRS"])
         sdf = sdf.set_index("id")
         return sdf
 
     @staticmethod
     def switch_to_geo(df):
+        import geopandas as gpd
         output = gpd.GeoDataFrame(
             df, geometry=gpd.points_from_xy(df.lon, df.lat))
-        output.crs = costcurveconfig["CRS"]
+        output.crs = current_config()["CostCurveConfig"]["CRS"]
         output = output.drop(columns=["lat", "lon"])
         return output
 
     @staticmethod
     def switch_to_df(gdf):
-        gdf.to_crs(costcurveconfig["projCRS"])
+        gdf.to_crs(current_config()["CostCurveConfig"]["projCRS"])
         with warnings.catch_warnings():
             warnings.simplefilter("ignore")
             gdf["lon"] = gdf.centroid.x
@@ -215,7 +265,7 @@ class CostDistribution(DataSource):
             gdf = gdf.rename(columns={"geographic": "geographical_label",
                                       "production": "production_capacity"})
         output = gdf[DEFAULT_COLUMNS[1:] + ["lat", "lon"]]
-        gdf.to_crs(costcurveconfig["CRS"])
+        gdf.to_crs(current_config()["CostCurveConfig"]["CRS"])
         return output
 
 
@@ -1,4 +1,3 @@
-from src.tools.config_loader import Configuration
 import pandas as pd
 import seaborn as sns
 import matplotlib.pyplot as plt
@@ -8,10 +7,6 @@ import cartopy
 
 pd.set_option('display.max_columns', None)
 matplotlib.font_manager.findSystemFonts(fontpaths=None, fontext='ttf')
-config = Configuration.get_instance()
-
-file_path = config["IO"]["complete_set_path"]
-local_config = config["CostCurveConfig"]
 
 figsize = (8, 12)
 bot_left = (32, -16)
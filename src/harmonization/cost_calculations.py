@@ -13,63 +13,72 @@ cc_output_cols = ["lcoe_capex_cc", "lcoe_om_cc", "lcoe_fu_cc"]
 general_input_cols = ["fuel_cost", "capacity_factor", "power_net"]
 
 
-def calculate_lcoe_row(row):
+def fill_lcoe_components(capex, fcf, fom, vom, hr, fuel_cost, cf, lcoe_capex, lcoe_om, lcoe_fu):
     """
-    Support function to calculate LCOE on a Pandas Dataframe
-    :param row: This function works only with apply with Pandas
-    :return: Modified row
+    Fills the LCOE components of the rows, reported components are kept and the missing ones are calculated from the
+    plant parameters
+    :param capex: Array of capital costs
+    :param fcf: Array of fixed charge factors
+    :param fom: Array of fixed O&M costs, missing values are taken as 0
+    :param vom: Array of variable O&M costs
+    :param hr: Array of heat rates
+    :param fuel_cost: Array of fuel costs
+    :param cf: Array of capacity factors
+    :param lcoe_capex: Reported CAPEX component of the LCOE
+    :param lcoe_om: Reported O&M component of the LCOE
+    :param lcoe_fu: Reported fuel component of the LCOE
+    :return: Arrays of CAPEX, O&M and fuel components of the LCOE
     """
-    # reference
-    if np.isnan(row["lcoe_capex"]):
-        row["lcoe_capex"] = calc_lcoe_capex(row["capital_cost"], row["FCF"], row["capacity_factor"])
-    if np.isnan(row["lcoe_om"]):
-        if np.isnan(row["fixed_om"]):
-            fom = 0
-        else:
-            fom = row["fixed_om"]
-        row["lcoe_om"] = calc_lcoe_om(fom, row["variable_om"], row["capacity_factor"])
-    if np.isnan(row["lcoe_fu"]):
-        row["lcoe_fu"] = calculate_lcoe_fuel(row["heat_rate"], row["fuel_cost"])
+    lcoe_capex = lcoe_capex.copy()
+    lcoe_om = lcoe_om.copy()
+    lcoe_fu = lcoe_fu.copy()
+    fom = np.where(np.isnan(fom), 0, fom)
 
-    row["lcoe"] = row["lcoe_fu"] + row["lcoe_om"] + row["lcoe_capex"]
-
-    # cc
-    if np.isnan(row["lcoe_capex_cc"]):
-        row["lcoe_capex_cc"] = calc_lcoe_capex(row["capital_cost_cc"], row["FCF"], row["capacity_factor"])
-    if np.isnan(row["lcoe_om_cc"]):
-        if np.isnan(row["fixed_om_cc"]):
-            fom = 0
-        else:
-            fom = row["fixed_om_cc"]
-        row["lcoe_om_cc"] = calc_lcoe_om(fom, row["variable_om_cc"], row["capacity_factor"])
-    if np.isnan(row["lcoe_fu_cc"]):
-        row["lcoe_fu_cc"] = calculate_lcoe_fuel(row["heat_rate_cc"], row["fuel_cost"])
-
-    row["lcoe"] = row["lcoe_fu"] + row["lcoe_om"] + row["lcoe_capex"]
-    row["lcoe_cc"] = row["lcoe_fu_cc"] + row["lcoe_om_cc"] + row["lcoe_capex_cc"]
-    _, row["captured"] = calculate_emissions(row["heat_rate_cc"], row["fuel_emission_factor"],
-                                             row["capture_efficiency"])
-
-    row["cost_of_cc"] = 1000 * (row["lcoe_cc"] - row["lcoe"]) / row["captured"]
-    row["cc_capex"] = 1000 * (row["lcoe_capex_cc"] - row["lcoe_capex"]) / row["captured"]
-    row["cc_om"] = 1000 * (row["lcoe_om_cc"] - row["lcoe_om"]) / row["captured"]
-    row["cc_fu"] = 1000 * (row["lcoe_fu_cc"] - row["lcoe_fu"]) / row["captured"]
-
-    return row
+    mask = np.isnan(lcoe_capex)
+    lcoe_capex[mask] = calc_lcoe_capex(capex[mask], fcf[mask], cf[mask])
+    mask = np.isnan(lcoe_om)
+    lcoe_om[mask] = calc_lcoe_om(fom[mask], vom[mask], cf[mask])
+    mask = np.isnan(lcoe_fu)
+    lcoe_fu[mask] = calculate_lcoe_fuel(hr[mask], fuel_cost[mask])
+    return lcoe_capex, lcoe_om, lcoe_fu
 
 
 def calc_cc_lcoe_df(df):
     """
-    Apply calculate_lcoe_row on dataframe
+    Calculate the LCOE and cost of carbon capture of the whole dataframe, the operations are done over complete
+    columns
     :param df: Dataframe in which the LCOE will be calculated
     :return: Modified DataFrame
     """
-    df["lcoe"] = 0
-    df["lcoe_cc"] = 0
-    df["captured"] = 0
-    df["cost_of_cc"] = 0
-    df["cc_capex"] = 0
-    df["cc_om"] = 0
-    df["cc_fu"] = 0
-    df = df.apply(calculate_lcoe_row, axis=1)
+    col = {name: df[name].to_numpy(dtype=float) for name in ref_input_cols + cc_input_cols + ref_output_cols +
+           cc_output_cols + general_input_cols + ["fuel_emission_factor", "capture_efficiency"]}
+
+    lcoe_capex, lcoe_om, lcoe_fu = fill_lcoe_components(col["capital_cost"], col["FCF"], col["fixed_om"],
+                                                        col["variable_om"], col["heat_rate"], col["fuel_cost"],
+                                                        col["capacity_factor"], col["lcoe_capex"], col["lcoe_om"],
+                                                        col["lcoe_fu"])
+    lcoe_capex_cc, lcoe_om_cc, lcoe_fu_cc = fill_lcoe_components(col["capital_cost_cc"], col["FCF"],
+                                                                 col["fixed_om_cc"], col["variable_om_cc"],
+                                                                 col["heat_rate_cc"], col["fuel_cost"],
+                                                                 col["capacity_factor"], col["lcoe_capex_cc"],
+                                                                 col["lcoe_om_cc"], col["lcoe_fu_cc"])
+    lcoe = lcoe_fu + lcoe_om + lcoe_capex
+    lcoe_cc = lcoe_fu_cc + lcoe_om_cc + lcoe_capex_cc
+    _, captured = calculate_emissions(col["heat_rate_cc"], col["fuel_emission_factor"], col["capture_efficiency"])
+
+    df["lcoe_capex"] = lcoe_capex
+    df["lcoe_om"] = lcoe_om
+    df["lcoe_fu"] = lcoe_fu
+    df["lcoe_capex_cc"] = lcoe_capex_cc
+    df["lcoe_om_cc"] = lcoe_om_cc
+    df["lcoe_fu_cc"] = lcoe_fu_cc
+    df["lcoe"] = lcoe
+    df["lcoe_cc"] = lcoe_cc
+    df["captured"] = captured
+    # Studies without capture data produce inf/NaN values
+    with np.errstate(divide="ignore", invalid="ignore"):
+        df["cost_of_cc"] = 1000 * (lcoe_cc - lcoe) / captured
+        df["cc_capex"] = 1000 * (lcoe_capex_cc - lcoe_capex) / captured
+        df["cc_om"] = 1000 * (lcoe_om_cc - lcoe_om) / captured
+        df["cc_fu"] = 1000 * (lcoe_fu_cc - lcoe_fu) / captured
     return df
@@ -2,6 +2,7 @@
 Cost index operations, conversion from reference years to an harmonized year
 """
 from src.harmonization.cost_transformation_functions import *
+import numpy as np
 
 # Columns classified for index to be used
 capital_cost_columns = ["capital_cost", "lcoe_capex", ]
@@ -14,84 +15,55 @@ cost_columns = capital_cost_columns + om_columns + fuel_columns + cc_columns
 # Helper functions
 
 
-def convert_column(row, column, idx_map, new_year, index):
+def index_names(df_cost):
     """
-    Generic column conversion function
-    :param row: Pandas dataframe row
-    :param column: Name of the column to be transformed
-    :param idx_map: Index map containing the input and output years
-    :param new_year: Goal year of the transformation
-    :param index: Index to use for the transformation
-    :return: Transformed value as float
+    Names of the index used for each one of the cost values
+    :param df_cost: Pandas dataframe with the cost columns and the fuel type of the rows
+    :return: Array of index names with shape rows x cost columns
     """
-    return convert_value(row[column], idx_map, row.basis_year, new_year, index)
-
-
-def convert_fuels(row, column, idx_map, new_year):
-    """
-    Performs cost transformation for Fuels
-    :param row: Pandas dataframe row
-    :param column: Name of to be converted column
-    :param idx_map: Index map containing the desired indexes
-    :param new_year: Goal year of the transformation
-    :return: Converted value
-    """
-    if row.fuel_type == "coal":
-        index = "COALIDX"
-    else:
-        index = "NGIDX"
-
-    return convert_value(row[column], idx_map, row.basis_year, new_year, index)
+    fuel_index = np.where(df_cost["fuel_type"].to_numpy() == "coal", "COALIDX", "NGIDX")
+    names = np.empty((len(df_cost), len(cost_columns)), dtype=object)
+    for j, column in enumerate(cost_columns):
+        if column in capital_cost_columns:
+            names[:, j] = "UCCI"
+        elif column in om_columns:
+            names[:, j] = "UOCI"
+        elif column in cc_columns:
+            names[:, j] = "CEPCI"
+        else:
+            names[:, j] = fuel_index
+    return names
 
 
 def transform_costs(df, new_year=2019):
     """
-    Transform cost of the whole dataframe
+    Transform cost of the whole dataframe, all the cost columns are converted together with an IndexTable
     :param df: Pandas dataframe containing the data
     :param new_year: Goal year of the transformations
-    :return: Transformed dataframe
+    :return: Transformed dataframe, index map of the basis years and the new year in the form of create_index_map
     """
 
     df_cost = df.loc[:, cost_columns + ["basis", "fuel_type"]]
     df_cost.loc[:, "basis_year"] = df_cost.loc[:, "basis"].str[:4].astype(int)
     df_cost.loc[:, "currency"] = df_cost.loc[:, "basis"].str[4:7]
-    df_cost = df_cost.drop(columns=["basis"])
 
-    years = list(df_cost["basis_year"].unique())
-    years.append(new_year)
+    idx_map = create_index_table()
 
-    idx_map = create_index_map(years)
+    years = df_cost["basis_year"].to_numpy()[:, None]
+    values = df_cost[cost_columns].to_numpy(dtype=float, copy=True)
 
     # Convert everything into USD for the transformations
+    eur = df_cost["currency"].to_numpy() == "EUR"
+    values[eur] = idx_map.fx(values[eur], years[eur], "EURUSD")
 
-    for column in cost_columns:
-        df_cost[column] = df_cost.apply(lambda row: change_currency(row[column], idx_map, row["basis_year"], "EURUSD")
-        if row.currency == "EUR" else row[column], axis=1)
-    df_cost["currency"] = "USD"
-
-    # Convert the values of capital cost using the UCCI
-
-    for column in capital_cost_columns:
-        df_cost[column] = df_cost.apply(lambda row: convert_column(row, column, idx_map, new_year, "UCCI"), axis=1)
-
-    for column in om_columns:
-        df_cost[column] = df_cost.apply(lambda row: convert_column(row, column, idx_map, new_year, "UOCI"), axis=1)
-
-    for column in cc_columns:
-        df_cost[column] = df_cost.apply(lambda row: convert_column(row, column, idx_map, new_year, "CEPCI"), axis=1)
-
-    for column in fuel_columns:
-        df_cost[column] = df_cost.apply(lambda row: convert_fuels(row, column, idx_map, new_year), axis=1)
-
-    df_cost["basis_year"] = new_year
+    # Convert the values with the UCCI, UOCI, CEPCI and fuel indexes of each column
+    values = idx_map.convert(values, years, new_year, index_names(df_cost))
 
-    for column in cost_columns:
-        df_cost[column] = df_cost.apply(
-            lambda row: change_currency(row[column], idx_map, new_year, "USDEUR"), axis=1)
-    df_cost["currency"] = "EUR"
+    # Back to EUR in the new year
+    values = idx_map.fx(values, new_year, "USDEUR")
 
-    for column in cost_columns:
-        df[column] = df_cost[column]
+    for j, column in enumerate(cost_columns):
+        df[column] = values[:, j]
     df["basis"] = "EUR" + str(new_year)
 
-    return df, idx_map
+    return df, idx_map.to_index_map(list(df_cost["basis_year"].unique()) + [new_year])
@@ -1,19 +1,14 @@
 import pandas as pd
 import locale
-import matplotlib.pyplot as plt
-from matplotlib import rc
-from src.tools.config_loader import Configuration
-rc('font',**{'family':'serif','serif':['Palatino']})
-rc('text', usetex=False)
-config = Configuration.get_instance()
-locale.setlocale(locale.LC_NUMERIC, '')
+import os
+import json
+import hashlib
+import logging
+from pathlib import Path
+from src.tools.config_loader import current_config
+from src.harmonization.index_table import IndexTable
 import numpy as np
 
-# Paths
-io = config["IO"]
-input_config = config["InputConfig"]
-# Figure output
-fig_path =io["figures_path"] / "index_development_wiki_example.png"
 # Test year values, the tool does not work currently with 2020 Data.
 
 years = [2000,
@@ -29,23 +24,38 @@ years = [2000,
 2019,
 ]
 
-# Index Data sources configurations, here the path represents the location of hte file in the repository,
-# the value_column is the name of the column of the index in the databasae, year_column/date_column is the name of the
-# column where the temporal Data is stored
-# Basic indexes go through a general extraction script, aggregated indexes are reported in daily or monthly basiss so
-# they are aggregated per year
-# Rolled indexes are also aggregated but in a rolling average basis
-basic_indexes = {
-    "UOCI" : {"path" : io["ihs_path"], **input_config["index"]["uoci"]},
-    "UCCI" : {"path" : io["ihs_path"], **input_config["index"]["ucci"]},
-    "CEPCI": {"path": io["cepci_path"], **input_config["index"]["cepci"]},
-    "COALIDX" : {"path" : io["coalidx_path"], **input_config["index"]["coalidx"]}
-           }
-aggregated_indexes = {"EURUSD" : {"path" : io["eurusd_path"], **input_config["index"]["eurusd"]},
-                      "NGIDX" : {"path" : io["ngidx_path"],**input_config["index"]["ngidx"]}
-                      }
-
-rolled_indexes = {}
+
+def index_sources(config=None):
+    """
+    Index Data sources configurations, here the path represents the location of the file in the repository, the
+    value_column is the name of the column of the index in the database, year_column/date_column is the name of the
+    column where the temporal Data is stored.
+    Basic indexes go through a general extraction script, aggregated indexes are reported in daily or monthly basis so
+    they are aggregated per year. Rolled indexes are also aggregated but in a rolling average basis
+    :param config: ConfigSnapshot, by default the current configuration
+    :return: Dictionaries of the basic, aggregated and rolled indexes
+    """
+    config = current_config() if config is None else config
+    io = config["IO"]
+    index_config = config["InputConfig"]["index"]
+    basic_indexes = {"UOCI": {"path": io["ihs_path"], **index_config["uoci"]},
+                     "UCCI": {"path": io["ihs_path"], **index_config["ucci"]},
+                     "CEPCI": {"path": io["cepci_path"], **index_config["cepci"]},
+                     "COALIDX": {"path": io["coalidx_path"], **index_config["coalidx"]}}
+    aggregated_indexes = {"EURUSD": {"path": io["eurusd_path"], **index_config["eurusd"]},
+                          "NGIDX": {"path": io["ngidx_path"], **index_config["ngidx"]}}
+    rolled_indexes = {}
+    return basic_indexes, aggregated_indexes, rolled_indexes
+
+
+def _resolve_indexes(basic_indexes, aggregated_indexes, rolled_indexes):
+    """
+    Replaces the missing index dictionaries with the ones of the current configuration
+    """
+    defaults = index_sources()
+    given = (basic_indexes, aggregated_indexes, rolled_indexes)
+    return tuple(default if indexes is None else indexes for default, indexes in zip(defaults, given))
+
 
 # rolled_indexes = {"COALIDX" : {"path" : coal_path,
 #                      "value_column" : "Nominal",
@@ -59,93 +69,229 @@ rolled_indexes = {}
 
 # These functions are helper functions for the process of extracting indexes
 
-def basic_values(years, path, value_column, year_column, **kwargs):
+def basic_series(path, value_column, year_column, **kwargs):
     """
-    This is the basic extraction function, it opens the file and gets a list of values that are associated to the years
-    in the Input list, this works with pandas dataframes
-    :param years: List of years to be extracted
+    This is the basic extraction function, it opens the file and gets the values of every year in it
     :param path: Path of the Data source
     :param value_column: Name of the column where the value to be extracted is stored
     :param year_column:  Name of the column where the year is stored
     :param kwargs: Kwargs for pandas read csv, here one specifies the separators and numerical symbols in the source.
-    :return: a list of values extracted
+    :return: Series of values indexed by year
     """
     data = pd.read_csv(path, **kwargs)
-    value = data[data[year_column].isin(years)][value_column]
-    return value.to_list()
+    return pd.Series(data[value_column].values, index=data[year_column].values)
 
-def aggregated_values(years, path, date_column, value_column, **kwargs):
+
+def aggregated_series(path, date_column, value_column, **kwargs):
     """
-    Similar to basic values, but for inputs that are not reported in yearly values, it aggregates days and months
-    :param years: List of years to be extracted
+    Similar to basic series, but for inputs that are not reported in yearly values, it aggregates days and months
     :param path: Path of the Data source
+    :param date_column: Name of the column where the date is stored
     :param value_column: Name of the column where the value to be extracted is stored
-    :param year_column:  Name of the column where the year is stored
     :param kwargs: Kwargs for pandas read csv, here one specifies the separators and numerical symbols in the source.
-    :return: a list of values extracted
+    :return: Series of yearly means indexed by year
     """
-    df = pd.read_csv( path, **kwargs )
-    df[date_column] = pd.to_datetime( df[date_column] )
+    df = pd.read_csv(path, **kwargs)
+    df[date_column] = pd.to_datetime(df[date_column])
     #df[value_column] = df[value_column].map(atof)
-    df_agg = df.groupby( df[date_column].dt.year )[value_column].mean().reset_index().rename(
-        columns={date_column : 'Year', value_column: 'Rate'} )
-    value = df_agg[df_agg["Year"].isin( years )]["Rate"]
-    return value.to_list()
+    return df.groupby(df[date_column].dt.year)[value_column].mean()
 
-def rolled_values(years, path, date_column, value_column, **kwargs):
+
+def rolled_series(path, date_column, value_column, **kwargs):
     """
     Experimental aggregation which aggregates values using rolling averages.
-    :param years: List of years to be extracted
     :param path: Path of the Data source
+    :param date_column: Name of the column where the date is stored
     :param value_column: Name of the column where the value to be extracted is stored
-    :param year_column:  Name of the column where the year is stored
     :param kwargs: Kwargs for pandas read csv, here one specifies the separators and numerical symbols in the source.
-    :return: a list of values extracted
+    :return: Series of rolled values indexed by year
     """
-    data = pd.read_csv( path, **kwargs)
+    data = pd.read_csv(path, **kwargs)
     try:
-        data[date_column] = pd.to_datetime(data[date_column], format = "%d.%m.%Y")
-        df_agg = data.groupby( data[date_column].dt.year )[value_column].mean().reset_index().rename(
+        data[date_column] = pd.to_datetime(data[date_column], format="%d.%m.%Y")
+        df_agg = data.groupby(data[date_column].dt.year)[value_column].mean().reset_index().rename(
             columns={date_column: 'Year'})
     except:
-        df_agg = data.rename(columns = {date_column : "Year"})
+        df_agg = data.rename(columns={date_column: "Year"})
     df_agg[value_column] = df_agg[value_column].rolling(2).mean().fillna(df_agg[value_column][0])
-    value = df_agg[df_agg["Year"].isin( years )][value_column]
-    return value.to_list()
+    return pd.Series(df_agg[value_column].values, index=df_agg["Year"].values)
+
+
+def basic_values(years, path, value_column, year_column, **kwargs):
+    """
+    Values of the basic series for the given years
+    :param years: List of years to be extracted
+    :return: a list of values extracted
+    """
+    value = basic_series(path, value_column, year_column, **kwargs)
+    return value[value.index.isin(years)].to_list()
+
+
+def aggregated_values(years, path, date_column, value_column, **kwargs):
+    """
+    Values of the aggregated series for the given years
+    :param years: List of years to be extracted
+    :return: a list of values extracted
+    """
+    value = aggregated_series(path, date_column, value_column, **kwargs)
+    return value[value.index.isin(years)].to_list()
+
+
+def rolled_values(years, path, date_column, value_column, **kwargs):
+    """
+    Values of the rolled series for the given years
+    :param years: List of years to be extracted
+    :return: a list of values extracted
+    """
+    value = rolled_series(path, date_column, value_column, **kwargs)
+    return value[value.index.isin(years)].to_list()
+
+
+# Index store, the sources are parsed once and the yearly values of all of them are kept in a compiled file that is
+# only rebuilt when a source file or its reading configuration changes
+
+_index_stores = {}
+
+
+def index_sources_fingerprint(basic_indexes=None, aggregated_indexes=None, rolled_indexes=None):
+    """
+    Creates a fingerprint of the index sources from the modification time and size of the files and the reading
+    configuration of each index
+    :return: Hexadecimal hash as string
+    """
+    basic_indexes, aggregated_indexes, rolled_indexes = _resolve_indexes(basic_indexes, aggregated_indexes,
+                                                                         rolled_indexes)
+    description = {}
+    for kind, indexes in [("basic", basic_indexes), ("aggregated", aggregated_indexes), ("rolled", rolled_indexes)]:
+        for index, settings in indexes.items():
+            stat = os.stat(settings["path"])
+            description[index] = {"kind": kind,
+                                  "settings": {k: str(v) for k, v in settings.items()},
+                                  "mtime": stat.st_mtime_ns,
+                                  "size": stat.st_size}
+    return hashlib.sha1(json.dumps(description, sort_keys=True).encode()).hexdigest()
+
+
+def compile_index_store(basic_indexes=None, aggregated_indexes=None, rolled_indexes=None):
+    """
+    Parses every index source into its yearly values
+    :return: Dictionary of index name to Series of values indexed by year
+    """
+    basic_indexes, aggregated_indexes, rolled_indexes = _resolve_indexes(basic_indexes, aggregated_indexes,
+                                                                         rolled_indexes)
+    store = {}
+    for index in basic_indexes:
+        store[index] = basic_series(**basic_indexes[index])
+    for index in aggregated_indexes:
+        store[index] = aggregated_series(**aggregated_indexes[index])
+    for index in rolled_indexes:
+        store[index] = rolled_series(**rolled_indexes[index])
+    return store
+
+
+def _write_index_store(store, fingerprint, path):
+    arrays = {"fingerprint": np.array(fingerprint)}
+    for index, series in store.items():
+        arrays[index + "__years"] = series.index.to_numpy(dtype=int)
+        arrays[index + "__values"] = series.to_numpy(dtype=float)
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Written next to the final file and then moved, so other processes never read a half written store
+    tmp_path = path.with_name("{}.{}.tmp".format(path.name, os.getpid()))
+    with open(tmp_path, "wb") as file:
+        np.savez(file, **arrays)
+    os.replace(tmp_path, path)
+
+
+def _read_index_store(path):
+    with np.load(path) as data:
+        fingerprint = str(data["fingerprint"])
+        names = [key[:-len("__years")] for key in data.files if key.endswith("__years")]
+        store = {name: pd.Series(data[name + "__values"], index=data[name + "__years"]) for name in names}
+    return store, fingerprint
+
+
+def load_index_store(basic_indexes=None, aggregated_indexes=None, rolled_indexes=None, path=None):
+    """
+    Gets the yearly values of all the indexes, first from memory, then from the compiled store file and only if
+    the sources changed it parses them again
+    :param path: Location of the compiled store, by default the one in the config file
+    :return: Dictionary of index name to Series of values indexed by year
+    """
+    path = current_config()["IO"]["harmonization_index_store_path"] if path is None else path
+    basic_indexes, aggregated_indexes, rolled_indexes = _resolve_indexes(basic_indexes, aggregated_indexes,
+                                                                         rolled_indexes)
+    fingerprint = index_sources_fingerprint(basic_indexes, aggregated_indexes, rolled_indexes)
+    if fingerprint in _index_stores:
+        return _index_stores[fingerprint]
+    store = None
+    if Path(path).is_file():
+        try:
+            store, stored_fingerprint = _read_index_store(path)
+        except (OSError, ValueError, KeyError):
+            logging.warning("The index store \"{}\" could not be read, it will be rebuilt".format(path))
+            stored_fingerprint = None
+        if stored_fingerprint != fingerprint:
+            store = None
+    if store is None:
+        store = compile_index_store(basic_indexes, aggregated_indexes, rolled_indexes)
+        _write_index_store(store, fingerprint, path)
+    _index_stores.clear()
+    _index_stores[fingerprint] = store
+    return store
+
 
 # Index map, this is useful to avoid going to the files over and over, thus saving commputing power
-def create_index_map(years, basic_indexes = basic_indexes, aggregated_indexes = aggregated_indexes, rolled_indexes = rolled_indexes):
+def create_index_map(years, basic_indexes=None, aggregated_indexes=None, rolled_indexes=None):
     """
     Using a given set of sources and years createss a table that can be used as a source for the indexes in the conversion
-    of values
+    of values, the values are taken from the compiled index store
     :param years: List of years
-    :param basic_indexes: Dictionary of basic indexes
-    :param aggregated_indexes:  Dictionary of aggregated indexes
-    :param rolled_indexes: Dicrionary of rolled indexes
+    :param basic_indexes: Dictionary of basic indexes, by default the ones of the current configuration
+    :param aggregated_indexes:  Dictionary of aggregated indexes, by default the ones of the current configuration
+    :param rolled_indexes: Dicrionary of rolled indexes, by default the ones of the current configuration
     :return: Dataframe with indexes mapped to the given year
     """
+    basic_indexes, aggregated_indexes, rolled_indexes = _resolve_indexes(basic_indexes, aggregated_indexes,
+                                                                         rolled_indexes)
+    store = load_index_store(basic_indexes, aggregated_indexes, rolled_indexes)
+    years = sorted(set(int(year) for year in years))
     mapped = pd.DataFrame()
     mapped["YEAR"] = years
-    for index in basic_indexes:
-        mapped[index] = basic_values(years, **basic_indexes[index])
-    for index in aggregated_indexes:
-        mapped[index] = aggregated_values(years, **aggregated_indexes[index])
-    for index in rolled_indexes:
-        mapped[index] = rolled_values( years, **rolled_indexes[index] )
+    for index in list(basic_indexes) + list(aggregated_indexes) + list(rolled_indexes):
+        series = store[index]
+        missing = [year for year in years if year not in series.index]
+        if missing:
+            raise ValueError("The index {} has no values for the years {}".format(index, missing))
+        mapped[index] = series.loc[years].values
 
+    return mapped
+
+
+def create_index_table(interpolate=None):
+    """
+    Creates an IndexTable with every year of the index store, conversions of whole arrays of values should use it
+    instead of an index map
+    :param interpolate: If True years without data are interpolated, by default the HarmonizationTool option is used
+    :return: IndexTable
+    """
+    if interpolate is None:
+        interpolate = current_config()["HarmonizationTool"]["Options"]["InterpolateIndexes"]
+    return IndexTable.from_store(load_index_store(), interpolate)
 
-    return mapped.sort_values("YEAR")
 
 def convert_value(value, idx_map, year_ref, year_new ,index):
     """
     Converts given value from the reference year to the desired year using the given index and index map
     :param value: Float with the original value
-    :param idx_map: Index map generated with create_index_map
+    :param idx_map: Index map generated with create_index_map or an IndexTable
     :param year_ref: Year of the reference value
     :param year_new: Desired yeaar
     :param index: Desired Index name
     :return:  New value
     """
+    if isinstance(idx_map, IndexTable):
+        return idx_map.convert(value, year_ref, year_new, index)
     ref_idx = idx_map.loc[(idx_map["YEAR"] == year_ref), index].values[0]
     new_idx = idx_map.loc[(idx_map["YEAR"] == year_new), index].values[0]
     return value * new_idx / ref_idx
@@ -155,11 +301,13 @@ def change_currency(value, idx_map, year, direction):
     """
     Special kind of transformation that converts values in a given year, works only between euro and dollar
     :param value: original value
-    :param idx_map: index map from create_index_map
+    :param idx_map: index map from create_index_map or an IndexTable
     :param year: Year of transformation
     :param direction: "EURUSD" as default to convert euroes into usd, "USDEUR" to do the inverese
     :return: New Value
     """
+    if isinstance(idx_map, IndexTable):
+        return idx_map.fx(value, year, direction)
     change = idx_map.loc[(idx_map["YEAR"] == year), "EURUSD"].values[0]
     if direction == "USDEUR":
         change = 1/change
@@ -167,12 +315,20 @@ def change_currency(value, idx_map, year, direction):
     return value * change
 
 
-def _print_index_map(index_map, fig_path):
+def _print_index_map(index_map, fig_path=None):
     """
     Helper function to create index map figure
     :param index_map:
+    :param fig_path: Path of the figure, by default in the configured figures folder
     :return:
     """
+    if fig_path is None:
+        fig_path = current_config()["IO"]["figures_path"] / "index_development_wiki_example.png"
+    import matplotlib.pyplot as plt
+    from matplotlib import rc
+    rc('font',**{'family':'serif','serif':['Palatino']})
+    rc('text', usetex=False)
+    locale.setlocale(locale.LC_NUMERIC, '')
     index_map.iloc[:,1:] = index_map.iloc[:,1:].div(index_map.iloc[0,1:])
 
     # with plt.style.context( 'Solarize_Light2' ):
@@ -208,8 +364,9 @@ def _export_index_map_as_latex(idx_map, path):
                                         "EURUSD": "EUR-USD"})
     print(idx_map.to_latex(index = False, float_format = "%.2f"))
 
-# idx_map = create_index_map(years, basic_indexes, aggregated_indexes, rolled_indexes)
 def index_generator():
-    return create_index_map(years, basic_indexes, aggregated_indexes, rolled_indexes)
+    return create_index_map(years)
+
+
 if __name__ == "__main__":
-    print(idx_map)
\ No newline at end of file
+    print(index_generator())
\ No newline at end of file
@@ -4,16 +4,14 @@ import matplotlib.pyplot as plt
 import matplotlib.gridspec as gridspec
 import seaborn as sns
 from scipy import stats
-from src.tools.config_loader import Configuration
+from src.tools.config_loader import current_config
+from src.tools.tabular import read_table
 from matplotlib import rc
 from matplotlib.patches import Patch
 from matplotlib.lines import Line2D
 from src.harmonization.unit_transformation_functions import fuel_name_matching, blacks, browns, petcoke
 
 pd.set_option('display.max_columns', None)
-config = Configuration.get_instance()
-names = config["HarmonizationTool"]["FigureNames"]
-io = config["IO"]
 rc('font', **{'family': 'serif', 'serif': ['Palatino']})
 rc('text', usetex=True)
 
@@ -62,7 +60,7 @@ def min_max_norm(series):
 
 
 def prepare_df_for_plotting():
-    df = pd.read_csv(io["harmonization_df_output_path"], index_col="label")
+    df = read_table(current_config()["IO"]["harmonization_df_output_path"], index_col="label")
     df = df.rename(columns=name_dictionary)
     df = df.drop(columns=["FCF", 'Capture Efficiency'])
     df = df.reset_index()
@@ -0,0 +1,151 @@
+"""
+Dense year indexed table of cost indexes and exchange rates, it allows the conversion of whole arrays of values
+between years as single array operations
+"""
+import numpy as np
+import pandas as pd
+
+
+class IndexTable:
+    def __init__(self, years, values, names, interpolate=False):
+        """
+        :param years: Sorted array of consecutive years covered by the table
+        :param values: Array with shape years x indexes, years without data are NaN
+        :param names: Names of the indexes in the columns of values
+        :param interpolate: Default interpolation behaviour of the lookups
+        """
+        self.years = np.asarray(years, dtype=int)
+        self.names = list(names)
+        self.interpolate = interpolate
+        self.values = np.asarray(values, dtype=float)
+        self.filled = self.fill_missing(self.years, self.values)
+        self._codes = {name: i for i, name in enumerate(self.names)}
+
+    def __repr__(self):
+        return "Index table {}-{}: {}".format(self.years[0], self.years[-1], ", ".join(self.names))
+
+    @staticmethod
+    def fill_missing(years, values):
+        """
+        Fills the years without data of every index with linear interpolation, years before or after the data take
+        the closest value available
+        :param years: Years of the table
+        :param values: Array with shape years x indexes
+        :return: Filled array
+        """
+        filled = values.copy()
+        for j in range(values.shape[1]):
+            known = ~np.isnan(values[:, j])
+            if known.any():
+                filled[:, j] = np.interp(years, years[known], values[known, j])
+        return filled
+
+    @classmethod
+    def from_store(cls, store, interpolate=False):
+        """
+        Creates the table from the yearly series of the index store
+        :param store: Dictionary of index name to Series of values indexed by year
+        :param interpolate: Default interpolation behaviour of the lookups
+        :return: IndexTable
+        """
+        first = min(int(series.index.min()) for series in store.values())
+        last = max(int(series.index.max()) for series in store.values())
+        years = np.arange(first, last + 1)
+        values = np.full((len(years), len(store)), np.nan)
+        for j, series in enumerate(store.values()):
+            series = series.dropna()
+            values[series.index.to_numpy(dtype=int) - first, j] = series.to_numpy(dtype=float)
+        return cls(years, values, store.keys(), interpolate)
+
+    @classmethod
+    def from_index_map(cls, idx_map, interpolate=False):
+        """
+        Creates the table from an index map made with create_index_map
+        :param idx_map: DataFrame with a YEAR column and a column per index
+        :param interpolate: Default interpolation behaviour of the lookups
+        :return: IndexTable
+        """
+        store = {name: pd.Series(idx_map[name].values, index=idx_map["YEAR"].values)
+                 for name in idx_map.columns if name != "YEAR"}
+        return cls.from_store(store, interpolate)
+
+    def codes(self, index):
+        """
+        Position of the given index names in the table
+        :param index: Name or array of names
+        :return: Array of positions
+        """
+        names = np.asarray(index)
+        if names.ndim == 0:
+            return np.array(self._codes[str(names)])
+        uniques, inverse = np.unique(names, return_inverse=True)
+        return np.array([self._codes[name] for name in uniques])[inverse].reshape(names.shape)
+
+    def lookup(self, years, index, interpolate=None):
+        """
+        Values of the indexes in the given years
+        :param years: Year or array of years
+        :param index: Index name or array of names broadcastable with the years
+        :param interpolate: If True years without data are interpolated, by default the table behaviour is used
+        :return: Array of index values
+        """
+        interpolate = self.interpolate if interpolate is None else interpolate
+        years = np.asarray(years, dtype=int)
+        positions = years - self.years[0]
+        codes = self.codes(index)
+        outside = (positions < 0) | (positions >= len(self.years))
+        if interpolate:
+            return self.filled[np.clip(positions, 0, len(self.years) - 1), codes]
+        if outside.any():
+            missing = sorted(set(np.broadcast_to(years, outside.shape)[outside].tolist()))
+            raise ValueError("The years {} are out of the index table".format(missing))
+        values = self.values[positions, codes]
+        missing_values = np.isnan(values)
+        if missing_values.any():
+            missing = sorted(set(np.broadcast_to(years, values.shape)[missing_values].tolist()))
+            raise ValueError("The years {} have no data in the index table, use interpolate".format(missing))
+        return values
+
+    def convert(self, values, from_years, to_year, index, interpolate=None):
+        """
+        Converts values from their reference years to the desired year using the given index
+        :param values: Value or array of values
+        :param from_years: Reference years of the values
+        :param to_year: Desired year
+        :param index: Index name or array of names broadcastable with the values
+        :param interpolate: If True years without data are interpolated, by default the table behaviour is used
+        :return: Converted values
+        """
+        ref_idx = self.lookup(from_years, index, interpolate)
+        new_idx = self.lookup(to_year, index, interpolate)
+        return np.asarray(values, dtype=float) * new_idx / ref_idx
+
+    def fx(self, values, years, direction="EURUSD", interpolate=None):
+        """
+        Changes the currency of values in the given years, works only between euro and dollar
+        :param values: Value or array of values
+        :param years: Years of the transformation
+        :param direction: "EURUSD" to convert euros into dollars, "USDEUR" to do the inverse
+        :param interpolate: If True years without data are interpolated, by default the table behaviour is used
+        :return: Values in the new currency
+        """
+        change = self.lookup(years, "EURUSD", interpolate)
+        if direction == "USDEUR":
+            change = 1 / change
+        elif direction != "EURUSD":
+            raise ValueError("direction should be either EURUSD or USDEUR")
+        return np.asarray(values, dtype=float) * change
+
+    def to_index_map(self, years, interpolate=None):
+        """
+        Table of the given years in the form of create_index_map
+        :param years: List of years
+        :param interpolate: If True years without data are interpolated, by default the table behaviour is used
+        :return: DataFrame with indexes mapped to the given year
+        """
+        years = sorted(set(int(year) for year in years))
+        mapped = pd.DataFrame()
+        mapped["YEAR"] = years
+        for name in self.names:
+            mapped[name] = self.lookup(years, name, interpolate)
+        return mapped
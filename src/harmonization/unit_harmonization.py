@@ -9,14 +9,21 @@ def custom_labels(df, study_row, tech_row):
     :param df: dataframe with tabulated Data
     :return:
     """
+    letters = ["A", "B", "C", "D", "F", "G", "H", "I", "J"]
     labels = []
-    for i, row in df.iterrows():
-        letters = ["A", "B", "C", "D", "F", "G", "H", "I", "J"]
-        j = 0
-        label = row[study_row] + "_" + row[tech_row] + "_" + letters[j]
-        while label in labels:
+    used = set()
+    next_suffix = {}
+    for base in (df[study_row] + "_" + df[tech_row]).to_list():
+        j = next_suffix.get(base, 0)
+        while True:
+            # After the letters run out the last one is numbered
+            suffix = letters[j] if j < len(letters) else letters[-1] + str(j - len(letters) + 2)
+            label = base + "_" + suffix
             j += 1
-            label = row[study_row] + "_" + row[tech_row] + "_" + letters[j]
+            if label not in used:
+                break
+        next_suffix[base] = j
+        used.add(label)
         labels.append(label)
     return labels
 
@@ -37,14 +44,53 @@ def heat_rate_matching(HR, UNITS, EFF):
     return amount
 
 
+def heat_rate_matching_array(HR, UNITS, EFF):
+    """
+    Column version of heat_rate_matching
+    :param HR: Array of heat rates, NaN where they are not availible
+    :param UNITS: Series of heat rate units
+    :param EFF: Array of efficiencies
+    :return: Array of unified amounts
+    """
+    amount = hr_dimension_match_array(HR, UNITS)
+    missing = np.isnan(HR)
+    amount[missing] = eff_to_hr(EFF[missing])
+    return amount
+
+
+def fill_missing(values, fallback):
+    """
+    Takes the fallback values where values is NaN
+    """
+    return np.where(np.isnan(values), fallback, values)
+
+
 def match_unit_values(PATH):
     """
     This is the main unit harmonization function, it condenses all the functions in unit transformations.
     :return: Unit harmonized dataframe
     """
     # First step: Import the raw datafile where the sources are represented
-    input_df = pd.read_csv(PATH, sep=";", encoding="iso-8859-1", decimal='.', na_values=["NaN"])
+    input_df = read_input(PATH)
+    return harmonize_units(input_df)
+
+
+def read_input(PATH):
+    """
+    Reads the raw datafile where the sources are represented
+    :return: DataFrame of the raw input file
+    """
+    return pd.read_csv(PATH, sep=";", encoding="iso-8859-1", decimal='.', na_values=["NaN"])
 
+
+def harmonize_units(input_df, labels=None):
+    """
+    Unit harmonization of the raw studies, the unit strings are parsed once per distinct unit and the conversions
+    are done over whole columns
+    :param input_df: DataFrame of the raw input file
+    :param labels: Labels of the rows, if None they are created with custom_labels
+    :return: Unit harmonized dataframe
+    """
     columns = ["label", "region", "p_year", "power_technology", "capture_technology", "fuel_name", "fuel_type",
                "power_gross", "power_net",
                "power_aux", "retrofit", "repower", "capacity_factor", "electric_efficiency", "electric_efficiency_cc",
@@ -54,9 +100,9 @@ def match_unit_values(PATH):
                "life", "fixed_om", "fixed_om_cc", "variable_om", "variable_om_cc", "fuel_cost", "lcoe_capex",
                "lcoe_om", "lcoe_fu", "lcoe_capex_cc", "lcoe_om_cc", "lcoe_fu_cc", "basis"]
     # Second step: Create empty dataframe with column names
-    df = pd.DataFrame(columns=columns)
+    df = pd.DataFrame(np.nan, index=input_df.index, columns=columns)
     # Create custom labels for the different studies, making sure there is no repeated names
-    df["label"] = custom_labels(input_df, "Study", "Technology")
+    df["label"] = custom_labels(input_df, "Study", "Technology") if labels is None else list(labels)
     # Match names in the Input Data with the desired output structure
     name_matcher = {"region": "Territory",
                     "power_technology": "Technology",
@@ -99,44 +145,31 @@ def match_unit_values(PATH):
         if name not in exceptions:
             df[name] = input_df[name_matcher[name]]
 
-    for name in exceptions:
-        if name == "power_net":
-            df["power_net"] = input_df.apply(lambda x: x.P_NET if ~np.isnan(x.P_NET) else np.mean([x.P_MAX, x.P_MIN]),
-                                             axis=1)
-        if name == "heat_rate":
-            df["heat_rate"] = input_df.apply(lambda x: heat_rate_matching(x.HR, x.HR_UNITS, x.ELEC_EFF), axis=1)
-            df["electric_efficiency"] = df.apply(
-                lambda x: x.electric_efficiency if ~np.isnan(x.electric_efficiency) else hr_to_eff(x.heat_rate),
-                axis=1)
-
-        if name == "heat_rate_cc":
-            df["heat_rate_cc"] = input_df.apply(lambda x: heat_rate_matching(x.HR_CC, x.HR_UNITS, x.ELEC_EFF_CC),
-                                                axis=1)
-            df["electric_efficiency_cc"] = df.apply(
-                lambda x: x.electric_efficiency_cc if ~np.isnan(x.electric_efficiency_cc) else \
-                                                    hr_to_eff(x.heat_rate_cc), axis=1)
-
-        if name == "fuel_emission_factor":
-            df["fuel_emission_factor"] = input_df.apply(lambda x: fuel_emf_dimension_match(x.EF_FUEL, x.EF_FUEL_UNITS),
-                                                        axis=1)
-
-        if name == "plant_emission":
-            df["plant_emission"] = input_df.apply(lambda x: plant_emf_dimension_match(x.EF_PLANT, x.EF_PLANT_UNITS),
-                                                  axis=1)
-            df["fuel_emission_factor"] = df.apply(lambda x: calc_fuel_emf(x.plant_emission, x.heat_rate) \
-                                            if np.isnan(x.fuel_emission_factor) else x.fuel_emission_factor, axis=1)
-
-        if name == "FCF":
-            df["FCF"] = input_df.apply(lambda x: x.FCF if ~np.isnan(x.FCF) else calculate_FCF(x.DISC_RATE, x.LIFE),
-                                       axis=1)
-        if name == "fixed_om":
-            df["fixed_om"] = input_df.apply(lambda x: fom_harmonization(x.FOM, x.FOM_UNITS, x.P_NET, x.LIFE), axis=1)
-
-        if name == "fixed_om_cc":
-            df["fixed_om_cc"] = input_df.apply(lambda x: fom_harmonization(x.FOM_CC, x.FOM_UNITS, x.P_NET, x.LIFE),
-                                               axis=1)
-
-        if name == "fuel_cost":
-            df["fuel_cost"] = input_df.apply(lambda x: fuel_dimension_match(x.FC, x.FC_UNITS, x.Fuel), axis=1)
+    def col(name):
+        return input_df[name].to_numpy(dtype=float)
+
+    df["power_net"] = fill_missing(col("P_NET"), (col("P_MAX") + col("P_MIN")) / 2)
+
+    df["heat_rate"] = heat_rate_matching_array(col("HR"), input_df["HR_UNITS"], col("ELEC_EFF"))
+    df["electric_efficiency"] = fill_missing(df["electric_efficiency"].to_numpy(dtype=float),
+                                             hr_to_eff(df["heat_rate"].to_numpy()))
+
+    df["heat_rate_cc"] = heat_rate_matching_array(col("HR_CC"), input_df["HR_UNITS"], col("ELEC_EFF_CC"))
+    df["electric_efficiency_cc"] = fill_missing(df["electric_efficiency_cc"].to_numpy(dtype=float),
+                                                hr_to_eff(df["heat_rate_cc"].to_numpy()))
+
+    df["fuel_emission_factor"] = fuel_emf_dimension_match_array(col("EF_FUEL"), input_df["EF_FUEL_UNITS"])
+
+    df["plant_emission"] = plant_emf_dimension_match_array(col("EF_PLANT"), input_df["EF_PLANT_UNITS"])
+    df["fuel_emission_factor"] = fill_missing(df["fuel_emission_factor"].to_numpy(),
+                                              calc_fuel_emf(df["plant_emission"].to_numpy(),
+                                                            df["heat_rate"].to_numpy()))
+
+    df["FCF"] = fill_missing(col("FCF"), calculate_FCF(col("DISC_RATE"), col("LIFE")))
+
+    df["fixed_om"] = fom_harmonization_array(col("FOM"), input_df["FOM_UNITS"], col("P_NET"), col("LIFE"))
+    df["fixed_om_cc"] = fom_harmonization_array(col("FOM_CC"), input_df["FOM_UNITS"], col("P_NET"), col("LIFE"))
+
+    df["fuel_cost"] = fuel_dimension_match_array(col("FC"), input_df["FC_UNITS"], input_df["Fuel"].to_numpy())
     df = df.set_index("label")
     return df
@@ -1,5 +1,7 @@
 import logging
+from functools import lru_cache
 import numpy as np
+import pandas as pd
 
 # Units
 BTU_to_KJ = 1.05506
@@ -137,6 +139,154 @@ def fuel_emf_dimension_match(fuel_emf, units):
     return fuel_emf * mass_x / heat_x
 
 
+# Unit factor registry, each distinct unit string is parsed once into the factors of its conversion and the factors
+# are then applied to whole columns
+
+
+def split_units(units):
+    """
+    Splits units of the form X_Y
+    :param units: Units string
+    :return: Tuple with the upper case parts, None if the units are not of the form X_Y
+    """
+    try:
+        left, right = [s.upper() for s in units.split("_")]
+    except (ValueError, AttributeError):
+        return None
+    return left, right
+
+
+@lru_cache(maxsize=None)
+def hr_unit_factors(units):
+    """
+    Factors of hr_dimension_match
+    :param units: Units of the heat rate in the form X_Y where X: Heat units, Y: Electrical Units
+    :return: Heat factor, electricity factor
+    """
+    parts = split_units(units)
+    if parts is None:
+        return 1, 1
+    return heat_factor(parts[0]), elec_factor(parts[1])
+
+
+@lru_cache(maxsize=None)
+def plant_emf_unit_factors(units):
+    """
+    Factors of plant_emf_dimension_match
+    :param units: Units in the form X_Y where X is the mass unit and Y is the electricity unit
+    :return: Mass factor, electricity factor
+    """
+    parts = split_units(units)
+    if parts is None:
+        return 1, 1
+    return mass_factor(parts[0]), elec_factor(parts[1])
+
+
+@lru_cache(maxsize=None)
+def fuel_emf_unit_factors(units):
+    """
+    Factors of fuel_emf_dimension_match
+    :param units: Units in the form X_Y where X is the mass unit and Y is the heat unit
+    :return: Mass factor, heat factor
+    """
+    parts = split_units(units)
+    if parts is None:
+        return 1, 1
+    return mass_factor(parts[0]), heat_factor(parts[1])
+
+
+@lru_cache(maxsize=None)
+def lower_unit(units):
+    """
+    Lower part of units of the form X_Y as used by fom_harmonization and fuel_dimension_match
+    :param units: Units string
+    :return: Upper case lower part, "none" if the units are not of the form X_Y
+    """
+    parts = split_units(units)
+    if parts is None:
+        return "none"
+    return parts[1]
+
+
+def unit_factors(units, parser):
+    """
+    Parses every distinct unit of a column once and maps the result back to the rows
+    :param units: Series with the unit strings
+    :param parser: Function from a unit string to a factor or tuple of factors
+    :return: Array with the parsed values of each row, with one column per factor
+    """
+    codes, uniques = pd.factorize(units)
+    # Missing units get the last position so the code -1 of pandas points to them
+    table = np.array([parser(u) for u in uniques] + [parser(np.nan)])
+    return table[codes]
+
+
+def hr_dimension_match_array(hr, units):
+    """
+    Column version of hr_dimension_match, like it heat rates with units that are not of the form X_Y are kept and
+    unknown units give NaN
+    :param hr: Array of heat rates
+    :param units: Series of units
+    :return: Array of heat rates in KJ/KWh
+    """
+    missing = pd.isna(units).to_numpy() & ~np.isnan(hr)
+    if missing.any():
+        raise ValueError("Heat rates of rows {} have no units".format(", ".join(map(str, units.index[missing]))))
+    factors = unit_factors(units, hr_unit_factors).astype(float)
+    return hr * factors[:, 0] / factors[:, 1]
+
+
+def plant_emf_dimension_match_array(plant_emf, units):
+    """
+    Column version of plant_emf_dimension_match
+    :param plant_emf: Array of plant emission factors
+    :param units: Series of units
+    :return: Array of emission factors in the form Kg per KWh
+    """
+    factors = unit_factors(units, plant_emf_unit_factors).astype(float)
+    return plant_emf * factors[:, 0] / factors[:, 1]
+
+
+def fuel_emf_dimension_match_array(fuel_emf, units):
+    """
+    Column version of fuel_emf_dimension_match
+    :param fuel_emf: Array of fuel emission factors
+    :param units: Series of units
+    :return: Array of transformed values
+    """
+    factors = unit_factors(units, fuel_emf_unit_factors).astype(float)
+    return fuel_emf * factors[:, 0] / factors[:, 1]
+
+
+def fom_harmonization_array(fom, units, power, life):
+    """
+    Column version of fom_harmonization
+    :param fom: Array of fixed O&M costs
+    :param units: Series of units
+    :param power: Array of net power of the plants
+    :param life: Array of lifespans
+    :return: Array of harmonized costs
+    """
+    low = unit_factors(units, lower_unit)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.select([low == "KW", low == "KWY", low == "Y", low == "none"],
+                         [fom / life, fom, fom / (power * 1000), fom / (life * power * 1000)], fom)
+
+
+def fuel_dimension_match_array(cost, units, fuel):
+    """
+    Column version of fuel_dimension_match
+    :param cost: Array of fuel costs
+    :param units: Series of units
+    :param fuel: Array of fuel names
+    :return: Array of harmonized costs
+    """
+    low = unit_factors(units, lower_unit)
+    hhv = np.select([fuel == "illinois_6", fuel == "Lignite", fuel == "Bituminous"],
+                    [illinois_6_HHV, lignite_HHV, bit_HHV], lignite_HHV)
+    return np.select([low == "TON", low == "MMBTU"], [cost / hhv, cost / MMBTU_to_GJ], cost)
+
+
 # General Calculations
 
 
@@ -156,10 +306,10 @@ def calculate_FCF(r, T):
 def eff_to_hr(eff):
     """
     Convert electric efficiency into heat rate
-    :param eff: Efficiency value, only 0 to 1
+    :param eff: Efficiency value or array, only 0 to 1
     :return: Heat rate as KJ heat/ KWh electricity
     """
-    assert 0 <= eff <= 1, "Efficiency out of range"
+    assert np.all((0 <= eff) & (eff <= 1)), "Efficiency out of range"
     return 3600 / eff
 
 
@@ -1,67 +1,70 @@
 from src.harmonization import cost_calculations, cost_harmonization, unit_harmonization
 from src.harmonization.unit_transformation_functions import calculate_FCF, HHV_to_LHV
-from src.harmonization.cost_transformation_functions import change_currency, index_generator
-from src.tools.config_loader import Configuration
+from src.harmonization.cost_transformation_functions import change_currency, index_generator, \
+    index_sources_fingerprint, create_index_table
+from src.tools.config_loader import current_config, use_config, thaw
+from src.tools.pipeline import hash_file
+from src.tools.tabular import read_table, write_table
+from pathlib import Path
+import pandas as pd
+import numpy as np
+import hashlib
+import logging
 import json
-config = Configuration.get_instance()
-io = config["IO"]
-local_config = config["HarmonizationTool"]
+import os
 
 
 def fuel_data_loader():
-    with open(io["harmonization_fuels_defalut_path"]) as json_file:
+    with open(current_config()["IO"]["harmonization_fuels_defalut_path"]) as json_file:
         fuel_data = json.load(json_file)
     return fuel_data
 
-# Uncomment once you have the datasources in the proper directories
-#fuel_data = fuel_data_loader()
-#idx_map = index_generator()
 
-
-def mapper(row, fuel_name):
+def fuel_defaults(df, mask, fuel_dict, cost, idx_map):
     """
-    Nested support function
+    Nested support function, imposes the values of a default fuel on the masked rows
+    :param df: DataFrame of the harmonized values
+    :param mask: Boolean array of the rows to be updated
+    :param fuel_dict: Default fuel data
+    :param cost: Cost of the fuel in 2019 USD per GJ
+    :param idx_map: Index map or IndexTable for the currency change
+    :return: Updated DataFrame
     """
-    fuel_dict = fuel_data[fuel_name]
     LHV = fuel_dict["LHV_GJ"]
     HHV = fuel_dict["HHV_GJ"]
-    row["fuel_cost"] = change_currency(fuel_dict["Cost_2019_USD"] / LHV, idx_map, 2019, "USDEUR")
-    row["fuel_name"] = fuel_dict["Type"]
-    if row["heat_basis"] == "HHV":
-        row["heat_rate"] = HHV_to_LHV(row["heat_rate"], HHV, LHV)
-        row["heat_rate_cc"] = HHV_to_LHV(row["heat_rate_cc"], HHV, LHV)
-    return row
+    df.loc[mask, "fuel_cost"] = float(change_currency(cost, idx_map, 2019, "USDEUR"))
+    hhv_mask = mask & (df["heat_basis"] == "HHV").to_numpy()
+    df.loc[hhv_mask, "heat_rate"] = HHV_to_LHV(df.loc[hhv_mask, "heat_rate"], HHV, LHV)
+    df.loc[hhv_mask, "heat_rate_cc"] = HHV_to_LHV(df.loc[hhv_mask, "heat_rate_cc"], HHV, LHV)
+    return df
 
 
-def map_fuel_cost(row, fuel_data, idx_map):
+def map_fuel_cost(df, fuel_data, idx_map):
     """
     Maps the fuels of the souzrces into a generalized group of fuels, It is recommended agaisnt this option because
     the heat rates of the reported plants are already consistent with their fuel prices so imposing values causes
     uncertain results
-    :param row: row of the dataframe, this methhod only works in a dataframe
+    :param df: DataFrame of the harmonized values
     :param fuel_data: Default fuels to override the original values
-    :param idx_map: index map for the cost translations
-    :return: Updated row
-    """
-    # Try to extract
-
-    if row["fuel_name"] in local_config["FuelEquivalentNames"]["HardCoals"]:
-        row = mapper(row, "Illinois_6_ton")
-    elif row["fuel_name"] in local_config["FuelEquivalentNames"]["HardCoals"]:
-        row = mapper(row, "powder_river_basin_ton")
-    elif row["fuel_name"] in local_config["FuelEquivalentNames"]["Other"]:
-        row["fuel_cost"] = 1
-        row["fuel_name"] = "powder_river_basin_ton"
-    elif row["fuel_name"] == "natural_gas":
-        LHV = fuel_data["natural_gas_m3"]["LHV_GJ"]
-        HHV = fuel_data["natural_gas_m3"]["HHV_GJ"]
-        row["fuel_cost"] = change_currency(fuel_data["natural_gas_m3"]["Cost_2019_USD"] * 1000 / (LHV), idx_map, 2019,
-                                           "USDEUR")
-        if row["heat_basis"] == "HHV":
-            row["heat_rate"] = HHV_to_LHV(row["heat_rate"], HHV, LHV)
-            row["heat_rate_cc"] = HHV_to_LHV(row["heat_rate_cc"], HHV, LHV)
-
-    return row
+    :param idx_map: Index map or IndexTable for the cost translations
+    :return: Updated DataFrame
+    """
+    local_config = current_config()["HarmonizationTool"]
+    names = df["fuel_name"].to_numpy()
+    hard_coals = np.isin(names, local_config["FuelEquivalentNames"]["HardCoals"])
+    other = ~hard_coals & np.isin(names, local_config["FuelEquivalentNames"]["Other"])
+    natural_gas = ~hard_coals & ~other & (names == "natural_gas")
+
+    coal_dict = fuel_data["Illinois_6_ton"]
+    df = fuel_defaults(df, hard_coals, coal_dict, coal_dict["Cost_2019_USD"] / coal_dict["LHV_GJ"], idx_map)
+    df.loc[hard_coals, "fuel_name"] = coal_dict["Type"]
+
+    df.loc[other, "fuel_cost"] = 1
+    df.loc[other, "fuel_name"] = "powder_river_basin_ton"
+
+    gas_dict = fuel_data["natural_gas_m3"]
+    df = fuel_defaults(df, natural_gas, gas_dict, gas_dict["Cost_2019_USD"] * 1000 / gas_dict["LHV_GJ"], idx_map)
+    return df
 
 
 def cost_harmonization_main(input_path, year, same_fuel=False, same_fcf=True, same_capture_eff=True):
@@ -69,38 +72,131 @@ def cost_harmonization_main(input_path, year, same_fuel=False, same_fcf=True, sa
     Wrapping function of the Harmonization tool, it converts the values from the input file into the
     harmonized dataframe
     :param input_path: Path of the input dataframe
-    :param year: Desired year of conversion, currently does not support 2020
+    :param year: Desired year of conversion, years without index data need the InterpolateIndexes option
     :param same_fuel: Option to override fuelprices and heatrates from the original studies
     :param same_fcf: Option to override Fixed cost factors from the orignal studies
     :param same_capture_eff: Option to override the capture efficiency from the original studies.
     :return: DataFrame of the updated values, Index map utilized for the production of said dataframe
     """
-    df_units = unit_harmonization.match_unit_values(input_path)
+    input_df = unit_harmonization.read_input(input_path)
+    return harmonize_studies(input_df, year, same_fuel, same_fcf, same_capture_eff)
+
+
+def harmonize_studies(input_df, year, same_fuel=False, same_fcf=True, same_capture_eff=True, labels=None):
+    """
+    Unit and cost harmonization and LCOE of the rows of the raw input
+    :param input_df: DataFrame of the raw input file, or a subset of its rows
+    :param year: Desired year of conversion
+    :param same_fuel: Option to override fuelprices and heatrates from the original studies
+    :param same_fcf: Option to override Fixed cost factors from the orignal studies
+    :param same_capture_eff: Option to override the capture efficiency from the original studies.
+    :param labels: Labels of the rows, if None they are created from the given rows
+    :return: DataFrame of the updated values, Index map utilized for the production of said dataframe
+    """
+    df_units = unit_harmonization.harmonize_units(input_df, labels)
     df_costs, idx_map = cost_harmonization.transform_costs(df_units, year)
     # df_costs = df_units
     # idx_map = None
     if same_fuel:
-        df_costs = df_costs.apply(lambda row: map_fuel_cost(row, fuel_data, idx_map), axis=1)
+        # The fuel defaults are priced in 2019, which is not necessarily a year of the index map
+        df_costs = map_fuel_cost(df_costs, fuel_data_loader(), create_index_table())
     if same_fcf:
         df_costs["FCF"] = calculate_FCF(10, 25)
     if same_capture_eff:
         df_costs["capture_efficiency"] = 0.9
-    df_cc = cost_calculations.calc_cc_lcoe_df(df_units)
+    df_cc = cost_calculations.calc_cc_lcoe_df(df_costs)
 
     return df_cc, idx_map
 
 
-def harmonization():
-    with open(io["harmonization_fuels_defalut_path"], "r") as fuels:
-        fuel_data = json.load(fuels)
+def row_fingerprints(input_df):
+    """
+    Hash of the raw values of each row of the input
+    :param input_df: DataFrame of the raw input file
+    :return: List of hashes as strings
+    """
+    return pd.util.hash_pandas_object(input_df, index=False).astype(str).to_list()
 
-    df, idx_map = cost_harmonization_main(io["harmonization_input_path"],
-                                          local_config["Options"]["CostYear"],
-                                          local_config["Options"]["SameFuel"],
-                                          local_config["Options"]["SameFCF"],
-                                          local_config["Options"]["SameCaptureEfficiency"])
 
-    df.to_csv(io["harmonization_df_output_path"], na_rep="NaN", encoding="iso-8859-1", index=True)
+def settings_fingerprint(options):
+    """
+    Hash of everything besides the input rows that changes the harmonized values, the options, the fuel equivalent
+    names and the index and fuel sources
+    :param options: Options of the harmonization tool
+    :return: Hexadecimal hash as string
+    """
+    config = current_config()
+    description = {"options": thaw(options), "indexes": index_sources_fingerprint(),
+                   "fuel_names": thaw(config["HarmonizationTool"]["FuelEquivalentNames"])}
+    if options["SameFuel"]:
+        description["fuels"] = hash_file(config["IO"]["harmonization_fuels_defalut_path"])
+    return hashlib.sha1(json.dumps(description, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def load_fingerprints(path):
+    """
+    Loads the fingerprints of the previous harmonization
+    :return: Dictionary with the settings fingerprint and the row fingerprints per label, None if there is none
+    """
+    if not Path(path).is_file():
+        return None
+    with open(path, "r") as file:
+        return json.load(file)
+
+
+def save_fingerprints(fingerprints, path):
+    """
+    Writes the fingerprints of a harmonization, a run that stops while writing leaves the previous file intact
+    """
+    path = Path(path)
+    tmp_path = path.with_name("{}.{}.tmp".format(path.name, os.getpid()))
+    with open(tmp_path, "w") as file:
+        json.dump(fingerprints, file)
+    os.replace(tmp_path, path)
+
+
+def harmonization(incremental=False, config=None):
+    """
+    Harmonizes the studies of the input file and writes the output file
+    :param incremental: If True only the new or changed rows of the input are harmonized, the rest are kept from the
+    previous output as long as the options and the index sources did not change
+    :param config: ConfigSnapshot, by default the current configuration
+    """
+    with use_config(config) as config:
+        _harmonization(incremental, config)
+
+
+def _harmonization(incremental, config):
+    io = config["IO"]
+    options = config["HarmonizationTool"]["Options"]
+    input_df = unit_harmonization.read_input(io["harmonization_input_path"])
+    labels = unit_harmonization.custom_labels(input_df, "Study", "Technology")
+    fingerprints = {"settings": settings_fingerprint(options),
+                    "rows": dict(zip(labels, row_fingerprints(input_df)))}
+
+    previous = load_fingerprints(io["harmonization_fingerprint_path"]) if incremental else None
+    if previous is not None and previous["settings"] == fingerprints["settings"] and \
+            Path(io["harmonization_df_output_path"]).is_file():
+        previous_df = read_table(io["harmonization_df_output_path"], index_col="label")
+        changed = np.array([previous["rows"].get(label) != fingerprints["rows"][label] or
+                            label not in previous_df.index for label in labels], dtype=bool)
+    else:
+        previous_df = None
+        changed = np.ones(len(labels), dtype=bool)
+
+    logging.info("Harmonizing {} new or changed studies out of {}".format(changed.sum(), len(labels)))
+    parts = []
+    if previous_df is not None:
+        parts.append(previous_df.loc[[label for label, c in zip(labels, changed) if not c]])
+    if changed.any():
+        df, idx_map = harmonize_studies(input_df[changed], options["CostYear"], options["SameFuel"],
+                                        options["SameFCF"], options["SameCaptureEfficiency"],
+                                        [label for label, c in zip(labels, changed) if c])
+        parts.append(df)
+    df = pd.concat(parts).loc[labels]
+
+    write_table(df, io["harmonization_df_output_path"], index=True)
+    save_fingerprints(fingerprints, io["harmonization_fingerprint_path"])
     return
 
 
@@ -1,20 +1,16 @@
-from src.tools.config_loader import Configuration
+from src.tools.config_loader import current_config, use_config
 from src.technoeconomical.cost_operations_functions import cost_of_carbon_capture
-from src.harmonization.cost_transformation_functions import convert_value, index_generator
+from src.harmonization.cost_transformation_functions import create_index_table
+from src.tools.tabular import write_table
 import pandas as pd
-config = Configuration.get_instance()
 pd.set_option('display.max_columns', None)
-#idx_map = index_generator()
-io = config["IO"]
 
 CLINKER_EMISSION_FACTOR = 0.5  # kgCO2 / kgClinker
 CLINKER_CEMENT_RATIO = 0.87  # kgClinker / kgCement
 
-CAPTURE_EFF = config["InputHomogenization"]["CostOfCCConfig"]["DefaultValues"]["CaptureEfficiency"]  # % of CO2 emitted
-
-#COST_OF_CLINKER_REF = convert_value(62.6, idx_map, 2014, 2019, "CEPCI")  # € / t Clinker 2014
-#COST_OF_CLINKER_MEA = convert_value(107.4, idx_map, 2014, 2019, "CEPCI")  # -
-#COST_OF_CLINKER_OXY = convert_value(93.0, idx_map, 2014, 2019, "CEPCI")  # -
+COST_OF_CLINKER_2014 = {"REF": 62.6,  # € / t Clinker 2014
+                        "MEA": 107.4,
+                        "OXY": 93.0}
 
 SPECIFIC_POWER_REF = 15.88  # MW / MtCLinker
 SPECIFIC_POWER_CAP = 29.5  # MW /MtClinker
@@ -24,6 +20,26 @@ CF = 1
 ELEC_EMISSION_FACTOR = 0.85  # kg / kWh
 
 
+def capture_efficiency():
+    """
+    Share of the emitted CO2 that is captured, it is read from the configuration when it is used
+    """
+    return current_config()["InputHomogenization"]["CostOfCCConfig"]["DefaultValues"]["CaptureEfficiency"]
+
+
+def cost_of_clinker(method, index_table=None, year=2019):
+    """
+    Cost of clinker production converted from 2014 to the given year with the CEPCI
+    :param method: REF for the reference plant, MEA or OXY for the capture plants
+    :param index_table: IndexTable for the conversion, if None it is created from the index store
+    :param year: Desired year
+    :return: Cost as € per t of clinker
+    """
+    if index_table is None:
+        index_table = create_index_table()
+    return float(index_table.convert(COST_OF_CLINKER_2014[method], 2014, year, "CEPCI"))
+
+
 def calculate_clinker(annual_production, clinker_cement_ratio):
     """
     Calculate annual clinker production based on given cement/clinker ratio
@@ -69,21 +85,26 @@ def calculate_total_emisisons(clinker_emissions, power_emissions, capture_ratio=
     return emissions, captured
 
 
-def cost_of_carbon_capture_cement():
+def cost_of_carbon_capture_cement(config=None):
     """
     Main function for the calculation of cost of carbon capture from cement production
+    :param config: ConfigSnapshot, by default the current configuration
     :return: dataframe with the cost and amounts
     """
-    E_FUEL_REF = calculate_primary_energy_emissions(SPECIFIC_POWER_REF, ELEC_EMISSION_FACTOR)
-    E_FUEL_CAP = calculate_primary_energy_emissions(SPECIFIC_POWER_CAP, ELEC_EMISSION_FACTOR)
-
-    df = pd.read_csv(io["CEMENT_INPUT_PATH"], **config["InputConfig"]["iron"])
-    data = df["Production"].values
-    clinker = (calculate_clinker(val, CLINKER_CEMENT_RATIO) for val in data)
-    e_clinker = (calculate_clinker_emissions(val, CLINKER_CEMENT_RATIO) for val in clinker)
-    cap_emm_pairs = (calculate_total_emisisons(val, E_FUEL_CAP, CAPTURE_EFF) for val in e_clinker)
-    captured = [x[1] for x in cap_emm_pairs]
-    cost = [cost_of_carbon_capture(COST_OF_CLINKER_REF, COST_OF_CLINKER_OXY, val) for val in captured]
+    with use_config(config) as config:
+        E_FUEL_REF = calculate_primary_energy_emissions(SPECIFIC_POWER_REF, ELEC_EMISSION_FACTOR)
+        E_FUEL_CAP = calculate_primary_energy_emissions(SPECIFIC_POWER_CAP, ELEC_EMISSION_FACTOR)
+        index_table = create_index_table()
+        cost_ref = cost_of_clinker("REF", index_table)
+        cost_cap = cost_of_clinker(config["InputHomogenization"]["CementMethod"], index_table)
+
+        df = pd.read_csv(config["IO"]["CEMENT_INPUT_PATH"], **config["InputConfig"]["iron"])
+        data = df["Production"].values
+        clinker = (calculate_clinker(val, CLINKER_CEMENT_RATIO) for val in data)
+        e_clinker = (calculate_clinker_emissions(val, CLINKER_CEMENT_RATIO) for val in clinker)
+        cap_emm_pairs = (calculate_total_emisisons(val, E_FUEL_CAP, capture_efficiency()) for val in e_clinker)
+        captured = [x[1] for x in cap_emm_pairs]
+        cost = [cost_of_carbon_capture(cost_ref, cost_cap, val) for val in captured]
 
     df_out = df.copy()
     df_out["AmountCapturedMtY"] = captured
@@ -94,12 +115,14 @@ def cost_of_carbon_capture_cement():
     return df_out
 
 
-def create():
+def create(config=None):
     """
-    Support function for the production of the dataset as a csv file
+    Support function for the production of the dataset file
+    :param config: ConfigSnapshot, by default the current configuration
     """
-    df = cost_of_carbon_capture_cement()
-    df.to_csv(io["cement_output_path"], index=True)
+    with use_config(config) as config:
+        df = cost_of_carbon_capture_cement()
+        write_table(df, config["IO"]["cement_output_path"], index=True)
 
 
 if __name__ == "__main__":
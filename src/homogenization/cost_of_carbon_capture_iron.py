@@ -1,27 +1,43 @@
-from src.tools.config_loader import Configuration
-from src.harmonization.cost_transformation_functions import convert_value, index_generator
+from src.tools.config_loader import current_config, use_config
+from src.harmonization.cost_transformation_functions import create_index_table
+from src.tools.tabular import write_table
 import pandas as pd
-config = Configuration.get_instance()
 pd.set_option('display.max_columns', None)
-io = config["IO"]
-#idx_map = index_generator()
 # Data from Kuramochi et al. 2012
 
 SPECIFIC_CAPTURE_BF = 0.89  # t / tpig iron
 SPECIFIC_CAPTURE_COREX = 2.5
-SPECIFIC_CAPTURE = SPECIFIC_CAPTURE_BF if config["InputHomogenization"]["SteelMethod"] == "BF" else SPECIFIC_CAPTURE_COREX
 PIG_TO_STEEL = 0.997 / 0.95
 
 PIG_TO_IRON = 0.98 / 0.95
-#uncomment when you have the data
-#SPECIFIC_COST_BF = convert_value(420, idx_map, 2007, 2019, "CEPCI")  # t / 2007€ / troll
-#SPECIFIC_COST_COREX = convert_value(400, idx_map, 2007, 2019, "CEPCI")
-#SPECIFIC_COST_REF = convert_value(400, idx_map, 2007, 2019, "CEPCI")
-#SPECIFIC_COST = SPECIFIC_COST_BF if config["InputHomogenization"]["SteelMethod"] == "BF" else SPECIFIC_COST_COREX
+SPECIFIC_COST_2007 = {"BF": 420,  # t / 2007€ / troll
+                      "COREX": 400,
+                      "REF": 400}
 SCALING_FACTOR = -0.2
 REFERENCE_SCALE = 4  # Mt/y
 
 
+def specific_capture():
+    """
+    Captured CO2 per production unit of the configured steel method
+    """
+    return SPECIFIC_CAPTURE_BF if current_config()["InputHomogenization"]["SteelMethod"] == "BF" \
+        else SPECIFIC_CAPTURE_COREX
+
+
+def specific_cost(method, index_table=None, year=2019):
+    """
+    Specific cost of the steel production converted from 2007 to the given year with the CEPCI
+    :param method: REF for the reference plant, BF or COREX for the capture plants
+    :param index_table: IndexTable for the conversion, if None it is created from the index store
+    :param year: Desired year
+    :return: Cost per production unit
+    """
+    if index_table is None:
+        index_table = create_index_table()
+    return float(index_table.convert(SPECIFIC_COST_2007[method], 2007, year, "CEPCI"))
+
+
 def calculate_specific_captured_carbon_steel(production, specific_capture):
     """
     Calculate the specific captured carbon per production unit
@@ -55,14 +71,20 @@ def calculate_cost_of_carbon_capture_steel(specific_cost, specific_captured_amou
     return specific_cost / specific_captured_amount
 
 
-def cost_of_carbon_capture_steel():
+def cost_of_carbon_capture_steel(config=None):
     """
     Unifying function
+    :param config: ConfigSnapshot, by default the current configuration
     """
-    df = pd.read_csv(io["IRON_INPUT_PATH"], **config["InputConfig"]["iron"])
-    data = df["CapacityM"].values
-    amounts = [calculate_specific_captured_carbon_steel(val, SPECIFIC_CAPTURE) for val in data]  # tco2/year
-    costs_s = [calculate_specific_cost(val, SPECIFIC_COST, SPECIFIC_COST_REF) for val in data]  # €2019/ y
+    with use_config(config) as config:
+        df = pd.read_csv(config["IO"]["IRON_INPUT_PATH"], **config["InputConfig"]["iron"])
+        data = df["CapacityM"].values
+        index_table = create_index_table()
+        cost_ref = specific_cost("REF", index_table)
+        cost_cap = specific_cost("BF" if config["InputHomogenization"]["SteelMethod"] == "BF" else "COREX",
+                                 index_table)
+        amounts = [calculate_specific_captured_carbon_steel(val, specific_capture()) for val in data]  # tco2/year
+    costs_s = [calculate_specific_cost(val, cost_cap, cost_ref) for val in data]  # €2019/ y
     costs = [calculate_cost_of_carbon_capture_steel(c, a) for c, a in zip(costs_s, amounts)]
     amountsmt = [am / 1000 for am in amounts]
     df_out = df.copy()
@@ -73,9 +95,10 @@ def cost_of_carbon_capture_steel():
     return df_out
 
 
-def create():
-    df = cost_of_carbon_capture_steel()
-    df.to_csv(io["steel_output_path"], index=True)
+def create(config=None):
+    with use_config(config) as config:
+        df = cost_of_carbon_capture_steel()
+        write_table(df, config["IO"]["steel_output_path"], index=True)
 
 
 if __name__ == "__main__":
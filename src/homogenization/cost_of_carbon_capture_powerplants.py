@@ -1,18 +1,29 @@
 from src.technoeconomical.cost_operations_functions import *
 from src.homogenization.plant_cost_matching import match_powerplant_delta_values
-from src.tools.config_loader import Configuration
-from src.harmonization.cost_transformation_functions import create_index_map, change_currency
+from src.tools.config_loader import current_config, use_config
+from src.harmonization.cost_transformation_functions import create_index_table
+from functools import lru_cache
 import json
+import numpy as np
 import pandas as pd
-config = Configuration.get_instance()
-io = config["IO"]
-local_config = config["InputHomogenization"]
-default_values = local_config["CostOfCCConfig"]["DefaultValues"]
 
-FUELS = local_config["RegressionConfig"]["Fuels"].copy()
-if local_config["IncludeBio"]:
-    FUELS.append("Bioenergy")
-FUEL_DEFAULTS_PATH = io["harmonization_fuels_defalut_path"]
+
+def default_values():
+    """
+    Default values of the cost of carbon capture calculation in the current configuration
+    """
+    return current_config()["InputHomogenization"]["CostOfCCConfig"]["DefaultValues"]
+
+
+def plant_fuels():
+    """
+    Fuels of the power plants, bioenergy is included if it is configured
+    """
+    local_config = current_config()["InputHomogenization"]
+    fuel_list = list(local_config["RegressionConfig"]["Fuels"])
+    if local_config["IncludeBio"]:
+        fuel_list.append("Bioenergy")
+    return fuel_list
 
 
 def map_capacity_factor(fuel):
@@ -20,7 +31,30 @@ def map_capacity_factor(fuel):
     :param fuel: Select fuel capacity factor
     :return:
     """
-    return default_values["CapacityFactor"][fuel]
+    return default_values()["CapacityFactor"][fuel]
+
+
+def fuel_codes(data, fuels=None):
+    """
+    Position of the fuel of every power plant in the list of fuels
+    :param data: DataFrame with the power plants
+    :param fuels: List of fuels, by default the configured ones
+    :return: Integer array
+    """
+    fuels = plant_fuels() if fuels is None else list(fuels)
+    codes = pd.Index(fuels).get_indexer(data["Fueltype"])
+    if (codes < 0).any():
+        unknown = data["Fueltype"][codes < 0].unique()
+        raise ValueError("Fuels {} should be one of {}".format(", ".join(map(str, unknown)), ", ".join(fuels)))
+    return codes.astype(np.intp)
+
+
+def capacity_factors(data):
+    """
+    Capacity factor of every power plant
+    """
+    fuels = plant_fuels()
+    return np.array([map_capacity_factor(fuel) for fuel in fuels])[fuel_codes(data, fuels)]
 
 
 def calculate_capex_lcoe_dataframe(data):
@@ -29,8 +63,8 @@ def calculate_capex_lcoe_dataframe(data):
     :param data: Dataframe with the parameters of the ecuation
     :return: DataFrame with new column contaiing LCOE from CAPEX
     """
-    data["capex_lcoe"] = data.apply(lambda x: calc_lcoe_capex(x.delta_capex, default_values["FCF"],
-                                                              map_capacity_factor(x.Fueltype)), axis=1)
+    fcf = default_values()["FCF"]
+    data["capex_lcoe"] = calc_lcoe_capex(data["delta_capex"].to_numpy(dtype=float), fcf, capacity_factors(data))
     return data
 
 
@@ -40,7 +74,7 @@ def calculate_om_lcoe_dataframe(data):
     :param data: Dataframe with the parameters of the equation
     :return: DataFrame with new column contaiing LCOE from CAPEX
     """
-    data["om_lcoe"] = data.apply(lambda x: calc_lcoe_om(0, x.delta_om, map_capacity_factor(x.Fueltype)), axis=1)
+    data["om_lcoe"] = calc_lcoe_om(0, data["delta_om"].to_numpy(dtype=float), capacity_factors(data))
     return data
 
 
@@ -61,21 +95,34 @@ def create_fuel_map(fuels):
     :param fuels: Fuel dictionary
     :return: DataFrame with mapped fuels
     """
-    fuel_default_data = load_fuel_defaults(FUEL_DEFAULTS_PATH)
+    config = current_config()
+    fuel_correction = config["InputHomogenization"]["FuelCorrection"]
+    fuel_default_data = load_fuel_defaults(config["IO"]["harmonization_fuels_defalut_path"])
     fuel_name_dict = {fuel_default_data[x]["Type"]: y for x, y in fuel_default_data.items()}
     fuel_map = pd.DataFrame()
     fuel_map["fuel"] = fuels
-    currency_map = create_index_map([2019])
+    index_table = create_index_table()
     for fuel in fuels:
         key = "_".join(fuel.lower().split(" "))
         idx = fuel_map.index[fuel_map["fuel"] == fuel]
         fuel_map.loc[idx, "emission_factor"] = fuel_name_dict[key]["Emission_Factor_KG_KJ"]
         cost = fuel_name_dict[key]["Cost_2019_USD"] / fuel_name_dict[key]["LHV_GJ"]
-        fuel_map.loc[idx, "fuel_cost"] = change_currency(cost, currency_map, 2019, "USDEUR") * local_config["FuelCorrection"]
+        fuel_map.loc[idx, "fuel_cost"] = index_table.fx(cost, 2019, "USDEUR") * fuel_correction
     fuel_map = fuel_map.set_index("fuel")
     return fuel_map
 
 
+@lru_cache(maxsize=8)
+def snapshot_fuel_map(config):
+    """
+    Fuel map of the configured fuels, it is created once per configuration snapshot and must not be modified
+    :param config: ConfigSnapshot
+    :return: DataFrame with mapped fuels
+    """
+    with use_config(config):
+        return create_fuel_map(plant_fuels())
+
+
 def calculate_fuel_lcoe_dataframe(data, map):
     """
     Calculate Fuel component of LCOE
@@ -83,8 +130,8 @@ def calculate_fuel_lcoe_dataframe(data, map):
     :param map: Fuel map for matching fuel properties
     :return: DataFrame with new column containing Fuel LCOE
     """
-    data["fuel_lcoe"] = data.apply(lambda x: calculate_lcoe_fuel(x.delta_heatrate, map.loc[x.Fueltype, "fuel_cost"]),
-                                   axis=1)
+    fuel_cost = map["fuel_cost"].to_numpy(dtype=float)[fuel_codes(data, map.index)]
+    data["fuel_lcoe"] = calculate_lcoe_fuel(data["delta_heatrate"].to_numpy(dtype=float), fuel_cost)
     return data
 
 
@@ -95,10 +142,10 @@ def calculate_reference_emissions_dataframe(data, map):
     :param map: Map with fuel data
     :return: DataFrame with new column containing reference capture rate
     """
-    data["captured_ref"] = data.apply(lambda x: calculate_emissions(x.heatrate + x.delta_heatrate,
-                                                                    map.loc[x.Fueltype, "emission_factor"],
-                                                                    default_values["CaptureEfficiency"])[1],
-                                      axis=1)
+    capture_efficiency = default_values()["CaptureEfficiency"]
+    emission_factor = map["emission_factor"].to_numpy(dtype=float)[fuel_codes(data, map.index)]
+    data["captured_ref"] = calculate_emissions((data["heatrate"] + data["delta_heatrate"]).to_numpy(dtype=float),
+                                               emission_factor, capture_efficiency)[1]
     return data
 
 
@@ -108,22 +155,24 @@ def calculate_yearly_emissions_dataframe(data):
     :param data: DataFrame with the input data
     :return: DataFrame with captured CO2 per Year
     """
-    data["capacity_factor_corrected"] = data.apply(lambda x: map_capacity_factor(x.Fueltype), axis=1)
+    data["capacity_factor_corrected"] = capacity_factors(data)
     data["captured"] = data["captured_ref"] * data["Capacity"] * data["capacity_factor_corrected"] * 8760 / 1000000
     return data
 
 
-def calculate_cost_of_carbon_capture(data):
+def calculate_cost_of_carbon_capture(data, config=None):
     """
     Wrapping function
+    :param config: ConfigSnapshot, by default the current configuration
     :return: DataFrame With cost of carbon capture of power plants
     """
-    map = create_fuel_map(FUELS)
-    data = calculate_capex_lcoe_dataframe(data)
-    data = calculate_om_lcoe_dataframe(data)
-    data = calculate_fuel_lcoe_dataframe(data, map)
-    data = calculate_reference_emissions_dataframe(data, map)
-    data = calculate_yearly_emissions_dataframe(data)
+    with use_config(config) as config:
+        map = snapshot_fuel_map(config)
+        data = calculate_capex_lcoe_dataframe(data)
+        data = calculate_om_lcoe_dataframe(data)
+        data = calculate_fuel_lcoe_dataframe(data, map)
+        data = calculate_reference_emissions_dataframe(data, map)
+        data = calculate_yearly_emissions_dataframe(data)
 
     data["lcoe"] = data["capex_lcoe"] + data["om_lcoe"] + data["fuel_lcoe"]
     data["cost_of_cc"] = 1000 * data["lcoe"] / data["captured_ref"]
@@ -1,19 +1,36 @@
-import powerplantmatching as pm
 import pandas as pd
 import logging
 import ast
-import math
-import numpy as np
-from src.tools.config_loader import Configuration
-config = Configuration.get_instance()
+import os
+from src.tools.config_loader import current_config
+from src.tools.tabular import read_table, write_table
+from src.homogenization.snapshots import SnapshotStore, pinned_snapshot
 pd.set_option('display.max_columns', None)
-io = config["IO"]
 
 # Power Plant Matching
 CONVENTIONAL = ['Hard Coal', 'Natural Gas', 'Lignite', 'Oil']
 BIOFUELS = ["Bioenergy"]
 
 
+def project_links(project_ids, source="OPSD"):
+    """
+    Link table of the plants and the ids of a source in their projectID dictionaries, each dictionary is parsed once
+    :param project_ids: Series of projectID dictionaries, or their string representation, indexed by plant id
+    :param source: Key of the source in the dictionaries
+    :return: Series of the ids of the source matched to each plant and DataFrame with one row per plant and source id
+    """
+    def source_ids(project_id):
+        if isinstance(project_id, str):
+            project_id = ast.literal_eval(project_id)
+        if not isinstance(project_id, dict):
+            return []
+        return list(project_id.get(source, []))
+
+    match_id = project_ids.map(source_ids)
+    links = match_id.explode().dropna().rename("source_id").rename_axis("id").reset_index()
+    return match_id, links.drop_duplicates()
+
+
 class DataSource:
     def __init__(self, data=None, local_path=None):
         self.data = data
@@ -26,11 +43,11 @@ class DataSource:
         self.data = dataframe
 
     def fetch_from_local(self, **kwargs):
-        data = pd.read_csv(self.local_path, **kwargs)
+        data = read_table(self.local_path, **kwargs)
         return data
 
-    def export_data(self, path):
-        self.data.to_csv(path, index=True)
+    def export_data(self, path, partition_cols=None):
+        write_table(self.data, path, index=True, partition_cols=partition_cols)
 
     def __str__(self):
         return self.data.__str__()
@@ -44,31 +61,41 @@ class DataSource:
 
 class OPSD(DataSource):
     def __init__(self, de=True):
+        io = current_config()["IO"]
         if de:
             super().__init__(local_path=io["LOCAL_OPSD_DE_PATH"])
         else:
             super().__init__(local_path=io["LOCAL_OPSD_EU_PATH"])
-
-        self.set_data(self.fetch_from_local())
+        snapshot_id = pinned_snapshot("OPSD_DE" if de else "OPSD_EU")
+        if snapshot_id is not None:
+            self.set_data(SnapshotStore().load(snapshot_id))
+        else:
+            self.set_data(self.fetch_from_local())
 
 
 class PowerPlantMatching(DataSource):
 
     def __init__(self, local=True):
+        io = current_config()["IO"]
         super().__init__(local_path=io["LOCAL_PPM_PATH"])
-        if local:
+        snapshot_id = pinned_snapshot("PPM")
+        if not local:
+            self.set_data(self.fetch_ppm_from_url())
+            self.export_data(self.local_path)
+            SnapshotStore().import_file(self.local_path, "PPM")
+        elif snapshot_id is not None:
+            self.set_data(SnapshotStore().load(snapshot_id).set_index("id"))
+        else:
             try:
                 self.set_data(self.fetch_from_local(index_col="id"))
             except FileNotFoundError:
                 msg = "The local file \"{}\" does not exist, please fetch from URL".format(io["LOCAL_PPM_PATH"])
                 logging.warning(msg)
                 self.data = None
-        else:
-            self.set_data(self.fetch_ppm_from_url())
-            self.export_data(self.local_path)
 
     @staticmethod
     def fetch_ppm_from_url():
+        import powerplantmatching as pm
         data = pm.powerplants(from_url=True)
         return data
 
@@ -86,13 +113,6 @@ class PowerPlantMatching(DataSource):
 
     @classmethod
     def opsd_efficiency(cls, fuels="conventional"):
-        def extract_column(column, labels, supp_df):
-            sub_df = supp_df[supp_df.id.isin(labels)]
-            vals = sub_df[column].values
-            if len(vals) == 0:
-                return np.nan
-            return "operating" if any(vals == "operating") else "shutdown"
-
         if fuels == "conventional":
             fuels = CONVENTIONAL
         elif fuels == "biofuels+conventional":
@@ -100,21 +120,20 @@ class PowerPlantMatching(DataSource):
         elif fuels == "biofuels":
             fuels = BIOFUELS
 
-        instance = cls(os.path.isfile(io["LOCAL_PPM_PATH"]))
+        instance = cls(pinned_snapshot("PPM") is not None or os.path.isfile(current_config()["IO"]["LOCAL_PPM_PATH"]))
         instance.set_data(instance.data[instance.data.Fueltype.isin(fuels)])
 
         main_data = instance.get_data()
         support_data = OPSD().data
 
-        main_data['match_id'] = main_data.projectID.apply(
-            lambda x: ast.literal_eval(x)['OPSD'] if 'OPSD' in ast.literal_eval(x).keys() else [])
-        main_data["Efficiency"] = 0
-        main_data["Efficiency"] = main_data["match_id"].apply(lambda x:
-                                                              support_data[
-                                                                  support_data.id.isin(x)].efficiency_data.mean())
-        main_data["Efficiency"] = main_data["Efficiency"].apply(lambda x: 0 if math.isnan(x) else x)
-        main_data["Operating"] = ""
-        main_data["Operating"] = main_data["match_id"].apply(lambda x: extract_column("status", x, support_data))
+        main_data["match_id"], links = project_links(main_data.projectID, "OPSD")
+        # Every link is joined with the OPSD rows of its id, the plants are then aggregated once
+        matched = links.merge(support_data[["id", "efficiency_data", "status"]],
+                              left_on="source_id", right_on="id", suffixes=("", "_opsd"))
+        efficiency = matched.groupby("id")["efficiency_data"].mean()
+        operating = matched["status"].eq("operating").groupby(matched["id"]).any()
+        main_data["Efficiency"] = main_data.index.map(efficiency).fillna(0).to_numpy()
+        main_data["Operating"] = main_data.index.map(operating.map({True: "operating", False: "shutdown"})).to_numpy()
         instance.set_data(main_data)
 
         return instance
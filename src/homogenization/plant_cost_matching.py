@@ -1,10 +1,8 @@
-from src.tools.config_loader import Configuration
+from src.tools.config_loader import current_config, use_config
 from src.homogenization.data_operations import DataSource
 import pandas as pd
+import numpy as np
 from src.harmonization.unit_transformation_functions import eff_to_hr
-config = Configuration.get_instance()
-io = config["IO"]
-local_config = config["InputHomogenization"]
 
 bio_map = pd.DataFrame({"fuel_type": 3 * ["bioenergy"],
                         "value": ["delta_capex", "delta_om", "delta_heatrate"],
@@ -17,22 +15,25 @@ def map_fuel_name(fuel):
     """
     Fixes fuel names
     """
+    local_config = current_config()["InputHomogenization"]
     fuel_match = local_config["CostMatching"]["FuelMatch"]
     return fuel_match[fuel]
 
 
-def get_reference_value(map, fuel, name):
+def assumption_table(map):
     """
-    Extract reference value from the asssumption map
+    Pivots the assumption map into one row per fuel, the delta heat rate is taken at the HR level and the other values
+    at the cost level
     :param map: Assumption map
-    :param fuel: Fuel of the power plant
-    :param name: Name of the cost value
+    :return: DataFrame indexed by fuel with one column per value
     """
-    if name in ["delta_capex", "delta_om"]:
-        value = map[(map["fuel_type"] == fuel) & (map["value"] == name)][local_config["CostLevel"]].values[0]
-    else:
-        value = map[(map["fuel_type"] == fuel) & (map["value"] == name)][local_config["HRLevel"]].values[0]
-    return value
+    local_config = current_config()["InputHomogenization"]
+    table = map.pivot(index="fuel_type", columns="value", values=local_config["CostLevel"])
+    if "delta_heatrate" in table.columns:
+        table["delta_heatrate"] = map.pivot(index="fuel_type", columns="value",
+                                            values=local_config["HRLevel"])["delta_heatrate"]
+    table.columns.name = None
+    return table[list(map["value"].unique())]
 
 
 def add_assumptions(data):
@@ -41,12 +42,16 @@ def add_assumptions(data):
     :param data: DataFrame with the power plant Data
     :return: DataFrame with updated values
     """
-    assumption_map = pd.read_csv(io["harmonization_output_assumption_path"])
+    config = current_config()
+    local_config = config["InputHomogenization"]
+    assumption_map = pd.read_csv(config["IO"]["harmonization_output_assumption_path"])
     if local_config["IncludeBio"]:
         assumption_map = pd.concat([assumption_map, bio_map])
-    for val in assumption_map.value.unique():
-        data[val] = data.apply(lambda x: get_reference_value(assumption_map, x.fuel_match, val), axis=1)
-    return data
+    table = assumption_table(assumption_map)
+    missing = set(data["fuel_match"].unique()) - set(table.index)
+    if missing:
+        raise ValueError("Fuels {} are not in the assumption map".format(", ".join(map(str, missing))))
+    return data.drop(columns=table.columns, errors="ignore").join(table, on="fuel_match")
 
 
 def get_reg_params(map, fuel):
@@ -55,6 +60,7 @@ def get_reg_params(map, fuel):
     :param map: Regression map
     :param fuel: Fuel of the power plant
     """
+    local_config = current_config()["InputHomogenization"]
     idx = map.index[map["Fuel"] == fuel]
     if local_config["HRLevel"] == "range_high":
         slope_corr = map.loc[idx, "slope_err"]
@@ -67,7 +73,7 @@ def get_reg_params(map, fuel):
         intersect_corr = 0
     slope = map.loc[idx, "slope"] + slope_corr
     intersect = map.loc[idx, "intercept"] + intersect_corr
-    return slope, intersect
+    return slope.values[0], intersect.values[0]
 
 
 def calculate_delta_hr(hr, slope, intersect):
@@ -87,32 +93,39 @@ def do_hr_regression(data):
     :param data: DataFrame with input data
     :return: DataFra,e with the input parameters of the regression
     """
-    reg_map = pd.read_csv(io["harmonization_output_regression_path"])
+    reg_map = pd.read_csv(current_config()["IO"]["harmonization_output_regression_path"])
     fuels = ["coal"]
-    slopes = {}
-    interceptions = {}
-    data["heatrate"] = data.predicted_efficiency.apply(eff_to_hr)
+    data["heatrate"] = eff_to_hr(data["predicted_efficiency"].to_numpy(dtype=float))
+    heatrate = data["heatrate"].to_numpy()
+    delta_heatrate = data["delta_heatrate"].to_numpy(dtype=float)
     for fuel in fuels:
-        slopes[fuel], interceptions[fuel] = get_reg_params(reg_map, fuel)
-    data["delta_heatrate"] = data.apply(lambda x: calculate_delta_hr(x.heatrate,
-                                                                     slopes[x.fuel_match],
-                                                                     interceptions[x.fuel_match]) \
-        if x.fuel_match in fuels else x.delta_heatrate, axis=1)
+        slope, intersect = get_reg_params(reg_map, fuel)
+        delta_heatrate = np.where(data["fuel_match"].to_numpy() == fuel,
+                                  calculate_delta_hr(heatrate, slope, intersect), delta_heatrate)
+    data["delta_heatrate"] = delta_heatrate
     return data
 
 
-def match_powerplant_delta_values():
+def match_powerplant_delta_values(config=None, data=None):
     """
     Wrapper function to match assumptions with power plants
+    :param config: ConfigSnapshot, by default the current configuration
+    :param data: Processed power plants indexed by id, by default the processed power plant input file
     :return: DataFrame with cost and delta values
     """
-    required_columns = ['Country', 'Fueltype', 'Technology', 'Capacity',
-                        local_config['RegressionConfig']['X_columns'][2], local_config['RegressionConfig']['X_columns'][3],
-                        'predicted_efficiency', 'delta_capex', 'delta_om', 'delta_heatrate', 'heatrate', 'lat', 'lon']
-    source = DataSource.from_file(io['processed_pp_input_path'], index_col='id')
-    data = source.data
-    data['fuel_match'] = data.apply(lambda x: map_fuel_name(x.Fueltype), axis=1)
-    data = add_assumptions(data)
-    data = do_hr_regression(data)
-    data = data[required_columns]
+    with use_config(config) as config:
+        local_config = config["InputHomogenization"]
+        required_columns = ['Country', 'Fueltype', 'Technology', 'Capacity',
+                            local_config['RegressionConfig']['X_columns'][2],
+                            local_config['RegressionConfig']['X_columns'][3],
+                            'predicted_efficiency', 'delta_capex', 'delta_om', 'delta_heatrate', 'heatrate', 'lat',
+                            'lon']
+        if data is None:
+            data = DataSource.from_file(config["IO"]['processed_pp_input_path'], index_col='id').data
+        else:
+            data = data.copy()
+        data['fuel_match'] = data['Fueltype'].map(dict(local_config["CostMatching"]["FuelMatch"]))
+        data = add_assumptions(data)
+        data = do_hr_regression(data)
+        data = data[required_columns]
     return data
@@ -1,22 +1,16 @@
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.linear_model import LinearRegression
-from sklearn.impute import SimpleImputer
-from sklearn.metrics import mean_squared_error
-from sklearn.model_selection import train_test_split
-from sklearn.model_selection import GridSearchCV
-from src.tools.config_loader import Configuration
+from concurrent.futures import ProcessPoolExecutor
+from src.tools.config_loader import current_config, use_config, thaw
+from src.tools.tabular import read_table, write_table
 from src.homogenization.data_operations import PowerPlantMatching
-import math
+from src.homogenization.snapshots import pinned_snapshot
 import pandas as pd
 import numpy as np
-import random
+import itertools
+import hashlib
+import logging
+import json
+import time
 from pathlib import Path
-config = Configuration.get_instance()
-io = config["IO"]
-local_config = config["InputHomogenization"]
-
-random_forest_config_all = local_config["RandomForest"]
-regression_config = local_config["RegressionConfig"]
 
 param_grid = {
     'bootstrap': [True],
@@ -24,28 +18,80 @@ param_grid = {
     'max_samples': [0.5, 0.6, 0.7, 0.8, 0.9],
     'n_estimators': [20, 100, 200, 500]}
 
+hgb_param_grid = {
+    'learning_rate': [0.03, 0.1, 0.3],
+    'max_leaf_nodes': [7, 15, 31],
+    'min_samples_leaf': [5, 10, 20],
+    'l2_regularization': [0.0, 1.0]}
+
+EVALUATION_METHODS = ["rf", "li", "na", "rn", "hgb"]
+
+_evaluation_data = None
+_evaluation_config = None
+
 
 def ppm_regression_data(data):
     """
     Create subset of regression columns from input
     """
-    x_cols = regression_config["X_columns"]
+    local_config = current_config()["InputHomogenization"]
+    regression_config = local_config["RegressionConfig"]
+    x_cols = list(regression_config["X_columns"])
     y_col = regression_config["y_column"]
     columns = x_cols + [y_col]
     data = data.loc[:, columns]
     retrofitCol = regression_config['X_columns'][3]
-    data.loc[:, retrofitCol] \
-        = data.apply(lambda x: False if math.isnan(x[retrofitCol]) else True, axis=1)
+    data[retrofitCol] = data[retrofitCol].notna()
     return data
 
 
-def random_forest_regression(X, y, random_forest_config):
+def fuel_regression_sets(data, fuel, x_cols, y_col):
+    """
+    Features of the plants of a fuel
+    :param data: Regression data indexed by plant id
+    :return: Features and target of the plants with a known efficiency and features of all the plants of the fuel
+    """
+    fuel_data = data[data["Fueltype"] == fuel]
+    features = [column for column in x_cols if column != "Fueltype"]
+    known = fuel_data[y_col] != 0
+    return fuel_data.loc[known, features], fuel_data.loc[known, y_col], fuel_data[features]
+
+
+def merge_predictions(data, predictions, y_col):
+    """
+    Keeps the known efficiencies and takes the predicted ones for the others through the plant id
+    :param data: Regression data indexed by plant id
+    :param predictions: List of Series of predicted efficiencies indexed by plant id
+    :return: DataFrame with the id and predicted efficiency of every plant
+    """
+    data = data.reset_index()
+    predicted = data["id"].map(pd.concat(predictions))
+    data["predicted_efficiency"] = data[y_col].where(data[y_col] != 0, predicted)
+    return data[["id", "predicted_efficiency"]]
+
+
+def split_state(random_state=None):
+    """
+    Seed of the train test split, by default the configured one
+    """
+    return current_config()["InputHomogenization"]["RegressionConfig"]["split"]["random_state"] \
+        if random_state is None else random_state
+
+
+def random_forest_regression(X, y, random_forest_config, random_state=None):
     """
     Perform Random Forest Regression
+    :param random_state: Seed of the train test split, by default the configured one
     """
+    from sklearn.ensemble import RandomForestRegressor
+    from sklearn.impute import SimpleImputer
+    from sklearn.metrics import mean_squared_error
+    from sklearn.model_selection import train_test_split
+    local_config = current_config()["InputHomogenization"]
+    regression_config = local_config["RegressionConfig"]
     X_train, X_test, y_train, y_test = train_test_split(
         X, y, test_size=regression_config["split"]["test_size"],
-        random_state=regression_config["split"]["random_state"])
+        random_state=split_state(random_state))
 
     imputer = SimpleImputer(missing_values=np.nan, strategy='mean')
     imputer = imputer.fit(X_train)
@@ -58,113 +104,226 @@ def random_forest_regression(X, y, random_forest_config):
     return model, imputer, mse
 
 
-def linear_regression(X, y):
-    "Perform linerar Regression"
+def hist_gradient_boosting_regression(X, y, boosting_config, random_state=None):
+    """
+    Perform histogram based gradient boosting regression, the missing values are handled by the model
+    :param random_state: Seed of the train test split, by default the configured one
+    """
+    from sklearn.experimental import enable_hist_gradient_boosting  # noqa: F401
+    from sklearn.ensemble import HistGradientBoostingRegressor
+    from sklearn.metrics import mean_squared_error
+    from sklearn.model_selection import train_test_split
+    local_config = current_config()["InputHomogenization"]
+    regression_config = local_config["RegressionConfig"]
     X_train, X_test, y_train, y_test = train_test_split(
         X, y, test_size=regression_config["split"]["test_size"],
-        random_state=regression_config["split"]["random_state"])
-
-    imputer = SimpleImputer(missing_values=np.nan, strategy='mean')
-    imputer = imputer.fit(X_train)
-    X_train_imp = imputer.transform(X_train)
+        random_state=split_state(random_state))
 
-    model = LinearRegression()
-    model.fit(X_train_imp, y_train)
+    model = HistGradientBoostingRegressor(**boosting_config)
+    model.fit(X_train, y_train)
     y_pred = model.predict(X_test)
     mse = mean_squared_error(y_pred, y_test, squared=False)
-    return model, imputer, mse
+    return model, mse
 
 
-def rf_regression_efficiency_map(data):
+def training_fingerprint(X, y, model_config, approach="random_forest"):
     """
-    Create regression dataset using RF
+    Hash of the training data, the split and the hyperparameters of a model. Every training row is part of the hash,
+    so adding or changing a plant with a known efficiency changes the hash of the model of its fuel
+    :return: Hexadecimal hash as string
+    """
+    split_config = current_config()["InputHomogenization"]["RegressionConfig"]["split"]
+    sha = hashlib.sha1(json.dumps({"approach": approach, "columns": list(X.columns), "model": thaw(model_config),
+                                   "split": thaw(split_config)}, sort_keys=True, default=str).encode())
+    sha.update(pd.util.hash_pandas_object(pd.concat([X, y], axis=1)).to_numpy().tobytes())
+    return sha.hexdigest()
+
+
+def cached_fit(approach, fit, X, y, fuel, model_config, cache_path):
+    """
+    Model of an approach for a fuel, it is fitted only if there is no model of the same training data and
+    hyperparameters in the cache, the models of the approach and fuel with another hash are removed
+    :param approach: Name of the approach, prefix of the model files
+    :param fit: Function of X, y and the model configuration returning the model, the imputer or None and the mse
+    :param cache_path: Directory of the fitted models
+    :return: Model, imputer, mse and hash of the training data
+    """
+    import joblib
+    key = training_fingerprint(X, y, model_config, approach)
+    prefix = "{}_{}_".format(approach, fuel.replace(" ", "_"))
+    path = Path(cache_path) / "{}{}.joblib".format(prefix, key)
+    if path.is_file():
+        model, imputer, mse = joblib.load(path)
+        return model, imputer, mse, key
+    model, imputer, mse = fit(X, y, model_config)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    for old in path.parent.glob(prefix + "*.joblib"):
+        old.unlink()
+    joblib.dump((model, imputer, mse), path)
+    return model, imputer, mse, key
+
+
+def cached_random_forest(X, y, fuel, random_forest_config, cache_path):
+    """
+    Random forest of a fuel, see cached_fit
+    :return: Model, imputer, mse and hash of the training data
     """
+    return cached_fit("random_forest", random_forest_regression, X, y, fuel, random_forest_config, cache_path)
+
+
+def cached_prediction(model, imputer, key, X_prediction, previous=None):
+    """
+    Predicts the efficiency of the plants, the ones predicted before by the same model from the same features are
+    taken from the previous predictions. A refitted model predicts every plant of its fuel again
+    :param imputer: Imputer of the features, None if the model handles the missing values
+    :param key: Hash of the model
+    :param previous: DataFrame of previous predictions indexed by plant id
+    :return: DataFrame indexed by plant id with the model hash, features hash and predicted efficiency
+    """
+    rows = pd.DataFrame({"model": key, "features": pd.util.hash_pandas_object(X_prediction, index=False).astype(str),
+                         "predicted_efficiency": np.nan}, index=X_prediction.index)
+    reuse = np.zeros(len(rows), dtype=bool)
+    if previous is not None:
+        known = previous.reindex(rows.index)
+        reuse = ((known["model"] == rows["model"]) & (known["features"] == rows["features"])).to_numpy()
+        rows.loc[reuse, "predicted_efficiency"] = known.loc[reuse, "predicted_efficiency"]
+    if not reuse.all():
+        X_new = X_prediction[~reuse]
+        rows.loc[~reuse, "predicted_efficiency"] = model.predict(X_new if imputer is None else imputer.transform(X_new))
+    logging.info("Predicted the efficiency of {} plants, {} taken from the cache".format((~reuse).sum(), reuse.sum()))
+    return rows
+
+
+def regression_efficiency_map(data, approach, fit, x_cols, model_configs, cache_path=None):
+    """
+    Efficiency map of a regression approach, the model of every fuel is fitted on the plants with a known efficiency
+    and predicts the efficiency of the others
+    :param approach: Name of the approach, used in the names of the cached files
+    :param fit: Function of X, y and the model configuration returning the model, the imputer or None and the mse
+    :param x_cols: Feature columns
+    :param model_configs: Dictionary of fuel to model configuration
+    :param cache_path: Directory where the fitted models and the predictions are kept, by default nothing is cached
+    :return: Efficiency map, dictionary of fuel to mse and dictionary of fuel to model
+    """
+    regression_config = current_config()["InputHomogenization"]["RegressionConfig"]
     fuels = regression_config["Fuels"]
     data = data[data["Fueltype"].isin(fuels)]
-    x_cols = regression_config["X_columns"]
     y_col = regression_config["y_column"]
-    map = {}
+    predictions = []
     MSE = {}
-    OOB = {}
+    models = {}
+    if cache_path is not None:
+        prediction_path = Path(cache_path) / "{}_predictions.parquet".format(approach)
+        previous = read_table(prediction_path) if prediction_path.exists() else None
+        cached = []
     for fuel in fuels:
-        model_data = data[data[y_col] != 0]
-        model_data_fuel = model_data[model_data["Fueltype"] == fuel]
-        regression_data = data[data["Fueltype"] == fuel]
+        X, y, X_prediction = fuel_regression_sets(data, fuel, x_cols, y_col)
+        if cache_path is None:
+            model, imputer, mse = fit(X, y, model_configs[fuel])
+            X_pred = X_prediction if imputer is None else imputer.transform(X_prediction)
+            y_predicted = pd.Series(model.predict(X_pred), index=X_prediction.index)
+        else:
+            model, imputer, mse, key = cached_fit(approach, fit, X, y, fuel, model_configs[fuel], cache_path)
+            cached.append(cached_prediction(model, imputer, key, X_prediction, previous))
+            y_predicted = cached[-1]["predicted_efficiency"]
+        MSE[fuel] = mse
+        models[fuel] = model
+        predictions.append(y_predicted)
+    if cache_path is not None:
+        write_table(pd.concat(cached), prediction_path)
+    return merge_predictions(data, predictions, y_col), MSE, models
 
-        X = model_data_fuel.loc[:, x_cols].drop(columns=["Fueltype"])
-        y = model_data_fuel.loc[:, y_col]
-        random_forest_config = random_forest_config_all[fuel]
-        model, imputer, mse = random_forest_regression(X, y, random_forest_config)
 
-        X_prediction = regression_data[X.columns]
-        X_pred_imp = imputer.transform(X_prediction)
-        y_predicted = model.predict(X_pred_imp)
-        MSE[fuel] = mse
-        OOB[fuel] = model.oob_score_
-        ids = regression_data.reset_index()["id"]
+def linear_regression(X, y, random_state=None):
+    """
+    Perform linerar Regression
+    :param random_state: Seed of the train test split, by default the configured one
+    """
+    from sklearn.linear_model import LinearRegression
+    from sklearn.impute import SimpleImputer
+    from sklearn.metrics import mean_squared_error
+    from sklearn.model_selection import train_test_split
+    local_config = current_config()["InputHomogenization"]
+    regression_config = local_config["RegressionConfig"]
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=regression_config["split"]["test_size"],
+        random_state=split_state(random_state))
 
-        map[fuel] = pd.concat([ids, pd.Series(y_predicted, name="predicted_efficiency")], axis=1).set_index(["id"])
+    imputer = SimpleImputer(missing_values=np.nan, strategy='mean')
+    imputer = imputer.fit(X_train)
+    X_train_imp = imputer.transform(X_train)
+
+    model = LinearRegression()
+    model.fit(X_train_imp, y_train)
+    y_pred = model.predict(X_test)
+    mse = mean_squared_error(y_pred, y_test, squared=False)
+    return model, imputer, mse
 
-        concat_map = pd.concat(map).reset_index().drop(columns=["level_0"])
 
-    data = data.reset_index()
-    data["predicted_efficiency"] = data.apply(
-        lambda x: x.Efficiency if x.Efficiency != 0 else
-        concat_map[concat_map.id == x.id]["predicted_efficiency"].values[0],
-        axis=1)
-    return data[["id", "predicted_efficiency"]], MSE, OOB
+def rf_regression_efficiency_map(data, cache_path=None):
+    """
+    Create regression dataset using RF
+    :param cache_path: Directory where the fitted models and the predictions are kept, by default nothing is cached
+    """
+    local_config = current_config()["InputHomogenization"]
+    x_cols = list(local_config["RegressionConfig"]["X_columns"])
+    map, MSE, models = regression_efficiency_map(data, "random_forest", random_forest_regression, x_cols,
+                                                 local_config["RandomForest"], cache_path)
+    OOB = {fuel: model.oob_score_ for fuel, model in models.items()}
+    return map, MSE, OOB
+
 
+def _linear_fit(X, y, _):
+    return linear_regression(X, y)
 
-def linear_regression_efficiency_map(data):
+
+def linear_regression_efficiency_map(data, cache_path=None):
     """
     Create regression dataset using Linear Regression
+    :param cache_path: Directory where the fitted models and the predictions are kept, by default nothing is cached
     """
+    regression_config = current_config()["InputHomogenization"]["RegressionConfig"]
     fuels = regression_config["Fuels"]
-    print(fuels)
-    data = data[data["Fueltype"].isin(fuels)]
-    x_cols = ["Fueltype", "YearCommissioned"]
-    y_col = regression_config["y_column"]
-    map = {}
-    MSE = {}
-    for fuel in fuels:
-        model_data = data[data[y_col] != 0]
-        model_data_fuel = model_data[model_data["Fueltype"] == fuel]
-        regression_data = data[data["Fueltype"] == fuel]
+    x_cols = ["Fueltype", regression_config["X_columns"][2]]
+    map, MSE, _ = regression_efficiency_map(data, "linear", _linear_fit, x_cols, {fuel: {} for fuel in fuels},
+                                            cache_path)
+    return map, MSE
 
-        X = model_data_fuel.loc[:, x_cols].drop(columns=["Fueltype"])
-        y = model_data_fuel.loc[:, y_col]
-        model, imputer, mse = linear_regression(X, y)
 
-        X_prediction = regression_data[X.columns]
-        X_pred_imp = imputer.transform(X_prediction)
-        y_predicted = model.predict(X_pred_imp)
-        MSE[fuel] = mse
-        ids = regression_data.reset_index()["id"]
+def _hgb_fit(X, y, boosting_config):
+    model, mse = hist_gradient_boosting_regression(X, y, boosting_config)
+    return model, None, mse
 
-        map[fuel] = pd.concat([ids, pd.Series(y_predicted, name="predicted_efficiency")], axis=1).set_index(["id"])
 
-        concat_map = pd.concat(map).reset_index().drop(columns=["level_0"])
-
-    data = data.reset_index()
-    data["predicted_efficiency"] = data.apply(
-        lambda x: x.Efficiency if x.Efficiency != 0 else
-        concat_map[concat_map.id == x.id]["predicted_efficiency"].values[0],
-        axis=1)
-    return data[["id", "predicted_efficiency"]], MSE
+def hgb_regression_efficiency_map(data, cache_path=None):
+    """
+    Create regression dataset using histogram based gradient boosting
+    :param cache_path: Directory where the fitted models and the predictions are kept, by default nothing is cached
+    """
+    local_config = current_config()["InputHomogenization"]
+    regression_config = local_config["RegressionConfig"]
+    x_cols = list(regression_config["X_columns"])
+    boosting_configs = {fuel: local_config["HistGradientBoosting"] for fuel in regression_config["Fuels"]}
+    map, MSE, _ = regression_efficiency_map(data, "hist_gradient_boosting", _hgb_fit, x_cols, boosting_configs,
+                                            cache_path)
+    return map, MSE
 
 
 def naive_efficiency_map(data):
     """
     Create regression dataset using Naive Assumption
     """
+    from sklearn.metrics import mean_squared_error
+    from sklearn.model_selection import train_test_split
+    local_config = current_config()["InputHomogenization"]
+    regression_config = local_config["RegressionConfig"]
     fuels = regression_config["Fuels"]
     data = data[data["Fueltype"].isin(fuels)]
     defaults = regression_config["NaiveValues"]
     data = data.reset_index()
-    x_cols = ["Fueltype", "YearCommissioned"]
-    data.loc[:, "predicted_efficiency"] = data.apply(
-        lambda x: x.Efficiency if x.Efficiency != 0 else defaults[x.Fueltype],
-        axis=1)
+    x_cols = ["Fueltype", regression_config["X_columns"][2]]
+    data["predicted_efficiency"] = data["Efficiency"].where(data["Efficiency"] != 0,
+                                                            data["Fueltype"].map(defaults))
     MSE = {}
     for fuel in fuels:
         data = data[data["Efficiency"] != 0]
@@ -184,14 +343,17 @@ def random_efficiency(data):
     """
     Assign random efficiency values
     """
+    from sklearn.metrics import mean_squared_error
+    from sklearn.model_selection import train_test_split
+    local_config = current_config()["InputHomogenization"]
+    regression_config = local_config["RegressionConfig"]
     fuels = regression_config["Fuels"]
     data = data[data["Fueltype"].isin(fuels)]
     data = data.reset_index()
     defaults = regression_config["NaiveValues"]
-    x_cols = ["Fueltype", "YearCommissioned"]
-    data.loc[:, "predicted_efficiency"] = data.apply(
-        lambda x: x.Efficiency if x.Efficiency != 0 else defaults[x.Fueltype],
-        axis=1)
+    x_cols = ["Fueltype", regression_config["X_columns"][2]]
+    data["predicted_efficiency"] = data["Efficiency"].where(data["Efficiency"] != 0,
+                                                            data["Fueltype"].map(defaults))
     MSE = {}
     for fuel in fuels:
         data = data[data["Efficiency"] != 0]
@@ -202,47 +364,62 @@ def random_efficiency(data):
             X, y, test_size=regression_config["split"]["test_size"],
             random_state=regression_config["split"]["random_state"])
 
-        y_pred = [random.uniform(np.min(y), np.max(y)) for i in range(len(y_test))]
+        # Every fuel draws from its own generator, seeded like the random approach of split_rmse
+        rng = np.random.default_rng(regression_config["split"]["random_state"])
+        y_pred = rng.uniform(np.min(y), np.max(y), len(y_test))
         mse = mean_squared_error(y_pred, y_test, squared=False)
         MSE[fuel] = mse
     return data[["id", "predicted_efficiency"]], MSE
 
 
-def ppm_proxy_efficiency(mode="random_forest", include_bio=False):
+def ppm_proxy_efficiency(mode="random_forest", include_bio=False, cache=True):
     """
     Add proxy efficiency values to power plant matching dataset
+    :param cache: If True the fitted models of the regression approaches and their predictions are reused while the
+    training data and hyperparameters do not change. The training data of a fuel are all its plants with a known
+    efficiency, a refresh that adds or changes one of them refits the model and predicts every plant of the fuel again
     """
+    local_config = current_config()["InputHomogenization"]
+    regression_config = local_config["RegressionConfig"]
     if include_bio:
         fuel_flag = "biofuels+conventional"
     else:
         fuel_flag = "conventional"
-    if not Path(io["LOCAL_PPM_PATH"]).is_file():
+    if pinned_snapshot("PPM") is None and not Path(current_config()["IO"]["LOCAL_PPM_PATH"]).is_file():
         ppm = PowerPlantMatching(False)
     ppm = PowerPlantMatching.opsd_efficiency(fuel_flag)
     source_data = ppm.data
     model_data = ppm_regression_data(source_data)
+    cache_path = current_config()["IO"]["proxy_model_cache_path"] if cache else None
     if mode == "naive":
         map, mse = naive_efficiency_map(model_data)
     elif mode == "linear":
-        map, mse = linear_regression_efficiency_map(model_data)
+        map, mse = linear_regression_efficiency_map(model_data, cache_path)
+    elif mode == "hist_gradient_boosting":
+        map, mse = hgb_regression_efficiency_map(model_data, cache_path)
     else:
-        map, mse, oob = rf_regression_efficiency_map(model_data)
+        map, mse, oob = rf_regression_efficiency_map(model_data, cache_path)
 
-    fuels_f = regression_config["Fuels"].copy()
+    fuels_f = list(regression_config["Fuels"])
 
     output_data = source_data.merge(map, left_on="id", right_on="id", how="left")
     if include_bio:
         fuels_f.append("Bioenergy")
         output_data.loc[output_data["Fueltype"] == "Bioenergy",
-                        ["predicted_efficiency"]] = local_config["RegressionConfig"]["NaiveValues"]["Bioenergy"]
+                        ["predicted_efficiency"]] = regression_config["NaiveValues"]["Bioenergy"]
     output_data = output_data[output_data["Fueltype"].isin(fuels_f)]
     return output_data
 
 
 def gridsearch(data):
+    from sklearn.ensemble import RandomForestRegressor
+    from sklearn.impute import SimpleImputer
+    from sklearn.model_selection import train_test_split, GridSearchCV
+    local_config = current_config()["InputHomogenization"]
+    regression_config = local_config["RegressionConfig"]
     fuels = regression_config["Fuels"]
     data = data[data["Fueltype"].isin(fuels)]
-    x_cols = regression_config["X_columns"]
+    x_cols = list(regression_config["X_columns"])
     y_col = regression_config["y_column"]
     GS = {}
     XS = {}
@@ -272,6 +449,40 @@ def gridsearch(data):
     return GS, XS, YS
 
 
+def halving_gridsearch(data):
+    """
+    Hyperparameter search of the histogram based gradient boosting by successive halving, the candidates are
+    evaluated on growing numbers of samples and only the best third goes on to the next round
+    """
+    from sklearn.experimental import enable_hist_gradient_boosting  # noqa: F401
+    from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+    from sklearn.ensemble import HistGradientBoostingRegressor
+    from sklearn.model_selection import train_test_split, HalvingGridSearchCV
+    local_config = current_config()["InputHomogenization"]
+    regression_config = local_config["RegressionConfig"]
+    boosting_config = local_config["HistGradientBoosting"]
+    fuels = regression_config["Fuels"]
+    data = data[data["Fueltype"].isin(fuels)]
+    x_cols = list(regression_config["X_columns"])
+    y_col = regression_config["y_column"]
+    GS = {}
+    XS = {}
+    YS = {}
+    for fuel in fuels:
+        X, y, _ = fuel_regression_sets(data, fuel, x_cols, y_col)
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y, test_size=regression_config["split"]["test_size"],
+            random_state=regression_config["split"]["random_state"])
+        model = HistGradientBoostingRegressor(**boosting_config)
+        grid_search = HalvingGridSearchCV(estimator=model, param_grid=hgb_param_grid, factor=3, cv=3, n_jobs=-1,
+                                          random_state=regression_config["split"]["random_state"], verbose=1)
+        grid_search.fit(X_train, y_train)
+        GS[fuel] = grid_search
+        XS[fuel] = X_train
+        YS[fuel] = y_train
+    return GS, XS, YS
+
+
 def print_results_gs(GS, XS, YS):
     for fuel in GS.keys():
         print(fuel, ":")
@@ -296,31 +507,165 @@ def evaluate(model, test_features, test_labels):
     return accuracy
 
 
-def evaluate_approaches():
-    ppm = PowerPlantMatching.opsd_efficiency()
-    source_data = ppm.data
-    model_data = ppm_regression_data(source_data)
+def evaluate_approaches(model_data=None):
+    """
+    RMSE of every approach on the test split of each fuel
+    :param model_data: Output of ppm_regression_data, by default it is created from PPM and OPSD
+    :return: Dictionary of approach of EVALUATION_METHODS to dictionary of fuel to RMSE
+    """
+    if model_data is None:
+        ppm = PowerPlantMatching.opsd_efficiency()
+        source_data = ppm.data
+        model_data = ppm_regression_data(source_data)
     _, mserf, _ = rf_regression_efficiency_map(model_data)
     _, mseli = linear_regression_efficiency_map(model_data)
     _, msena = naive_efficiency_map(model_data)
     _, msern = random_efficiency(model_data)
-    return mserf, mseli, msena, msern
+    _, msehgb = hgb_regression_efficiency_map(model_data)
+    return {"rf": mserf, "li": mseli, "na": msena, "rn": msern, "hgb": msehgb}
+
+
+def timed(function, *args):
+    """
+    Result and execution time in seconds of a function
+    """
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def imputed_prediction(model, imputer, X):
+    return model.predict(imputer.transform(X))
+
+
+def benchmark_approaches(model_data=None):
+    """
+    Fit time, prediction time and RMSE of the approaches on every fuel. The models are timed on the same split and
+    features as in their efficiency maps, the RMSE is the one of evaluate_approaches
+    :param model_data: Output of ppm_regression_data, by default it is created from PPM and OPSD
+    :return: DataFrame indexed by approach and fuel, the naive and random approaches are not timed
+    """
+    if model_data is None:
+        ppm = PowerPlantMatching.opsd_efficiency()
+        model_data = ppm_regression_data(ppm.data)
+    local_config = current_config()["InputHomogenization"]
+    regression_config = local_config["RegressionConfig"]
+    x_cols = list(regression_config["X_columns"])
+    y_col = regression_config["y_column"]
+    rmse = evaluate_approaches(model_data)
+    rows = []
+    for fuel in regression_config["Fuels"]:
+        X, y, X_prediction = fuel_regression_sets(model_data, fuel, x_cols, y_col)
+        X_li, y_li, X_prediction_li = fuel_regression_sets(model_data, fuel, ["Fueltype", x_cols[2]], y_col)
+        (rf, rf_imputer, _), rf_fit = timed(random_forest_regression, X, y, local_config["RandomForest"][fuel])
+        (li, li_imputer, _), li_fit = timed(linear_regression, X_li, y_li)
+        (hgb, _), hgb_fit = timed(hist_gradient_boosting_regression, X, y, local_config["HistGradientBoosting"])
+        rows += [("rf", fuel, rf_fit, timed(imputed_prediction, rf, rf_imputer, X_prediction)[1]),
+                 ("li", fuel, li_fit, timed(imputed_prediction, li, li_imputer, X_prediction_li)[1]),
+                 ("hgb", fuel, hgb_fit, timed(hgb.predict, X_prediction)[1]),
+                 ("na", fuel, np.nan, np.nan),
+                 ("rn", fuel, np.nan, np.nan)]
+    df = pd.DataFrame(rows, columns=["approach", "fuel", "fit_time", "predict_time"]).set_index(["approach", "fuel"])
+    df["rmse"] = [rmse[approach][fuel] for approach, fuel in df.index]
+    return df.sort_index()
+
+
+def split_rmse(model_data, method, fuel, random_state):
+    """
+    RMSE of an approach on a fuel for one train test split
+    :param model_data: Output of ppm_regression_data
+    :param method: One of EVALUATION_METHODS
+    :param random_state: Seed of the split, and of the values of the random approach
+    :return: RMSE and out of bag score, the latter only for the random forest
+    """
+    from sklearn.metrics import mean_squared_error
+    from sklearn.model_selection import train_test_split
+    local_config = current_config()["InputHomogenization"]
+    regression_config = local_config["RegressionConfig"]
+    x_cols = list(regression_config["X_columns"])
+    y_col = regression_config["y_column"]
+    if method == "rf":
+        X, y, _ = fuel_regression_sets(model_data, fuel, x_cols, y_col)
+        model, _, mse = random_forest_regression(X, y, local_config["RandomForest"][fuel], random_state)
+        return mse, model.oob_score_
+    if method == "hgb":
+        X, y, _ = fuel_regression_sets(model_data, fuel, x_cols, y_col)
+        return hist_gradient_boosting_regression(X, y, local_config["HistGradientBoosting"], random_state)[1], np.nan
+    X, y, _ = fuel_regression_sets(model_data, fuel, ["Fueltype", x_cols[2]], y_col)
+    if method == "li":
+        return linear_regression(X, y, random_state)[2], np.nan
+    _, _, _, y_test = train_test_split(X, y, test_size=regression_config["split"]["test_size"],
+                                       random_state=random_state)
+    if method == "na":
+        y_pred = np.full(len(y_test), regression_config["NaiveValues"][fuel])
+    else:
+        y_pred = np.random.default_rng(random_state).uniform(np.min(y), np.max(y), len(y_test))
+    return mean_squared_error(y_pred, y_test, squared=False), np.nan
+
+
+def _init_evaluation_worker(model_data, config):
+    global _evaluation_data, _evaluation_config
+    _evaluation_data = model_data
+    _evaluation_config = config
+
+
+def _evaluate_split(random_state, method, fuel):
+    with use_config(_evaluation_config):
+        return split_rmse(_evaluation_data, method, fuel, random_state)
+
+
+def repeated_split_evaluation(tries=None, methods=None, model_data=None, config=None):
+    """
+    RMSE and out of bag score of the approaches over repeated train test splits. The regression data is created once
+    and the fits of every split seed, approach and fuel are executed in worker processes
+    :param tries: Number of splits, by default the configured one
+    :param methods: Approaches of EVALUATION_METHODS, by default all of them
+    :param model_data: Output of ppm_regression_data, by default it is created from PPM and OPSD
+    :param config: ConfigSnapshot, by default the current configuration
+    :return: DataFrame with the seed, approach, fuel, RMSE and out of bag score of every fit
+    """
+    with use_config(config) as config:
+        local_config = config["InputHomogenization"]["ProxyEvaluation"]
+        tries = local_config["Tries"] if tries is None else tries
+        methods = EVALUATION_METHODS if methods is None else list(methods)
+        unknown = set(methods) - set(EVALUATION_METHODS)
+        if unknown:
+            raise ValueError("Unknown approaches {}, they should be in {}".format(", ".join(sorted(unknown)),
+                                                                                ", ".join(EVALUATION_METHODS)))
+        if model_data is None:
+            model_data = ppm_regression_data(PowerPlantMatching.opsd_efficiency().data)
+    # The split seeds are derived from the configured seed, they do not depend on the number of workers
+    seeds = np.random.SeedSequence(local_config["Seed"]).generate_state(tries).tolist()
+    tasks = list(itertools.product(seeds, methods, config["InputHomogenization"]["RegressionConfig"]["Fuels"]))
+    workers = min(local_config["Workers"], len(tasks))
+    if workers > 1:
+        with ProcessPoolExecutor(workers, initializer=_init_evaluation_worker, initargs=(model_data, config)) as pool:
+            results = list(pool.map(_evaluate_split, *zip(*tasks)))
+    else:
+        _init_evaluation_worker(model_data, config)
+        results = [_evaluate_split(*task) for task in tasks]
+    df = pd.DataFrame(tasks, columns=["seed", "method", "fuel"])
+    df["rmse"] = [rmse for rmse, _ in results]
+    df["oob"] = [oob for _, oob in results]
+    return df
+
+
+def summarize_evaluation(evaluation):
+    """
+    Distribution of the RMSE and out of bag score of every approach and fuel
+    :param evaluation: Output of repeated_split_evaluation
+    :return: DataFrame indexed by approach and fuel
+    """
+    return evaluation.groupby(["method", "fuel"])[["rmse", "oob"]].describe()
 
 
 def create_evaluation_dictionary(tries):
+    """
+    RMSE of every approach over repeated splits
+    :return: Dictionary of fuel to dictionary of approach to list of RMSE
+    """
+    evaluation = repeated_split_evaluation(tries)
     eval_map = {}
-    for fuel in ["Hard Coal", "Lignite", "Natural Gas"]:
-        eval_map[fuel] = {}
-        eval_map[fuel]["rf"] = []
-        eval_map[fuel]["li"] = []
-        eval_map[fuel]["na"] = []
-        eval_map[fuel]["rn"] = []
-    for i in range(tries):
-        regression_config["split"]["random_state"] = random.randint(0, 100)
-        mserf, mseli, msena, msern = evaluate_approaches()
-        for fuel in ["Hard Coal", "Lignite", "Natural Gas"]:
-            eval_map[fuel]["rf"].append(mserf[fuel])
-            eval_map[fuel]["li"].append(mseli[fuel])
-            eval_map[fuel]["na"].append(msena[fuel])
-            eval_map[fuel]["rn"].append(msern[fuel])
+    for (fuel, method), rmse in evaluation.groupby(["fuel", "method"], sort=False)["rmse"]:
+        eval_map.setdefault(fuel, {})[method] = rmse.to_list()
     return eval_map
@@ -0,0 +1,176 @@
+"""
+Versioned local copies of the powerplantmatching and OPSD inputs. A file is imported once into a compressed Parquet
+snapshot named by the hash of its contents, the manifest keeps the source, hash and import time of every snapshot.
+The stages read the snapshot pinned in InputHomogenization.Snapshots instead of the raw files, and two snapshots can
+be compared to know which plants were added, removed or changed.
+"""
+from datetime import datetime, timezone
+from pathlib import Path
+from src.tools.config_loader import current_config
+from src.tools.tabular import read_table, write_table
+import pandas as pd
+import hashlib
+import logging
+import json
+import os
+
+SOURCES = ["PPM", "OPSD_DE", "OPSD_EU"]
+SNAPSHOT_ENDING = ".parquet"
+
+
+def content_hash(path):
+    """
+    Hash of the contents of a file, independent of its name and modification time
+    :return: Hexadecimal hash as string
+    """
+    sha = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def pinned_snapshot(source, config=None):
+    """
+    Snapshot id the configuration pins a source to
+    :param source: One of SOURCES
+    :param config: ConfigSnapshot, by default the current configuration
+    :return: Snapshot id, None if the source is read from its file
+    """
+    config = current_config() if config is None else config
+    return config["InputHomogenization"]["Snapshots"][source]
+
+
+class SnapshotDiff:
+    def __init__(self, added, removed, changed):
+        """
+        :param added: Index of the ids that are only in the new snapshot
+        :param removed: Index of the ids that are only in the old snapshot
+        :param changed: Index of the ids in both snapshots with a different value in a common column
+        """
+        self.added = added
+        self.removed = removed
+        self.changed = changed
+
+    def __repr__(self):
+        return "Snapshot diff, {} added, {} removed and {} changed".format(len(self.added), len(self.removed),
+                                                                         len(self.changed))
+
+    def __bool__(self):
+        return len(self.added) + len(self.removed) + len(self.changed) > 0
+
+    @property
+    def ids(self):
+        """
+        Every id that was added, removed or changed
+        """
+        return self.added.union(self.removed).union(self.changed)
+
+
+class SnapshotStore:
+    def __init__(self, path=None):
+        """
+        :param path: Directory of the snapshots and their manifest, by default the configured one
+        """
+        self.path = Path(current_config()["IO"]["snapshot_store_path"] if path is None else path)
+        self.manifest_path = self.path / "manifest.json"
+
+    def __repr__(self):
+        return "Snapshot store {} with {} snapshots".format(self.path, len(self.manifest()))
+
+    def manifest(self):
+        """
+        :return: Dictionary of snapshot id to its source, content hash, import time, original file and rows
+        """
+        if not self.manifest_path.is_file():
+            return {}
+        with open(self.manifest_path, "r") as file:
+            return json.load(file)
+
+    def _write_manifest(self, manifest):
+        self.path.mkdir(parents=True, exist_ok=True)
+        # Written next to the final file and then moved, so other processes never read a half written manifest
+        tmp_path = self.manifest_path.with_name("{}.{}.tmp".format(self.manifest_path.name, os.getpid()))
+        with open(tmp_path, "w") as file:
+            json.dump(manifest, file, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    def snapshots(self, source=None):
+        """
+        Snapshots of the store, the newest last
+        :param source: One of SOURCES, by default the snapshots of every source
+        :return: DataFrame indexed by snapshot id
+        """
+        df = pd.DataFrame.from_dict(self.manifest(), orient="index",
+                                    columns=["source", "hash", "created", "file", "rows"])
+        df.index.name = "snapshot"
+        if source is not None:
+            df = df[df["source"] == source]
+        return df.sort_values("created")
+
+    def latest(self, source):
+        """
+        Id of the newest snapshot of a source, None if there is none
+        """
+        snapshots = self.snapshots(source)
+        return snapshots.index[-1] if len(snapshots) else None
+
+    def snapshot_path(self, snapshot_id):
+        return self.path / "{}{}".format(snapshot_id, SNAPSHOT_ENDING)
+
+    def import_file(self, path, source, **kwargs):
+        """
+        Imports a file into a snapshot, a file with the same contents as an existing snapshot is not imported again
+        :param path: Path of the PPM or OPSD file
+        :param source: One of SOURCES
+        :param kwargs: Options of read_table
+        :return: Snapshot id
+        """
+        if source not in SOURCES:
+            raise ValueError("Source {} should be one of {}".format(source, ", ".join(SOURCES)))
+        file_hash = content_hash(path)
+        snapshot_id = "{}-{}".format(source.lower(), file_hash[:12])
+        manifest = self.manifest()
+        if snapshot_id in manifest and self.snapshot_path(snapshot_id).exists():
+            logging.info("{} is already in snapshot {}".format(path, snapshot_id))
+            return snapshot_id
+        data = read_table(path, **kwargs)
+        self.path.mkdir(parents=True, exist_ok=True)
+        write_table(data, self.snapshot_path(snapshot_id), index=False)
+        manifest[snapshot_id] = {"source": source, "hash": file_hash, "file": str(path), "rows": len(data),
+                                 "created": datetime.now(timezone.utc).isoformat(timespec="microseconds")}
+        self._write_manifest(manifest)
+        logging.info("Imported {} into snapshot {}".format(path, snapshot_id))
+        return snapshot_id
+
+    def load(self, snapshot_id, columns=None):
+        """
+        Reads a snapshot
+        :param columns: Columns to read, by default all of them
+        :return: DataFrame
+        """
+        path = self.snapshot_path(snapshot_id)
+        if snapshot_id not in self.manifest() or not path.exists():
+            raise ValueError("Snapshot {} is not in the store {}".format(snapshot_id, self.path))
+        return read_table(path, columns=columns)
+
+    def diff(self, old_id, new_id, key="id"):
+        """
+        Plants added, removed and changed from one snapshot to another, the values are compared in the columns that
+        both snapshots have
+        :param old_id: Id of the old snapshot
+        :param new_id: Id of the new snapshot
+        :param key: Column identifying the plants
+        :return: SnapshotDiff
+        """
+        old, new = self.load(old_id), self.load(new_id)
+        for snapshot_id, df in [(old_id, old), (new_id, new)]:
+            if df[key].duplicated().any():
+                raise ValueError("The {} of snapshot {} is not unique".format(key, snapshot_id))
+        old, new = old.set_index(key), new.set_index(key)
+        columns = old.columns.intersection(new.columns)
+        common = new.index.intersection(old.index)
+        old_hashes = pd.util.hash_pandas_object(old.loc[common, columns], index=False).to_numpy()
+        new_hashes = pd.util.hash_pandas_object(new.loc[common, columns], index=False).to_numpy()
+        return SnapshotDiff(new.index.difference(old.index), old.index.difference(new.index),
+                            common[old_hashes != new_hashes])
@@ -1,17 +1,33 @@
 from src.homogenization.proxy_efficiency import ppm_proxy_efficiency
 from src.homogenization.data_operations import DataSource
-from src.tools.config_loader import Configuration
+from src.tools.config_loader import use_config
 from src.homogenization.plant_cost_matching import match_powerplant_delta_values
 from src.homogenization.cost_of_carbon_capture_powerplants import calculate_cost_of_carbon_capture
-config = Configuration.get_instance()
-io = config["IO"]
-local_config = config["InputHomogenization"]
+from src.curveproduction.geo_distribution_data import CostDistribution, NUTS_KEYS, cached_nuts_assignments
+from src.tools.tabular import read_table, patch_table
+from pathlib import Path
+import pandas as pd
+import logging
 
 
-def create_power_plant_file():
+def create_power_plant_file(config=None):
     """
     Contains all the procedures to create the power plant input file based on the power plant matching data
+    :param config: ConfigSnapshot, by default the current configuration
     """
+    with use_config(config) as config:
+        _create_power_plant_file(config)
+
+
+def _create_power_plant_file(config):
+    io = config["IO"]
+    data = _processed_power_plants(config)
+    power_plant_input = DataSource(data=data, local_path=io["processed_pp_input_path"])
+    power_plant_input.export_data(io["processed_pp_input_path"])
+
+
+def _processed_power_plants(config):
+    local_config = config["InputHomogenization"]
     required_columns = ["id", "Country", "Fueltype", "Technology", "Capacity",
                         local_config["RegressionConfig"]["X_columns"][2], local_config["RegressionConfig"]["X_columns"][3],
                         "predicted_efficiency", "lat", "lon"]
@@ -23,16 +39,28 @@ def create_power_plant_file():
         data.loc[:, commissionCol] = data.loc[:, commissionCol].fillna(int(data.loc[:, commissionCol].mean()))
     elif type(local_config["FillYear"]) == int:
         data.loc[:, commissionCol] = local_config["FillYear"]
-    data = data.set_index("id")
-    power_plant_input = DataSource(data=data, local_path=io["processed_pp_input_path"])
-    power_plant_input.export_data(io["processed_pp_input_path"])
+    return data.set_index("id")
 
 
-def create_cost_potential_curve_pp_input():
+def create_cost_potential_curve_pp_input(config=None):
     """
     Calculates the cost of carbon capture and outputs a dataframe with the data requiered to produce the
     cost potential distributions and curves.
+    :param config: ConfigSnapshot, by default the current configuration
     """
+    with use_config(config) as config:
+        _create_cost_potential_curve_pp_input(config)
+
+
+def _create_cost_potential_curve_pp_input(config):
+    io = config["IO"]
+    data = _power_plant_costs(match_powerplant_delta_values(), config)
+    power_plant_input = DataSource(data=data, local_path=io["cc_pp_output_path"])
+    power_plant_input.export_data(io["cc_pp_output_path"], partition_cols=["Country"])
+
+
+def _power_plant_costs(data, config):
+    local_config = config["InputHomogenization"]
     required_columns = ["Country", "Fueltype", "Technology", "Capacity", local_config["RegressionConfig"]["X_columns"][2],
                         "predicted_efficiency", "captured", "cost_of_cc", "lat", "lon"]
     rename_map = {"Fueltype": "Fuel",
@@ -40,13 +68,63 @@ def create_cost_potential_curve_pp_input():
                   "Capacity": "CapacityMW",
                   "captured": "AmountCapturedMtY",
                   "cost_of_cc": "CostOfCarbonCaptureEURtonCO2"}
-    data = match_powerplant_delta_values()
-
     data = calculate_cost_of_carbon_capture(data)
     data = data[required_columns]
-    data = data.rename(columns=rename_map)
-    power_plant_input = DataSource(data=data, local_path=io["cc_pp_output_path"])
-    power_plant_input.export_data(io["cc_pp_output_path"])
+    return data.rename(columns=rename_map)
+
+
+def changed_power_plants(new, old):
+    """
+    Power plants in both tables with a different value in a common column
+    :param new: DataFrame indexed by id
+    :param old: DataFrame indexed by id
+    :return: Index of ids
+    """
+    common = new.index.intersection(old.index)
+    columns = new.columns.intersection(old.columns)
+    new_hashes = pd.util.hash_pandas_object(new.loc[common, columns], index=False).to_numpy()
+    old_hashes = pd.util.hash_pandas_object(old.loc[common, columns], index=False).to_numpy()
+    return common[new_hashes != old_hashes]
+
+
+def update_power_plant_files(changes, config=None):
+    """
+    Incremental version of create_power_plant_file and create_cost_potential_curve_pp_input for a new power plant
+    list. The delta values and the cost of carbon capture are calculated only for the added and changed plants, the
+    cost table is patched in the partitions of their countries and the NUTS assignments of their coordinates are
+    added to the cache. The assumption maps and cost configuration must be the ones the cost table was created with.
+    Only the cost step is incremental: the processed power plant list is built and written again as a whole, since
+    the filled commission year and the proxy efficiency depend on every plant. The plants whose processed values
+    changed are found by comparing it with the previous list, the given changes are recalculated in any case
+    :param changes: SnapshotDiff of the old and new PPM snapshots, or the ids of the added, removed and changed plants
+    :param config: ConfigSnapshot, by default the current configuration
+    :return: Index of the ids of the recalculated plants
+    """
+    with use_config(config) as config:
+        io = config["IO"]
+        if not Path(io["processed_pp_input_path"]).exists() or not Path(io["cc_pp_output_path"]).exists():
+            logging.info("No power plant files to update, creating them")
+            _create_power_plant_file(config)
+            _create_cost_potential_curve_pp_input(config)
+            return read_table(io["processed_pp_input_path"], index_col="id").index
+        ids = pd.Index(getattr(changes, "ids", changes))
+        previous = read_table(io["processed_pp_input_path"], index_col="id")
+        # The proxy models are refitted only for the fuels whose training plants changed, see ppm_proxy_efficiency
+        processed = _processed_power_plants(config)
+        # A plant can change without being in the changes, e.g. when the mean commission year moves
+        recalculated = processed.index.difference(previous.index).union(changed_power_plants(processed, previous))
+        recalculated = recalculated.union(processed.index.intersection(ids))
+        removed = previous.index.difference(processed.index)
+        logging.info("Recalculating {} power plants and removing {}".format(len(recalculated), len(removed)))
+        DataSource(data=processed, local_path=io["processed_pp_input_path"]).export_data(
+            io["processed_pp_input_path"])
+        data = _power_plant_costs(match_powerplant_delta_values(config, processed.loc[recalculated]), config)
+        patch_table(data, io["cc_pp_output_path"], removed, partition_cols=["Country"])
+        if len(data):
+            points = CostDistribution.switch_to_geo(data[["lat", "lon"]])
+            for level in NUTS_KEYS:
+                cached_nuts_assignments(points, level)
+    return recalculated
 
 
 if __name__ == "__main__":
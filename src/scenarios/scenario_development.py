@@ -1,13 +1,9 @@
 import pandas as pd
-from src.tools.config_loader import Configuration
+from src.tools.config_loader import current_config
 from operator import or_ as union
 from functools import reduce
 import numpy as np
 
-config = Configuration.get_instance()
-io = config["IO"]
-local_config = config["CostCurveConfig"]
-
 column_map = {"id": "id",
               "source": "source",
               "geographical_label": "geographical_label",
@@ -23,7 +19,7 @@ def create_scenario_dataframes_geco(scenario):
     """
     Reads GECO dataset and creates a dataframe of the given scenario
     """
-    df_sc = pd.read_csv(io["scenario_geco_path"])
+    df_sc = pd.read_csv(current_config()["IO"]["scenario_geco_path"])
     df_sc_europe = df_sc.loc[df_sc["Country"] == "EU28"]
     df_scenario = df_sc_europe.loc[df_sc_europe["Scenario"] == scenario]
 
@@ -34,7 +30,7 @@ def unique_scenarios():
     """
     Find unique scenarios in the GECO dataset
     """
-    return pd.read_csv(io["scenario_geco_path"]).Scenario.unique()
+    return pd.read_csv(current_config()["IO"]["scenario_geco_path"]).Scenario.unique()
 
 
 def fetch_objective_value(df, fuel, year):
@@ -73,7 +69,7 @@ def map_capacity_factor(fuel):
     """
     Get capacity factor of the plant from the config file
     """
-    return local_config["Scenario"]["CapacityFactors"][fuel]
+    return current_config()["CostCurveConfig"]["Scenario"]["CapacityFactors"][fuel]
 
 
 def close_power_plants_per_fuel(df, fuel, year, scenario_df):
@@ -0,0 +1,271 @@
+"""
+Batched sensitivity analysis of the cost of carbon capture of the power plants. The plant table is matched once with
+the delta values of every level and the cost formulas are evaluated for a whole grid of parameter values as a
+variants x plants matrix, instead of producing the power plant input again for each combination.
+"""
+from src.technoeconomical.cost_operations_functions import calc_lcoe_capex, calc_lcoe_om, calculate_lcoe_fuel, \
+    calculate_emissions, cost_of_carbon_capture
+from src.homogenization.plant_cost_matching import add_assumptions, do_hr_regression
+from src.homogenization.cost_of_carbon_capture_powerplants import snapshot_fuel_map, fuel_codes, plant_fuels
+from src.homogenization.data_operations import DataSource
+from src.curveproduction.geo_distribution_data import CostDistribution, column_map_pp
+from src.tools.config_loader import current_config, use_config, override
+import pandas as pd
+import numpy as np
+import itertools
+
+LEVELS = ["range_low", "reference_value", "range_high"]
+DEFAULT_VALUES = ("InputHomogenization", "CostOfCCConfig", "DefaultValues")
+PARAMETERS = {"cost": ("InputHomogenization", "CostLevel"),
+              "heatratechange": ("InputHomogenization", "HRLevel"),
+              "capefficiency": DEFAULT_VALUES + ("CaptureEfficiency",),
+              "fcf": DEFAULT_VALUES + ("FCF",),
+              "capacityfactor_bio": DEFAULT_VALUES + ("CapacityFactor", "Bioenergy"),
+              "capacityfactor_hc": DEFAULT_VALUES + ("CapacityFactor", "Hard Coal"),
+              "capacityfactor_lg": DEFAULT_VALUES + ("CapacityFactor", "Lignite"),
+              "capacityfactor_ng": DEFAULT_VALUES + ("CapacityFactor", "Natural Gas")}
+CAPACITY_FACTORS = {name: path[-1] for name, path in PARAMETERS.items() if path[-2] == "CapacityFactor"}
+
+
+def reference_values(config=None):
+    """
+    Values of the sensitivity parameters in the configuration
+    :param config: ConfigSnapshot, by default the current configuration
+    :return: Dictionary of parameter name to value
+    """
+    config = current_config() if config is None else config
+    return {name: config.get_value(*path) for name, path in PARAMETERS.items()}
+
+
+def variant_grid(grid, config=None):
+    """
+    Every combination of the values of the grid, the parameters that are not in the grid keep their configured value
+    :param grid: Dictionary of parameter names of PARAMETERS to lists of values
+    :param config: ConfigSnapshot, by default the current configuration
+    :return: DataFrame with one row per variant and one column per parameter
+    """
+    unknown = set(grid) - set(PARAMETERS)
+    if unknown:
+        raise ValueError("Unknown parameters {}, they should be in {}".format(", ".join(sorted(unknown)),
+                                                                            ", ".join(PARAMETERS)))
+    variants = pd.DataFrame(list(itertools.product(*grid.values())), columns=list(grid))
+    for name, value in reference_values(config).items():
+        if name not in variants.columns:
+            variants[name] = value
+    variants.index.rename("variant", inplace=True)
+    return variants[list(PARAMETERS)]
+
+
+def parameter_bounds(config):
+    """
+    Low and high value of every parameter, the cost and heat rate levels go from range_low to range_high, the capture
+    efficiency and capacity factors take the Monte Carlo bounds unless they are given in the tornado bounds
+    :param config: ConfigSnapshot
+    :return: Dictionary of parameter name to low and high value
+    """
+    local_config = config["Sensitivity"]
+    bounds = {"cost": (LEVELS[0], LEVELS[-1]),
+              "heatratechange": (LEVELS[0], LEVELS[-1]),
+              "capefficiency": tuple(local_config["MonteCarlo"]["CaptureEfficiency"])}
+    for name, fuel in CAPACITY_FACTORS.items():
+        if fuel in local_config["MonteCarlo"]["CapacityFactor"]:
+            bounds[name] = tuple(local_config["MonteCarlo"]["CapacityFactor"][fuel])
+    bounds.update({name: tuple(values) for name, values in local_config["Tornado"]["Bounds"].items()})
+    return bounds
+
+
+def curve_costs(cost, amount, amounts):
+    """
+    Cost of the cost potential curves at the given cumulative amounts
+    :param cost: Array of shape curves x plants with the cost of carbon capture
+    :param amount: Array of shape curves x plants with the captured amount
+    :param amounts: Increasing cumulative amounts
+    :return: Array of shape curves x amounts, infinite where the amount exceeds the potential of the curve
+    """
+    n_curves, n_plants = cost.shape
+    order = np.argsort(cost, axis=1)
+    sorted_cost = np.take_along_axis(cost, order, axis=1)
+    cumulative = np.cumsum(np.nan_to_num(np.take_along_axis(amount, order, axis=1)), axis=1)
+    # Shifting every curve above the previous one allows a single search over all of them
+    offset = (cumulative[:, -1].max() + amounts.max() + 1) * np.arange(n_curves)[:, None]
+    positions = np.searchsorted((cumulative + offset).ravel(), (amounts + offset).ravel())
+    valid = positions - np.repeat(np.arange(n_curves) * n_plants, len(amounts)) < n_plants
+    costs = np.full(n_curves * len(amounts), np.inf)
+    costs[valid] = sorted_cost.ravel()[positions[valid]]
+    return costs.reshape(n_curves, len(amounts))
+
+
+def variant_metrics(cost, amount, price, target):
+    """
+    Summary metrics of the cost potential curves
+    :param cost: Array of shape variants x plants with the cost of carbon capture
+    :param amount: Array of shape variants x plants with the captured amount
+    :param price: Price the capturable amount is given at
+    :param target: Amount the cost is given at
+    :return: Capturable amount below the price and cost at the target amount of every variant
+    """
+    below = np.nansum(np.where(cost <= price, amount, 0), axis=1)
+    return below, curve_costs(cost, amount, np.array([target], dtype=float))[:, 0]
+
+
+class PlantTable:
+    def __init__(self, data, config=None):
+        """
+        Matches the processed power plants with the delta values of every level and the fuel properties
+        :param data: DataFrame of the processed power plant input, indexed by id
+        :param config: ConfigSnapshot, by default the current configuration
+        """
+        with use_config(config) as config:
+            self.config = config
+            data = data.copy()
+            data["fuel_match"] = data["Fueltype"].map(dict(config["InputHomogenization"]["CostMatching"]["FuelMatch"]))
+            self.fuels = plant_fuels()
+            self.fuel_codes = fuel_codes(data, self.fuels)
+            deltas = [self.level_values(data, level) for level in LEVELS]
+            fuel_map = snapshot_fuel_map(config)
+        self.data = data.drop(columns=["fuel_match"])
+        self.fuel_match = data["fuel_match"].to_numpy()
+        self.heatrate = deltas[0]["heatrate"].to_numpy(dtype=float)
+        self.capacity = data["Capacity"].to_numpy(dtype=float)
+        self.delta_capex = np.stack([d["delta_capex"].to_numpy(dtype=float) for d in deltas])
+        self.delta_om = np.stack([d["delta_om"].to_numpy(dtype=float) for d in deltas])
+        self.delta_heatrate = np.stack([d["delta_heatrate"].to_numpy(dtype=float) for d in deltas])
+        self.fuel_cost = fuel_map.loc[self.fuels, "fuel_cost"].to_numpy(dtype=float)[self.fuel_codes]
+        self.emission_factor = fuel_map.loc[self.fuels, "emission_factor"].to_numpy(dtype=float)[self.fuel_codes]
+
+    def __repr__(self):
+        return "Plant table with {} power plants".format(len(self.data))
+
+    def __len__(self):
+        return len(self.data)
+
+    @staticmethod
+    def level_values(data, level):
+        """
+        Delta values of the plants with the cost and heat rate of the given level
+        """
+        with override(level, "InputHomogenization", "CostLevel"), override(level, "InputHomogenization", "HRLevel"):
+            matched = do_hr_regression(add_assumptions(data.copy()))
+        return matched[["heatrate", "delta_capex", "delta_om", "delta_heatrate"]]
+
+    @classmethod
+    def from_file(cls, config=None):
+        """
+        Loads the processed power plant input of the configuration
+        """
+        config = current_config() if config is None else config
+        source = DataSource.from_file(config["IO"]["processed_pp_input_path"], index_col="id")
+        return cls(source.data, config)
+
+    def capacity_factors(self, variants):
+        """
+        Capacity factor of every plant in every variant
+        :return: Array of shape variants x plants
+        """
+        configured = self.config.get_value(*DEFAULT_VALUES, "CapacityFactor")
+        factors = np.array([[configured[fuel] for fuel in self.fuels]] * len(variants), dtype=float)
+        for name, fuel in CAPACITY_FACTORS.items():
+            if fuel in self.fuels:
+                factors[:, self.fuels.index(fuel)] = variants[name].to_numpy(dtype=float)
+        return factors[:, self.fuel_codes]
+
+    def evaluate(self, variants, chunk_size=64):
+        """
+        Cost of carbon capture and captured amount of every plant for every variant
+        :param variants: DataFrame of parameter values, output of variant_grid
+        :param chunk_size: Number of variants evaluated at the same time, it bounds the size of the temporary arrays
+        :return: Arrays of shape variants x plants with the cost of carbon capture and the captured amount
+        """
+        for column in ["cost", "heatratechange"]:
+            if not variants[column].isin(LEVELS).all():
+                raise ValueError("The values of {} should be in {}".format(column, ", ".join(LEVELS)))
+        cost_levels = variants["cost"].map(LEVELS.index).to_numpy()
+        hr_levels = variants["heatratechange"].map(LEVELS.index).to_numpy()
+        cost = np.empty((len(variants), len(self)))
+        amount = np.empty((len(variants), len(self)))
+        fuel_lcoe = calculate_lcoe_fuel(self.delta_heatrate, self.fuel_cost)
+        for start in range(0, len(variants), chunk_size):
+            rows = slice(start, start + chunk_size)
+            chunk = variants.iloc[rows]
+            fcf = chunk["fcf"].to_numpy(dtype=float)[:, None]
+            capture_efficiency = chunk["capefficiency"].to_numpy(dtype=float)[:, None]
+            cf = self.capacity_factors(chunk)
+            # The kernels write into the rows of the outputs and two buffers of the size of the chunk
+            lcoe, buffer, captured_ref = np.empty(cf.shape), np.empty(cf.shape), amount[rows]
+            calc_lcoe_capex(self.delta_capex[cost_levels[rows]], fcf, cf, out=lcoe)
+            lcoe += calc_lcoe_om(0, self.delta_om[cost_levels[rows]], cf, out=buffer)
+            lcoe += fuel_lcoe[hr_levels[rows]]
+            lcoe *= 1000
+            calculate_emissions(self.heatrate + self.delta_heatrate[hr_levels[rows]], self.emission_factor,
+                                capture_efficiency, out=(buffer, captured_ref))
+            cost_of_carbon_capture(0, lcoe, captured_ref, out=cost[rows])
+            captured_ref *= self.capacity
+            captured_ref *= cf
+            captured_ref *= 8760
+            captured_ref /= 1000000
+        return cost, amount
+
+    def run(self, grid, chunk_size=64):
+        """
+        Evaluates every combination of the values of the grid
+        :param grid: Dictionary of parameter names of PARAMETERS to lists of values
+        :param chunk_size: Number of variants evaluated at the same time
+        :return: GridResult
+        """
+        variants = variant_grid(grid, self.config)
+        cost, amount = self.evaluate(variants, chunk_size)
+        return GridResult(self, variants, cost, amount)
+
+
+class GridResult:
+    def __init__(self, plants, variants, cost, amount):
+        """
+        :param plants: PlantTable the variants were evaluated on
+        :param variants: DataFrame with the parameter values of each variant
+        :param cost: Array of shape variants x plants with the cost of carbon capture
+        :param amount: Array of shape variants x plants with the captured amount
+        """
+        self.plants = plants
+        self.variants = variants
+        self.cost = cost
+        self.amount = amount
+
+    def __repr__(self):
+        return "Sensitivity grid of {} variants over {} power plants".format(len(self.variants), len(self.plants))
+
+    def plant_data(self, variant):
+        """
+        Power plant table of a variant with the columns of the cost of carbon capture output
+        """
+        position = self.variants.index.get_loc(variant)
+        commission_column = self.plants.config["InputHomogenization"]["RegressionConfig"]["X_columns"][2]
+        df = self.plants.data[["Country", "Fueltype", "Capacity", commission_column, "lat", "lon"]].copy()
+        df["AmountCapturedMtY"] = self.amount[position]
+        df["CostOfCarbonCaptureEURtonCO2"] = self.cost[position]
+        df = df.rename(columns={"Fueltype": "Fuel", "Capacity": "CapacityMW"})
+        return df.rename_axis("id").reset_index()
+
+    def distribution(self, variant):
+        """
+        CostDistribution of a variant
+        """
+        return CostDistribution(self.plant_data(variant), column_map_pp)
+
+    def distributions(self):
+        """
+        CostDistribution of every variant
+        :return: Dictionary of variant number to CostDistribution
+        """
+        return {variant: self.distribution(variant) for variant in self.variants.index}
+
+    def table(self):
+        """
+        Stacked table with one row per variant and plant
+        :return: DataFrame with the parameter values of the variant, the plant id, cost and amount
+        """
+        n_variants, n_plants = self.cost.shape
+        df = self.variants.iloc[np.repeat(np.arange(n_variants), n_plants)].reset_index()
+        df["id"] = np.tile(self.plants.data.index.to_numpy(), n_variants)
+        df["cost"] = self.cost.ravel()
+        df["amount"] = self.amount.ravel()
+        return df
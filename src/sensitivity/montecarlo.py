@@ -0,0 +1,183 @@
+"""
+Monte Carlo uncertainty of the cost potential curve of the power plants. The delta values, the heat rate regression,
+the capture efficiency and the capacity factors are sampled from the distributions behind the assumption and
+regression maps, and the costs are evaluated as a samples x plants array in chunks with independent seeded streams.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from src.technoeconomical.cost_operations_functions import calc_lcoe_capex, calc_lcoe_om, calculate_lcoe_fuel, \
+    calculate_emissions
+from src.homogenization.plant_cost_matching import bio_map
+from src.sensitivity.grid import DEFAULT_VALUES, variant_grid, curve_costs
+import pandas as pd
+import numpy as np
+
+# The bounds of the assumption map are the 95% confidence interval of the mean
+Z_95 = 1.959963984540054
+DELTA_VALUES = ["delta_capex", "delta_om", "delta_heatrate"]
+
+_model = None
+
+
+class UncertaintyModel:
+    def __init__(self, plants, config=None):
+        """
+        Distributions of the uncertain parameters of the plants
+        :param plants: PlantTable
+        :param config: ConfigSnapshot, by default the one of the plant table
+        """
+        config = plants.config if config is None else config
+        local_config = config["Sensitivity"]["MonteCarlo"]
+        assumption_map = pd.read_csv(config["IO"]["harmonization_output_assumption_path"])
+        if config["InputHomogenization"]["IncludeBio"]:
+            assumption_map = pd.concat([assumption_map, bio_map])
+        regression_map = pd.read_csv(config["IO"]["harmonization_output_regression_path"]).set_index("Fuel")
+        self.plants = plants
+        self.types = types = list(assumption_map["fuel_type"].unique())
+        self.match_codes = pd.Categorical(plants.fuel_match, categories=types).codes.astype(np.intp)
+        if (self.match_codes < 0).any():
+            raise ValueError("Fuels {} are not in the assumption map".format(
+                ", ".join(np.unique(plants.fuel_match[self.match_codes < 0].astype(str)))))
+        values = assumption_map.set_index(["value", "fuel_type"])
+        self.mean = {v: values.loc[v].loc[types, "reference_value"].to_numpy(dtype=float) for v in DELTA_VALUES}
+        self.bounds = {v: values.loc[v].loc[types, ["range_low", "range_high"]].to_numpy(dtype=float)
+                       for v in DELTA_VALUES}
+        self.sd = {v: (self.bounds[v][:, 1] - self.bounds[v][:, 0]) / (2 * Z_95) for v in DELTA_VALUES}
+        self.regression_fuels = list(regression_map.index)
+        self.regression_codes = pd.Categorical(plants.fuel_match, categories=self.regression_fuels).codes
+        self.regression = regression_map[["slope", "slope_err", "intercept", "intersect_err"]].to_numpy(dtype=float)
+        self.fcf = config.get_value(*DEFAULT_VALUES, "FCF")
+        self.capture_efficiency = tuple(local_config["CaptureEfficiency"])
+        configured = config.get_value(*DEFAULT_VALUES, "CapacityFactor")
+        bounds = local_config["CapacityFactor"]
+        self.capacity_factor = np.array([bounds[fuel] if fuel in bounds else (configured[fuel], configured[fuel])
+                                         for fuel in plants.fuels], dtype=float)
+
+    def __repr__(self):
+        return "Uncertainty model of {} power plants".format(len(self.plants))
+
+    def sample(self, rng, size):
+        """
+        Draws values of the uncertain parameters
+        :param rng: numpy Generator
+        :param size: Number of samples
+        :return: Dictionary of parameter name to array with one row per sample
+        """
+        samples = {v: rng.normal(self.mean[v], self.sd[v], size=(size, len(self.mean[v]))) for v in DELTA_VALUES}
+        samples["slope"] = rng.normal(self.regression[:, 0], self.regression[:, 1], size=(size, len(self.regression)))
+        samples["intercept"] = rng.normal(self.regression[:, 2], self.regression[:, 3],
+                                          size=(size, len(self.regression)))
+        samples["capture_efficiency"] = rng.uniform(*self.capture_efficiency, size=(size, 1))
+        samples["capacity_factor"] = rng.uniform(self.capacity_factor[:, 0], self.capacity_factor[:, 1],
+                                                 size=(size, len(self.capacity_factor)))
+        return samples
+
+    def evaluate(self, samples):
+        """
+        Cost of carbon capture and captured amount of every plant for every sample
+        :param samples: Output of sample, it can also contain the FCF of each sample
+        :return: Arrays of shape samples x plants with the cost of carbon capture and the captured amount
+        """
+        plants = self.plants
+        delta_heatrate = samples["delta_heatrate"][:, self.match_codes]
+        regression = self.regression_codes >= 0
+        if regression.any():
+            codes = self.regression_codes[regression]
+            delta_heatrate[:, regression] = samples["slope"][:, codes] * plants.heatrate[regression] + \
+                samples["intercept"][:, codes]
+        cf = samples["capacity_factor"][:, plants.fuel_codes]
+        lcoe = calc_lcoe_capex(samples["delta_capex"][:, self.match_codes], samples.get("fcf", self.fcf), cf) + \
+            calc_lcoe_om(0, samples["delta_om"][:, self.match_codes], cf) + \
+            calculate_lcoe_fuel(delta_heatrate, plants.fuel_cost)
+        captured_ref = calculate_emissions(plants.heatrate + delta_heatrate, plants.emission_factor,
+                                           samples["capture_efficiency"])[1]
+        return 1000 * lcoe / captured_ref, captured_ref * plants.capacity * cf * 8760 / 1000000
+
+
+def _init_worker(model):
+    global _model
+    _model = model
+
+
+def _evaluate_chunk(seed, size, amounts):
+    """
+    Evaluates a chunk of samples with its own random stream
+    :return: Curve costs at the amounts and total amount of every sample
+    """
+    rng = np.random.default_rng(seed)
+    cost, amount = _model.evaluate(_model.sample(rng, size))
+    return curve_costs(cost, amount, amounts), np.nansum(amount, axis=1)
+
+
+def run_monte_carlo(plants, samples=None, amounts=None, config=None):
+    """
+    Samples the cost potential curve of the power plants
+    :param plants: PlantTable
+    :param samples: Number of samples, by default the configured one
+    :param amounts: Cumulative amounts the curves are evaluated at, by default evenly spaced up to the potential of
+    the reference curve
+    :param config: ConfigSnapshot, by default the one of the plant table
+    :return: MonteCarloResult
+    """
+    config = plants.config if config is None else config
+    local_config = config["Sensitivity"]["MonteCarlo"]
+    samples = local_config["Samples"] if samples is None else samples
+    if amounts is None:
+        reference_amount = np.nansum(plants.evaluate(variant_grid({}, config))[1])
+        amounts = np.linspace(0, reference_amount, local_config["CurvePoints"])
+    amounts = np.asarray(amounts, dtype=float)
+    chunk_size = local_config["ChunkSize"]
+    sizes = [min(chunk_size, samples - start) for start in range(0, samples, chunk_size)]
+    # Every chunk has its own stream, the result does not depend on the number of workers
+    seeds = np.random.SeedSequence(local_config["Seed"]).spawn(len(sizes))
+    model = UncertaintyModel(plants, config)
+    if local_config["Workers"] > 1 and len(sizes) > 1:
+        with ProcessPoolExecutor(local_config["Workers"], initializer=_init_worker, initargs=(model,)) as pool:
+            results = list(pool.map(_evaluate_chunk, seeds, sizes, [amounts] * len(sizes)))
+    else:
+        _init_worker(model)
+        results = [_evaluate_chunk(seed, size, amounts) for seed, size in zip(seeds, sizes)]
+    curves = np.concatenate([curve for curve, _ in results])
+    totals = np.concatenate([total for _, total in results])
+    return MonteCarloResult(amounts, curves, totals)
+
+
+class MonteCarloResult:
+    def __init__(self, amounts, curves, totals):
+        """
+        :param amounts: Cumulative amounts the curves were evaluated at
+        :param curves: Array of shape samples x amounts with the cost of the curves
+        :param totals: Total captured amount of every sample
+        """
+        self.amounts = amounts
+        self.curves = curves
+        self.totals = totals
+
+    def __repr__(self):
+        return "Monte Carlo cost potential curves, {} samples".format(len(self.curves))
+
+    def bands(self, percentiles=(5, 50, 95)):
+        """
+        Percentiles of the cost at each cumulative amount, infinite where too many samples do not reach the amount
+        :return: DataFrame indexed by amount with one column per percentile
+        """
+        with np.errstate(invalid="ignore"):
+            values = np.percentile(self.curves, percentiles, axis=0)
+        # Interpolating between two samples that do not reach the amount gives nan instead of inf
+        values[np.isnan(values)] = np.inf
+        return pd.DataFrame(values.T, index=pd.Index(self.amounts, name="amount"),
+                            columns=["P{}".format(p) for p in percentiles])
+
+    def plot(self, ax=None, **kwargs):
+        import matplotlib.pyplot as plt
+        if ax is None:
+            fig, ax = plt.subplots(figsize=(12, 10))
+        bands = self.bands().replace(np.inf, np.nan)
+        ax.fill_between(bands.index, bands["P5"], bands["P95"], alpha=0.3, step="pre", label="P5 - P95", **kwargs)
+        ax.step(bands.index, bands["P50"], where="pre", label="P50", **kwargs)
+        ax.grid()
+        ax.set_facecolor('whitesmoke')
+        ax.set_xlabel("Captured carbon (Mt/y)")
+        ax.set_ylabel("Cost (€/t)")
+        ax.legend()
+        return ax
+
@@ -0,0 +1,253 @@
+"""
+Variance based global sensitivity of the cost potential. First order and total Sobol indices are estimated with
+Saltelli sampling, the model is evaluated as a samples x sources array in chunks and only the summary metrics of each
+sample are kept, so the number of model evaluations is not bounded by the memory.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from src.homogenization.cost_of_carbon_capture_cement import cost_of_carbon_capture_cement, cost_of_clinker
+from src.homogenization.cost_of_carbon_capture_iron import cost_of_carbon_capture_steel, specific_cost, \
+    specific_capture
+from src.harmonization.cost_transformation_functions import create_index_table
+from src.sensitivity.grid import DEFAULT_VALUES, parameter_bounds, variant_metrics
+from src.sensitivity.montecarlo import UncertaintyModel, DELTA_VALUES, Z_95
+from src.tools.config_loader import use_config
+import pandas as pd
+import numpy as np
+import logging
+
+METRICS = ["amount_below_price", "cost_at_target"]
+
+_problem = None
+
+
+class SobolProblem:
+    def __init__(self, plants, industrial=True, config=None):
+        """
+        Parameters of the cost models with their bounds, the delta values and heat rate regression take the bounds of
+        the assumption and regression maps, the others the bounds of the sensitivity configuration. The industrial
+        parameters are the cost of clinker of the cement capture plant, the specific cost of the iron and steel
+        capture plant and its specific capture, with bounds relative to their value, the reference plants keep their
+        costs and the cement plants share the capture efficiency of the power plants
+        :param plants: PlantTable
+        :param industrial: If True the cement and iron and steel plants are included
+        :param config: ConfigSnapshot, by default the one of the plant table
+        """
+        config = plants.config if config is None else config
+        local_config = config["Sensitivity"]["Sobol"]
+        self.model = model = UncertaintyModel(plants, config)
+        self.names, bounds = [], []
+        for value in DELTA_VALUES:
+            for j, fuel in enumerate(model.types):
+                # The delta heat rate of the fuels with a regression is given by it
+                if value != "delta_heatrate" or fuel not in model.regression_fuels:
+                    self.names.append("{}:{}".format(value, fuel))
+                    bounds.append(model.bounds[value][j])
+        for j, fuel in enumerate(model.regression_fuels):
+            slope, slope_err, intercept, intercept_err = model.regression[j]
+            self.names += ["slope:{}".format(fuel), "intercept:{}".format(fuel)]
+            bounds += [(slope - slope_err, slope + slope_err), (intercept - intercept_err, intercept + intercept_err)]
+        self.names.append("capture_efficiency")
+        bounds.append(model.capture_efficiency)
+        for j, fuel in enumerate(plants.fuels):
+            self.names.append("capacity_factor:{}".format(fuel))
+            bounds.append(model.capacity_factor[j])
+        self.names.append("fcf")
+        bounds.append(parameter_bounds(config)["fcf"])
+        self.industrial = industrial
+        if industrial:
+            self.cement = cost_of_carbon_capture_cement(config)
+            self.iron = cost_of_carbon_capture_steel(config)
+            self.reference_efficiency = config.get_value(*DEFAULT_VALUES, "CaptureEfficiency")
+            self.industrial_values = self.industrial_inputs(config)
+            for name, relative in local_config["IndustrialBounds"].items():
+                value = self.industrial_values[name][-1]
+                self.names.append(name)
+                bounds.append((value * (1 - relative), value * (1 + relative)))
+        self.bounds = np.array(bounds, dtype=float)
+        # Parameters without range do not contribute to the variance
+        varying = self.bounds[:, 1] > self.bounds[:, 0]
+        self.fixed = {name: low for name, (low, high), v in zip(self.names, self.bounds, varying) if not v}
+        self.names = [name for name, v in zip(self.names, varying) if v]
+        self.bounds = self.bounds[varying]
+
+    @staticmethod
+    def industrial_inputs(config):
+        """
+        Inputs of the cement and iron and steel cost models
+        :param config: ConfigSnapshot
+        :return: Dictionary with the costs of the reference and capture plants and the specific capture
+        """
+        with use_config(config) as config:
+            index_table = create_index_table()
+            steel_method = "BF" if config["InputHomogenization"]["SteelMethod"] == "BF" else "COREX"
+            return {"clinker_cost": (cost_of_clinker("REF", index_table),
+                                     cost_of_clinker(config["InputHomogenization"]["CementMethod"], index_table)),
+                    "specific_cost": (specific_cost("REF", index_table), specific_cost(steel_method, index_table)),
+                    "specific_capture": (specific_capture(),)}
+
+    def __repr__(self):
+        return "Sobol problem with {} parameters".format(len(self.names))
+
+    def scale(self, unit):
+        """
+        Maps samples of the unit hypercube to the bounds of the parameters
+        """
+        return self.bounds[:, 0] + unit * (self.bounds[:, 1] - self.bounds[:, 0])
+
+    def samples(self, values):
+        """
+        Samples of the uncertainty model, the parameters not in the problem keep their reference value
+        :param values: Array of shape samples x parameters
+        :return: Dictionary of the form of UncertaintyModel.sample and the relative factors of the industrial models
+        """
+        model, size = self.model, len(values)
+        samples = {v: np.tile(model.mean[v], (size, 1)) for v in DELTA_VALUES}
+        samples["slope"] = np.tile(model.regression[:, 0], (size, 1))
+        samples["intercept"] = np.tile(model.regression[:, 2], (size, 1))
+        samples["capture_efficiency"] = np.full((size, 1), np.mean(model.capture_efficiency))
+        samples["capacity_factor"] = np.tile(model.capacity_factor.mean(axis=1), (size, 1))
+        samples["fcf"] = np.full((size, 1), model.fcf)
+        columns = dict(zip(self.names, values.T))
+        columns.update({name: np.full(size, value) for name, value in self.fixed.items()})
+        for name, column in columns.items():
+            parameter, _, fuel = name.partition(":")
+            if parameter in DELTA_VALUES:
+                samples[parameter][:, model.types.index(fuel)] = column
+            elif parameter in ["slope", "intercept"]:
+                samples[parameter][:, model.regression_fuels.index(fuel)] = column
+            elif parameter == "capacity_factor":
+                samples[parameter][:, model.plants.fuels.index(fuel)] = column
+            else:
+                samples[parameter] = column[:, None]
+        return samples
+
+    def evaluate(self, values, price, target):
+        """
+        Summary metrics of the cost potential curve of every sample, the industrial costs are proportional to the
+        cost difference of the capture and reference plants and inversely proportional to the captured amount, so
+        the results of the cement and iron and steel models are rescaled instead of evaluated again
+        :param values: Array of shape samples x parameters
+        :return: Array of shape samples x metrics
+        """
+        samples = self.samples(values)
+        cost, amount = self.model.evaluate(samples)
+        if self.industrial:
+            clinker_ref, clinker_cap = self.industrial_values["clinker_cost"]
+            steel_ref, steel_cap = self.industrial_values["specific_cost"]
+            efficiency = samples["capture_efficiency"] / self.reference_efficiency
+            capture = samples["specific_capture"] / self.industrial_values["specific_capture"][0]
+            cement_amount = self.cement["AmountCapturedMtY"].to_numpy(dtype=float) * efficiency
+            cement_cost = self.cement["CostOfCarbonCaptureEURtonCO2"].to_numpy(dtype=float) * \
+                (samples["clinker_cost"] - clinker_ref) / (clinker_cap - clinker_ref) / efficiency
+            iron_amount = self.iron["AmountCapturedMtY"].to_numpy(dtype=float) * capture
+            iron_cost = self.iron["CostOfCarbonCaptureEURtonCO2"].to_numpy(dtype=float) * \
+                (samples["specific_cost"] - steel_ref) / (steel_cap - steel_ref) / capture
+            cost = np.concatenate([cost, cement_cost, iron_cost], axis=1)
+            amount = np.concatenate([amount, cement_amount, iron_amount], axis=1)
+        return np.stack(variant_metrics(cost, amount, price, target), axis=1)
+
+
+def _init_worker(problem):
+    global _problem
+    _problem = problem
+
+
+def _evaluate_chunk(seed, size, price, target):
+    """
+    Evaluates the Saltelli matrices of a chunk of base samples with its own random stream
+    :return: Metrics of A, of B and of the matrices AB with the column of each parameter taken from B
+    """
+    rng = np.random.default_rng(seed)
+    a = _problem.scale(rng.random((size, len(_problem.names))))
+    b = _problem.scale(rng.random((size, len(_problem.names))))
+    y_a = _problem.evaluate(a, price, target)
+    y_b = _problem.evaluate(b, price, target)
+    y_ab = np.empty((size, len(_problem.names), len(METRICS)))
+    for i in range(len(_problem.names)):
+        ab = a.copy()
+        ab[:, i] = b[:, i]
+        y_ab[:, i] = _problem.evaluate(ab, price, target)
+    return y_a, y_b, y_ab
+
+
+def sobol_indices(y_a, y_b, y_ab):
+    """
+    First order indices of Saltelli et al. 2010 and total indices of Jansen 1999
+    :return: Arrays of shape parameters x metrics with the first order and total indices
+    """
+    variance = np.var(np.concatenate([y_a, y_b]), axis=0)
+    first = np.mean(y_b[:, None] * (y_ab - y_a[:, None]), axis=0) / variance
+    total = 0.5 * np.mean((y_a[:, None] - y_ab) ** 2, axis=0) / variance
+    return first, total
+
+
+def run_sobol(plants, samples=None, industrial=True, price=None, target=None, config=None):
+    """
+    Estimates the Sobol indices of the parameters for the capturable amount below a price and the cost at a target
+    amount
+    :param plants: PlantTable
+    :param samples: Number of base samples, the model is evaluated samples x (parameters + 2) times. By default the
+    configured number
+    :param industrial: If True the cement and iron and steel plants are included
+    :param price: Price the capturable amount is given at, by default the one of the tornado configuration
+    :param target: Amount the cost is given at, by default the one of the tornado configuration
+    :param config: ConfigSnapshot, by default the one of the plant table
+    :return: SobolResult
+    """
+    config = plants.config if config is None else config
+    local_config = config["Sensitivity"]["Sobol"]
+    samples = local_config["Samples"] if samples is None else samples
+    price = config["Sensitivity"]["Tornado"]["Price"] if price is None else price
+    target = config["Sensitivity"]["Tornado"]["TargetAmount"] if target is None else target
+    problem = SobolProblem(plants, industrial, config)
+    chunk_size = local_config["ChunkSize"]
+    sizes = [min(chunk_size, samples - start) for start in range(0, samples, chunk_size)]
+    seeds = np.random.SeedSequence(local_config["Seed"]).spawn(len(sizes))
+    arguments = (seeds, sizes, [price] * len(sizes), [target] * len(sizes))
+    if local_config["Workers"] > 1 and len(sizes) > 1:
+        with ProcessPoolExecutor(local_config["Workers"], initializer=_init_worker, initargs=(problem,)) as pool:
+            results = list(pool.map(_evaluate_chunk, *arguments))
+    else:
+        _init_worker(problem)
+        results = [_evaluate_chunk(*chunk) for chunk in zip(*arguments)]
+    y_a, y_b, y_ab = (np.concatenate(outputs) for outputs in zip(*results))
+    return SobolResult(problem.names, y_a, y_b, y_ab, local_config["Bootstrap"], local_config["Seed"])
+
+
+class SobolResult:
+    def __init__(self, names, y_a, y_b, y_ab, bootstrap=100, seed=None):
+        """
+        :param names: Names of the parameters
+        :param y_a: Metrics of the samples of A
+        :param y_b: Metrics of the samples of B
+        :param y_ab: Metrics of the samples of AB for every parameter
+        :param bootstrap: Number of bootstrap resamples for the confidence intervals
+        :param seed: Seed of the bootstrap
+        """
+        self.names = names
+        self.y_a, self.y_b, self.y_ab = y_a, y_b, y_ab
+        finite = np.isfinite(y_a).all(axis=0) & np.isfinite(y_b).all(axis=0) & np.isfinite(y_ab).all(axis=(0, 1))
+        for metric in np.array(METRICS)[~finite]:
+            logging.warning("Some samples do not have a finite {}, its indices are not defined".format(metric))
+        with np.errstate(invalid="ignore"):
+            self.first, self.total = sobol_indices(y_a, y_b, y_ab)
+            rng = np.random.default_rng(seed)
+            resamples = [sobol_indices(y_a[rows], y_b[rows], y_ab[rows])
+                         for rows in rng.integers(0, len(y_a), (bootstrap, len(y_a)))]
+        self.first_conf = Z_95 * np.std([first for first, _ in resamples], axis=0)
+        self.total_conf = Z_95 * np.std([total for _, total in resamples], axis=0)
+
+    def __repr__(self):
+        return "Sobol indices of {} parameters from {} base samples".format(len(self.names), len(self.y_a))
+
+    def table(self, metric="amount_below_price"):
+        """
+        Indices of a metric with the half width of their 95% bootstrap confidence interval
+        :param metric: amount_below_price or cost_at_target
+        :return: DataFrame indexed by parameter, sorted by the total index
+        """
+        j = METRICS.index(metric)
+        df = pd.DataFrame({"S1": self.first[:, j], "S1_conf": self.first_conf[:, j],
+                           "ST": self.total[:, j], "ST_conf": self.total_conf[:, j]},
+                          index=pd.Index(self.names, name="parameter"))
+        return df.sort_values("ST", ascending=False)
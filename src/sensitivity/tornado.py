@@ -0,0 +1,126 @@
+"""
+One at a time sensitivity of the cost potential of the power plants. Each parameter is set to its low and high bound
+while the others keep their reference value, the perturbations are evaluated in worker processes that share the
+loaded plant table.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from src.sensitivity.grid import PARAMETERS, reference_values, parameter_bounds, variant_metrics
+import pandas as pd
+import numpy as np
+
+_plants = None
+
+
+def tornado_variants(bounds, config):
+    """
+    Reference variant followed by the low and high variant of every parameter
+    :param bounds: Dictionary of parameter name to low and high value
+    :param config: ConfigSnapshot with the reference values
+    :return: DataFrame with the parameter values, the perturbed parameter and the side of the perturbation
+    """
+    unknown = set(bounds) - set(PARAMETERS)
+    if unknown:
+        raise ValueError("Unknown parameters {}, they should be in {}".format(", ".join(sorted(unknown)),
+                                                                            ", ".join(PARAMETERS)))
+    reference = reference_values(config)
+    rows = [dict(reference, parameter="reference", side="reference")]
+    for name, (low, high) in bounds.items():
+        rows.append(dict(reference, **{name: low}, parameter=name, side="low"))
+        rows.append(dict(reference, **{name: high}, parameter=name, side="high"))
+    variants = pd.DataFrame(rows)
+    variants.index.rename("variant", inplace=True)
+    return variants
+
+
+def _init_worker(plants):
+    global _plants
+    _plants = plants
+
+
+def _evaluate_variants(variants, price, target):
+    cost, amount = _plants.evaluate(variants)
+    return variant_metrics(cost, amount, price, target)
+
+
+def run_tornado(plants, bounds=None, price=None, target=None, config=None):
+    """
+    Perturbs each parameter to its bounds while holding the others at the reference
+    :param plants: PlantTable
+    :param bounds: Dictionary of parameter name to low and high value, by default parameter_bounds of the configuration
+    :param price: Price the capturable amount is given at, by default the configured one
+    :param target: Amount the cost is given at, by default the configured one
+    :param config: ConfigSnapshot, by default the one of the plant table
+    :return: TornadoResult
+    """
+    config = plants.config if config is None else config
+    local_config = config["Sensitivity"]["Tornado"]
+    bounds = parameter_bounds(config) if bounds is None else bounds
+    price = local_config["Price"] if price is None else price
+    target = local_config["TargetAmount"] if target is None else target
+    variants = tornado_variants(bounds, config)
+    workers = min(local_config["Workers"], len(variants))
+    chunks = [variants.iloc[rows] for rows in np.array_split(np.arange(len(variants)), workers)]
+    if workers > 1:
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(plants,)) as pool:
+            results = list(pool.map(_evaluate_variants, chunks, [price] * workers, [target] * workers))
+    else:
+        _init_worker(plants)
+        results = [_evaluate_variants(chunk, price, target) for chunk in chunks]
+    metrics = variants[["parameter", "side"]].copy()
+    metrics["amount_below_price"] = np.concatenate([below for below, _ in results])
+    metrics["cost_at_target"] = np.concatenate([cost for _, cost in results])
+    return TornadoResult(variants, metrics, bounds, price, target)
+
+
+class TornadoResult:
+    def __init__(self, variants, metrics, bounds, price, target):
+        """
+        :param variants: DataFrame with the parameter values of the reference and the perturbations
+        :param metrics: DataFrame with the metrics of each variant
+        :param bounds: Dictionary of parameter name to low and high value
+        :param price: Price the capturable amount was given at
+        :param target: Amount the cost was given at
+        """
+        self.variants = variants
+        self.metrics = metrics
+        self.bounds = bounds
+        self.price = price
+        self.target = target
+
+    def __repr__(self):
+        return "Tornado analysis of {} parameters".format(len(self.bounds))
+
+    @property
+    def reference(self):
+        return self.metrics.iloc[0]
+
+    def table(self, metric="amount_below_price"):
+        """
+        Change of a metric from the reference for the low and high bound of each parameter
+        :param metric: amount_below_price or cost_at_target
+        :return: DataFrame indexed by parameter, sorted by the swing between the bounds
+        """
+        df = self.metrics[self.metrics["side"] != "reference"].pivot(index="parameter", columns="side", values=metric)
+        df = df[["low", "high"]] - self.reference[metric]
+        df.columns.name = None
+        df["swing"] = (df["high"] - df["low"]).abs()
+        df["low_value"] = [self.bounds[name][0] for name in df.index]
+        df["high_value"] = [self.bounds[name][1] for name in df.index]
+        return df.sort_values("swing", ascending=False)
+
+    def plot(self, metric="amount_below_price", ax=None):
+        import matplotlib.pyplot as plt
+        if ax is None:
+            fig, ax = plt.subplots(figsize=(12, 6))
+        df = self.table(metric).iloc[::-1]
+        ax.barh(df.index, df["low"], color="tab:blue", label="Low")
+        ax.barh(df.index, df["high"], color="tab:red", label="High")
+        ax.axvline(0, color="black", linewidth=1)
+        ax.grid(axis="x")
+        ax.set_facecolor('whitesmoke')
+        if metric == "amount_below_price":
+            ax.set_xlabel("Change of the captured carbon below {} €/t (Mt/y)".format(self.price))
+        else:
+            ax.set_xlabel("Change of the cost at {} Mt/y (€/t)".format(self.target))
+        ax.legend()
+        return ax
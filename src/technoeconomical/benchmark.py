@@ -0,0 +1,85 @@
+"""
+Micro-benchmark of the cost operations, the per row scalar path against the array kernels with and without
+preallocated output buffers. Run with python -m src.technoeconomical.benchmark
+"""
+from src.technoeconomical.cost_operations_functions import calc_lcoe_capex, calc_lcoe_om, calculate_lcoe_fuel, \
+    calculate_emissions, cost_of_carbon_capture
+import pandas as pd
+import numpy as np
+import timeit
+
+
+def synthetic_plants(n_plants, seed=0):
+    """
+    Random plant values in the ranges of the assumption map
+    :return: Dictionary of value name to array of length n_plants
+    """
+    rng = np.random.default_rng(seed)
+    return {"capex": rng.uniform(1000, 2500, n_plants), "om": rng.uniform(0.002, 0.01, n_plants),
+            "heatrate": rng.uniform(6000, 11000, n_plants), "delta_heatrate": rng.uniform(1000, 3000, n_plants),
+            "fuel_cost": rng.uniform(2, 8, n_plants), "emission_factor": rng.uniform(56, 101, n_plants),
+            "cf": rng.uniform(0.4, 0.8, n_plants)}
+
+
+def scalar_path(plants, fcf, capture_efficiency):
+    cost = np.empty(len(plants["capex"]))
+    for i in range(len(cost)):
+        lcoe = calc_lcoe_capex(plants["capex"][i], fcf, plants["cf"][i]) + \
+            calc_lcoe_om(0, plants["om"][i], plants["cf"][i]) + \
+            calculate_lcoe_fuel(plants["delta_heatrate"][i], plants["fuel_cost"][i])
+        captured = calculate_emissions(plants["heatrate"][i] + plants["delta_heatrate"][i],
+                                       plants["emission_factor"][i], capture_efficiency)[1]
+        cost[i] = cost_of_carbon_capture(0, 1000 * lcoe, captured)
+    return cost
+
+
+def array_path(plants, fcf, capture_efficiency):
+    lcoe = calc_lcoe_capex(plants["capex"], fcf, plants["cf"]) + calc_lcoe_om(0, plants["om"], plants["cf"]) + \
+        calculate_lcoe_fuel(plants["delta_heatrate"], plants["fuel_cost"])
+    captured = calculate_emissions(plants["heatrate"] + plants["delta_heatrate"], plants["emission_factor"],
+                                   capture_efficiency)[1]
+    return cost_of_carbon_capture(0, 1000 * lcoe, captured)
+
+
+def buffer_path(plants, fcf, capture_efficiency, buffers):
+    lcoe, buffer, captured, cost = buffers
+    calc_lcoe_capex(plants["capex"], fcf, plants["cf"], out=lcoe)
+    lcoe += calc_lcoe_om(0, plants["om"], plants["cf"], out=buffer)
+    lcoe += calculate_lcoe_fuel(plants["delta_heatrate"], plants["fuel_cost"], out=buffer)
+    lcoe *= 1000
+    np.add(plants["heatrate"], plants["delta_heatrate"], out=cost)
+    calculate_emissions(cost, plants["emission_factor"], capture_efficiency, out=(buffer, captured))
+    return cost_of_carbon_capture(0, lcoe, captured, out=cost)
+
+
+def benchmark_kernels(n_plants=5000, n_variants=64, repeat=5):
+    """
+    Times the evaluation of the cost of carbon capture of a set of plants
+    :param n_plants: Number of synthetic plants
+    :param n_variants: Number of variants of the FCF and capture efficiency evaluated by the array paths at once
+    :param repeat: Number of timings, the best one is kept
+    :return: DataFrame with the time per plant and variant of every path in nanoseconds
+    """
+    plants = synthetic_plants(n_plants)
+    fcf, capture_efficiency = 0.11, 0.9
+    reference = scalar_path(plants, fcf, capture_efficiency)
+    if not np.allclose(reference, array_path(plants, fcf, capture_efficiency)):
+        raise ValueError("The array kernels do not match the scalar path")
+    batch = {name: np.tile(values, (n_variants, 1)) for name, values in plants.items()}
+    variant_fcf = np.linspace(0.08, 0.14, n_variants)[:, None]
+    variant_efficiency = np.linspace(0.85, 0.95, n_variants)[:, None]
+    buffers = [np.empty((n_variants, n_plants)) for _ in range(4)]
+    cases = {"scalar": (lambda: scalar_path(plants, fcf, capture_efficiency), 1),
+             "array": (lambda: array_path(batch, variant_fcf, variant_efficiency), n_variants),
+             "array_out": (lambda: buffer_path(batch, variant_fcf, variant_efficiency, buffers), n_variants)}
+    timings = {}
+    for name, (function, variants) in cases.items():
+        best = min(timeit.repeat(function, number=1, repeat=repeat))
+        timings[name] = 1e9 * best / (variants * n_plants)
+    df = pd.DataFrame({"ns_per_evaluation": pd.Series(timings)})
+    df["speedup"] = df.loc["scalar", "ns_per_evaluation"] / df["ns_per_evaluation"]
+    return df
+
+
+if __name__ == "__main__":
+    print(benchmark_kernels())
@@ -1,59 +1,109 @@
-import logging
+import numpy as np
 
+BASES = ["perkw"]
 
-def calc_lcoe_capex(capex, fcf, cf=1, basis="perkw"):
+
+def check_basis(basis):
+    """
+    Validates the basis of the capex
+    :param basis: Name of the basis
+    """
+    if basis not in BASES:
+        raise ValueError("Basis {} is not implemented, it should be one of {}".format(basis, ", ".join(BASES)))
+
+
+def output_array(out, *arrays):
+    """
+    Validates a preallocated buffer for the result of broadcasting the arrays
+    :param out: Preallocated array
+    :param arrays: Inputs of the operation, scalars or arrays
+    :return: The buffer
+    """
+    shape = np.broadcast(*arrays).shape
+    if out.shape != shape:
+        raise ValueError("out has shape {} but the inputs broadcast to {}".format(out.shape, shape))
+    return out
+
+
+def calc_lcoe_capex(capex, fcf, cf=1, basis="perkw", out=None):
     """
     Calculate capex component of lcoe
     :param capex: Capex in the form of CURR/MW
     :param cf: capacity factor, default is 1
     :param fcf: Plant life cost inflation corrector
     :param basis: Default is per MW, it is there to be open to implement other values
+    :param out: Preallocated array with the broadcast shape of the inputs for the result
     :return: LCOE CAPEX component in CURR per KWh
     """
-    if basis == "perkw":
-        capex_lcoe = capex * fcf / (cf * 8760)
-    else:
-        logging.warning("Currently there is no other basis implemented")
-        return None
-    return capex_lcoe
+    check_basis(basis)
+    if out is None:
+        return capex * fcf / (cf * 8760)
+    out = output_array(out, capex, fcf, cf)
+    np.multiply(capex, fcf, out=out)
+    np.divide(out, cf, out=out)
+    return np.divide(out, 8760, out=out)
 
 
-def calc_lcoe_om(fom, vom, cf=1):
+def calc_lcoe_om(fom, vom, cf=1, out=None):
     """
 
     :param fom: Fixed operation and maintentance costs as CURR/KWY
     :param vom: Variable cost in the form of CURR/ KWH
     :param cf: Capacity factor assumed for the plant, default is 1
+    :param out: Preallocated array with the broadcast shape of the inputs for the result
     :return: LCOE O&M component in CURR per KWh
     """
-    fixed = fom / (cf * 8600)
-    om_lcoe = fixed + vom
+    if out is None:
+        return fom / (cf * 8600) + vom
+    out = output_array(out, fom, vom, cf)
+    np.divide(fom, cf, out=out)
+    np.divide(out, 8600, out=out)
+    return np.add(out, vom, out=out)
 
-    return om_lcoe
 
-
-def calculate_lcoe_fuel(hr, fc):
+def calculate_lcoe_fuel(hr, fc, out=None):
     """
     Calculates fuel component of LCOE
     :param hr: Heat rate as KJ/KWH
     :param fc: fuel cost as CURR/GJ
+    :param out: Preallocated array with the broadcast shape of the inputs for the result
     :return: LCOE fuel component CURR/MWH
     """
-    return hr * fc / 1000000
+    if out is None:
+        return hr * fc / 1000000
+    out = output_array(out, hr, fc)
+    np.multiply(hr, fc, out=out)
+    return np.divide(out, 1000000, out=out)
 
 
-def calculate_emissions(hr, ef, cap_eff=0):
+def calculate_emissions(hr, ef, cap_eff=0, out=None):
     """
     Calculate emitted and captured carbon
     :param hr: Heat rate as MJ/MWH
     :param ef: Emission factor as Kg/GJ
     :param cap_eff: Unitless
+    :param out: Pair of preallocated arrays for the emitted and captured carbon
     :return: emission/capture as kg/MWH
     """
-    emitted = hr * ef * (1 - cap_eff)
-    captured = hr * ef * cap_eff
+    if out is None:
+        emitted = hr * ef * (1 - cap_eff)
+        captured = hr * ef * cap_eff
+        return emitted, captured
+    emitted, captured = (output_array(array, hr, ef, cap_eff) for array in out)
+    np.multiply(hr, ef, out=captured)
+    np.subtract(1, cap_eff, out=emitted)
+    np.multiply(captured, emitted, out=emitted)
+    np.multiply(captured, cap_eff, out=captured)
     return emitted, captured
 
 
-def cost_of_carbon_capture(lcoe_ref, lcoe_cc, captured):
-    return (lcoe_cc - lcoe_ref) / captured
+def cost_of_carbon_capture(lcoe_ref, lcoe_cc, captured, out=None):
+    """
+    Cost per captured unit of the difference between the LCOE with and without capture
+    :param out: Preallocated array with the broadcast shape of the inputs for the result
+    """
+    if out is None:
+        return (lcoe_cc - lcoe_ref) / captured
+    out = output_array(out, lcoe_ref, lcoe_cc, captured)
+    np.subtract(lcoe_cc, lcoe_ref, out=out)
+    return np.divide(out, captured, out=out)
@@ -1,6 +1,11 @@
 import yaml
+from collections.abc import Mapping
+from contextlib import contextmanager
+from contextvars import ContextVar
 from pathlib import Path
+import hashlib
 import logging
+import json
 
 CONFIG_PATH = Path(__file__).parents[2] / "config.yaml"
 DEFAULT_CONFIG_PATH = Path(__file__).parents[2] / "default/config.yaml"
@@ -18,6 +23,8 @@ class Configuration:
             setattr(self, key, dictionary[key])
         for key in kwargs:
             setattr(self, key, kwargs[key])
+        self._keys = list(dictionary.keys()) + list(kwargs.keys())
+        self._snapshot = None
 
     __instance = None
 
@@ -33,8 +40,18 @@ class Configuration:
         if len(levels) <= 1:
             logging.info("Root levels are protected, please insert another level")
         self.__set_value(self.__dict__, value, *levels)
+        self._snapshot = None
         return
 
+    def snapshot(self):
+        """
+        Frozen copy of the current values, it is created again after set_value
+        :return: ConfigSnapshot
+        """
+        if self._snapshot is None:
+            self._snapshot = ConfigSnapshot({key: getattr(self, key) for key in self._keys})
+        return self._snapshot
+
     @classmethod
     def __set_value(cls, dic, value, *levels):
         levels =list(levels)
@@ -77,4 +94,126 @@ class Configuration:
         return Configuration.__instance
 
 
-#config = Configuration(CONFIG_PATH)
+class FrozenDict(Mapping):
+    """
+    Read only dictionary, the nested dictionaries and lists are frozen as well
+    """
+    def __init__(self, values):
+        self._values = {key: freeze(value) for key, value in values.items()}
+
+    def __getitem__(self, item):
+        return self._values[item]
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __repr__(self):
+        return "FrozenDict({})".format(self._values)
+
+
+def freeze(value):
+    """
+    Read only version of a configuration value
+    """
+    if isinstance(value, Mapping):
+        return FrozenDict(value)
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+def thaw(value):
+    """
+    Mutable copy of a frozen configuration value
+    """
+    if isinstance(value, Mapping):
+        return {key: thaw(v) for key, v in value.items()}
+    if isinstance(value, tuple):
+        return [thaw(v) for v in value]
+    return value
+
+
+class ConfigSnapshot(FrozenDict):
+    """
+    Immutable configuration of a run, its hash identifies the values and can be used as cache key
+    """
+    def __init__(self, values):
+        super().__init__(values)
+        self.hash = hashlib.sha1(json.dumps(thaw(self), sort_keys=True, default=str).encode()).hexdigest()
+
+    def __hash__(self):
+        return int(self.hash[:16], 16)
+
+    def __eq__(self, other):
+        return isinstance(other, ConfigSnapshot) and self.hash == other.hash
+
+    def __repr__(self):
+        return "Configuration snapshot {}".format(self.hash[:12])
+
+    def get_value(self, *levels):
+        """
+        Value at the given levels, e.g. get_value("InputHomogenization", "CostLevel")
+        """
+        value = self
+        for level in levels:
+            value = value[level]
+        return value
+
+    def override(self, value, *levels):
+        """
+        New snapshot with the value at the given levels replaced, the snapshot itself does not change
+        :param value: New value
+        :param levels: Levels of the value, in the same form as Configuration.set_value
+        :return: ConfigSnapshot
+        """
+        if len(levels) <= 1:
+            raise ValueError("Root levels are protected, please insert another level")
+        values = thaw(self)
+        local = values
+        for level in levels[:-1]:
+            local = local[level]
+        local[levels[-1]] = value
+        return ConfigSnapshot(values)
+
+
+_active_config = ContextVar("active_config", default=None)
+
+
+def current_config():
+    """
+    Configuration of the running code, the snapshot of the innermost use_config or override block or, outside of
+    them, a snapshot of the Configuration instance
+    :return: ConfigSnapshot
+    """
+    active = _active_config.get()
+    return active if active is not None else Configuration.get_instance().snapshot()
+
+
+@contextmanager
+def use_config(config=None):
+    """
+    Makes the given snapshot the configuration of the code executed in the block, in this thread or task
+    :param config: ConfigSnapshot, if None the current configuration is kept
+    """
+    if config is None:
+        yield current_config()
+        return
+    token = _active_config.set(config)
+    try:
+        yield config
+    finally:
+        _active_config.reset(token)
+
+
+@contextmanager
+def override(value, *levels):
+    """
+    Executes the block with a value of the current configuration replaced, e.g.
+    with override("range_high", "InputHomogenization", "CostLevel"): ...
+    """
+    with use_config(current_config().override(value, *levels)) as config:
+        yield config
+
@@ -0,0 +1,306 @@
+"""
+Stage graph of the data processing framework, every stage declares the files it reads and writes and the
+configuration values it depends on. The outputs of a stage are cached under a hash of those inputs so only the stages
+whose inputs changed are executed again. Stages that do not depend on each other run in parallel processes.
+"""
+from concurrent.futures import ProcessPoolExecutor, Future, wait, FIRST_COMPLETED
+from pathlib import Path
+from src.tools.config_loader import use_config, thaw
+import warnings
+import hashlib
+import logging
+import shutil
+import json
+import os
+
+
+class StageError(Exception):
+    pass
+
+
+class Stage:
+    def __init__(self, name, function, inputs=(), outputs=(), config_keys=(), retries=0, ignore_warnings=False):
+        """
+        :param name: Name of the stage
+        :param function: Module level function without arguments that produces the outputs
+        :param inputs: IO keys of the files the stage reads
+        :param outputs: IO keys of the files the stage writes
+        :param config_keys: Tuples with the levels of the configuration values the stage reads
+        :param retries: Times the stage is executed again after an error before the run fails
+        :param ignore_warnings: If True the warnings of the function are not shown
+        """
+        self.name = name
+        self.function = function
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.config_keys = [tuple(levels) for levels in config_keys]
+        self.retries = retries
+        self.ignore_warnings = ignore_warnings
+
+    def __repr__(self):
+        return "Stage {}".format(self.name)
+
+
+def config_value(config, levels):
+    """
+    Extracts a value from the configuration following the given levels
+    """
+    value = config[levels[0]]
+    for level in levels[1:]:
+        value = value[level]
+    return value
+
+
+def hash_file(path):
+    """
+    Hash of the contents of a file, or of all the files of a directory
+    :param path: Path of the file or directory
+    :return: Hexadecimal hash as string, "missing" if the path does not exist
+    """
+    path = Path(path)
+    if not path.exists():
+        return "missing"
+    files = sorted(p for p in path.rglob("*") if p.is_file()) if path.is_dir() else [path]
+    sha = hashlib.sha1()
+    for file in files:
+        sha.update(str(file.relative_to(path) if path.is_dir() else file.name).encode())
+        with open(file, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                sha.update(block)
+    return sha.hexdigest()
+
+
+def run_stage(name, function, retries=0, ignore_warnings=False, config=None):
+    """
+    Executes the function of a stage, retrying if it is allowed. It is executed in the worker processes
+    :param name: Name of the stage
+    :param function: Function of the stage
+    :param retries: Times the function is executed again after an error
+    :param ignore_warnings: If True the warnings of the function are not shown
+    :param config: ConfigSnapshot the function is executed with, by default the current configuration
+    """
+    for attempt in range(retries + 1):
+        try:
+            with use_config(config), warnings.catch_warnings():
+                if ignore_warnings:
+                    warnings.simplefilter("ignore")
+                function()
+            return
+        except Exception as error:
+            if attempt == retries:
+                raise StageError("Stage {} failed ({}), the next run will resume from it".format(name, error)) \
+                    from error
+            logging.warning("Stage {} failed ({}), executing it again".format(name, error))
+
+
+def copy_path(source, destination):
+    """
+    Copies a file or directory, replacing the destination
+    """
+    source, destination = Path(source), Path(destination)
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    if destination.is_dir():
+        shutil.rmtree(destination)
+    if source.is_dir():
+        shutil.copytree(source, destination)
+    else:
+        shutil.copy2(source, destination)
+
+
+class Pipeline:
+    def __init__(self, stages, io, config, cache_path, manifest_path, keep_artifacts=3, workers=1):
+        """
+        :param stages: List of stages, the dependencies are given by the files they read and write
+        :param io: Dictionary of IO keys to paths
+        :param config: ConfigSnapshot the config keys of the stages are taken from, the stages are executed with it
+        :param cache_path: Directory where the outputs of the stages are cached
+        :param manifest_path: File where the state of the last run is kept
+        :param keep_artifacts: Number of cached outputs kept per stage
+        :param workers: Number of processes executing stages at the same time, 1 executes them in this process
+        """
+        self.stages = self.sort_stages(stages)
+        self.io = io
+        self.config = config
+        self.cache_path = Path(cache_path)
+        self.manifest_path = Path(manifest_path)
+        self.keep_artifacts = keep_artifacts
+        self.workers = workers
+        self.manifest = self.load_manifest()
+
+    def __repr__(self):
+        return "Pipeline: {}".format(" -> ".join(stage.name for stage in self.stages))
+
+    @staticmethod
+    def dependencies(stage, stages):
+        """
+        Stages that write a file the given stage reads
+        """
+        return [other for other in stages if other is not stage and set(other.outputs) & set(stage.inputs)]
+
+    @classmethod
+    def sort_stages(cls, stages):
+        """
+        Topological order of the stages, keeping the given order between independent stages
+        """
+        ordered = []
+        pending = list(stages)
+        while pending:
+            ready = [s for s in pending if all(d in ordered for d in cls.dependencies(s, stages))]
+            if not ready:
+                raise ValueError("The stages {} have circular dependencies".format([s.name for s in pending]))
+            ordered.append(ready[0])
+            pending.remove(ready[0])
+        return ordered
+
+    def load_manifest(self):
+        if self.manifest_path.is_file():
+            with open(self.manifest_path, "r") as file:
+                return json.load(file)
+        return {"stages": {}, "files": {}}
+
+    def save_manifest(self):
+        self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.manifest_path.with_name(self.manifest_path.name + ".tmp")
+        with open(tmp_path, "w") as file:
+            json.dump(self.manifest, file, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    def file_hash(self, key):
+        """
+        Content hash of the file of an IO key, files that did not change since they were last hashed are not read
+        """
+        path = Path(self.io[key])
+        if not path.exists():
+            return "missing"
+        stat = path.stat()
+        signature = [stat.st_mtime_ns, stat.st_size]
+        known = self.manifest["files"].get(str(path))
+        if path.is_file() and known is not None and known["signature"] == signature:
+            return known["hash"]
+        content = hash_file(path)
+        self.manifest["files"][str(path)] = {"signature": signature, "hash": content}
+        return content
+
+    def stage_hash(self, stage):
+        """
+        Hash of everything the stage reads
+        """
+        description = {"stage": stage.name,
+                       "inputs": {key: self.file_hash(key) for key in stage.inputs},
+                       "config": {"/".join(levels): thaw(config_value(self.config, levels)) for levels in stage.config_keys}}
+        return hashlib.sha1(json.dumps(description, sort_keys=True, default=str).encode()).hexdigest()
+
+    def is_current(self, stage, stage_hash):
+        """
+        True if the outputs on disk were produced by the last run of the stage with the same inputs
+        """
+        state = self.manifest["stages"].get(stage.name)
+        if state is None or state["hash"] != stage_hash:
+            return False
+        return all(self.file_hash(key) == state["outputs"].get(key) for key in stage.outputs)
+
+    def artifact_path(self, stage, stage_hash):
+        return self.cache_path / stage.name / stage_hash
+
+    def store_artifact(self, stage, stage_hash):
+        artifact = self.artifact_path(stage, stage_hash)
+        for key in stage.outputs:
+            if Path(self.io[key]).exists():
+                copy_path(self.io[key], artifact / key)
+        artifacts = sorted((p for p in (self.cache_path / stage.name).iterdir() if p.is_dir()),
+                           key=lambda p: p.stat().st_mtime)
+        for old in artifacts[:-self.keep_artifacts]:
+            shutil.rmtree(old)
+
+    def restore_artifact(self, stage, stage_hash):
+        """
+        Copies the cached outputs of the stage back to their locations
+        :return: True if there was a complete artifact for the hash
+        """
+        artifact = self.artifact_path(stage, stage_hash)
+        if not all((artifact / key).exists() for key in stage.outputs):
+            return False
+        for key in stage.outputs:
+            copy_path(artifact / key, self.io[key])
+        os.utime(artifact)
+        return True
+
+    def submit(self, pool, stage):
+        """
+        Starts the execution of a stage in the pool, or executes it directly if there is no pool
+        :return: Future of the execution
+        """
+        arguments = (stage.name, stage.function, stage.retries, stage.ignore_warnings, self.config)
+        if pool is not None:
+            return pool.submit(run_stage, *arguments)
+        future = Future()
+        try:
+            future.set_result(run_stage(*arguments))
+        except StageError as error:
+            future.set_exception(error)
+        return future
+
+    def finish(self, stage, stage_hash):
+        """
+        Records a successful stage in the manifest so a failed run resumes after it
+        """
+        self.manifest["stages"][stage.name] = {"hash": stage_hash,
+                                               "outputs": {key: self.file_hash(key) for key in stage.outputs}}
+        self.save_manifest()
+
+    def ready(self, pending, done):
+        """
+        Pending stages whose dependencies are done, in topological order
+        """
+        return [stage for stage in pending
+                if all(d.name in done for d in self.dependencies(stage, self.stages))]
+
+    def run(self, force=False):
+        """
+        Runs the stages whose inputs changed since their last run, independent stages are executed at the same time
+        :param force: If True every stage is executed
+        :return: List with the names of the executed stages in topological order
+        """
+        pending = list(self.stages)
+        done, executed, failed = set(), set(), []
+        running = {}
+        pool = ProcessPoolExecutor(self.workers) if self.workers > 1 else None
+        try:
+            while True:
+                ready = [] if failed else self.ready(pending, done)
+                while ready:
+                    for stage in ready:
+                        pending.remove(stage)
+                        stage_hash = self.stage_hash(stage)
+                        if not force and self.is_current(stage, stage_hash):
+                            logging.info("{} is up to date".format(stage.name))
+                            done.add(stage.name)
+                        elif not force and self.restore_artifact(stage, stage_hash):
+                            logging.info("{} restored from cache".format(stage.name))
+                            self.finish(stage, stage_hash)
+                            done.add(stage.name)
+                        else:
+                            logging.info("Running {}".format(stage.name))
+                            running[self.submit(pool, stage)] = (stage, stage_hash)
+                    ready = [] if failed else self.ready(pending, done)
+                if not running:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in sorted(finished, key=lambda f: self.stages.index(running[f][0])):
+                    stage, stage_hash = running.pop(future)
+                    try:
+                        future.result()
+                    except StageError as error:
+                        logging.error(str(error))
+                        failed.append(error)
+                        continue
+                    self.store_artifact(stage, stage_hash)
+                    self.finish(stage, stage_hash)
+                    done.add(stage.name)
+                    executed.add(stage.name)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        if failed:
+            raise failed[0]
+        return [stage.name for stage in self.stages if stage.name in executed]
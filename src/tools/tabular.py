@@ -0,0 +1,160 @@
+"""
+Reading and writing of the tables handed between the stages of the framework. The format is given by the file ending:
+Parquet and Feather keep the column types and are read without parsing, csv is kept for explicit exports.
+"""
+from pathlib import Path
+from urllib.parse import unquote
+import shutil
+import pandas as pd
+
+FORMATS = [".parquet", ".feather", ".csv"]
+CATEGORICAL_COLUMNS = ["Country", "Fueltype", "Technology", "Fuel", "Source", "source", "geographical_label"]
+
+
+def table_format(path):
+    """
+    Format of a table file
+    :param path: Path of the file, partitioned Parquet datasets are directories ending with .parquet
+    :return: File ending
+    """
+    ending = Path(path).suffix
+    if ending not in FORMATS:
+        raise ValueError("Ending {} should be one of {}".format(ending, ", ".join(FORMATS)))
+    return ending
+
+
+def categorize(df, columns=CATEGORICAL_COLUMNS):
+    """
+    Encodes the label columns as categories, so they are stored once per partition instead of once per row
+    :param df: DataFrame or GeoDataFrame
+    :param columns: Columns to encode, the ones that are not in the data are ignored
+    :return: Encoded copy of the data
+    """
+    df = df.copy()
+    for column in columns:
+        if column in df.columns and pd.api.types.is_string_dtype(df[column].dtype):
+            df[column] = df[column].astype("category")
+    return df
+
+
+def is_geo_table(path):
+    """
+    True if the Parquet or Feather table was written from a GeoDataFrame
+    """
+    import pyarrow.dataset as ds
+    file_format = "parquet" if table_format(path) == ".parquet" else "ipc"
+    metadata = ds.dataset(str(path), format=file_format, partitioning="hive").schema.metadata
+    return metadata is not None and b"geo" in metadata
+
+
+def write_table(df, path, index=True, partition_cols=None, **csv_options):
+    """
+    Writes a table in the format given by the ending of the path
+    :param df: DataFrame or GeoDataFrame
+    :param path: Path of the file
+    :param index: If True the index is stored
+    :param partition_cols: Columns the Parquet dataset is partitioned by, readers can then skip whole partitions.
+    They are ignored for the other formats
+    :param csv_options: Options of pandas.DataFrame.to_csv, used only for csv files
+    """
+    path = Path(path)
+    ending = table_format(path)
+    if ending == ".csv":
+        df.to_csv(path, index=index, **csv_options)
+        return
+    df = categorize(df)
+    if ending == ".feather":
+        df = df.reset_index() if index else df.reset_index(drop=True)
+        df.to_feather(path)
+        return
+    if path.is_dir():
+        shutil.rmtree(path)
+    elif partition_cols and path.is_file():
+        path.unlink()
+    df.to_parquet(path, index=index, partition_cols=partition_cols)
+
+
+def patch_table(df, path, index, partition_cols=None):
+    """
+    Replaces and removes rows of a table written by write_table. Of a partitioned Parquet dataset only the partitions
+    holding a removed or replaced row are read and written again
+    :param df: New rows, indexed like the table, they replace the rows with the same index
+    :param path: Path of the table
+    :param index: Index values of the rows to remove
+    :param partition_cols: Columns the Parquet dataset is partitioned by
+    """
+    path = Path(path)
+    drop = pd.Index(index).union(df.index)
+    if not partition_cols or not path.is_dir():
+        table = read_table(path, index_col=df.index.name)
+        write_table(pd.concat([table[~table.index.isin(drop)], df]), path, partition_cols=partition_cols)
+        return
+    keys = read_table(path, columns=partition_cols)
+    keys = pd.concat([keys[keys.index.isin(drop)], df[partition_cols]])
+    filters = [(column, "in", keys[column].astype(str).unique().tolist()) for column in partition_cols]
+    table = read_table(path, filters=filters)
+    kept = table[~table.index.isin(drop)]
+    patched = pd.concat([kept, df])
+    # The new rows take the types of the stored columns, the files of a dataset must share their schema
+    types = {column: dtype for column, dtype in kept.dtypes.items()
+             if column not in partition_cols and not isinstance(dtype, pd.CategoricalDtype)}
+    patched = patched.astype(types)
+    partitions = {tuple(str(value) for value in row) for row in table[partition_cols].itertuples(index=False)}
+    partitions |= {tuple(str(value) for value in row) for row in patched[partition_cols].itertuples(index=False)}
+    for file in [file for file in path.rglob("*") if file.is_file()]:
+        values = tuple(unquote(part.split("=", 1)[1]) for part in file.relative_to(path).parts[:-1])
+        if values in partitions:
+            file.unlink()
+    for directory in sorted((d for d in path.rglob("*") if d.is_dir()), key=lambda d: len(d.parts), reverse=True):
+        if not any(directory.iterdir()):
+            directory.rmdir()
+    if len(patched):
+        categorize(patched).to_parquet(path, index=True, partition_cols=partition_cols)
+
+
+def read_table(path, columns=None, filters=None, index_col=None, geo=None, **csv_options):
+    """
+    Reads a table in the format given by the ending of the path
+    :param path: Path of the file
+    :param columns: Columns to read, by default all of them
+    :param filters: Filters of pyarrow in the form [("Country", "in", ["Germany"])], the partitions of a Parquet
+    dataset that do not match are not read, the other formats are filtered after reading
+    :param index_col: Column used as index if it is not already stored as index
+    :param geo: If True a GeoDataFrame is returned, by default it depends on how the table was written
+    :param csv_options: Options of pandas.read_csv, used only for csv files
+    :return: DataFrame or GeoDataFrame
+    """
+    ending = table_format(path)
+    if ending == ".csv":
+        if columns is not None:
+            csv_options["usecols"] = columns
+        df = pd.read_csv(path, index_col=index_col, **csv_options)
+        return df if filters is None else df[filter_mask(df, filters)]
+    geo = is_geo_table(path) if geo is None else geo
+    if ending == ".parquet" and not geo:
+        df = pd.read_parquet(path, columns=columns, filters=filters)
+    else:
+        if geo:
+            import geopandas as gpd
+            reader = gpd.read_parquet if ending == ".parquet" else gpd.read_feather
+        else:
+            reader = pd.read_feather
+        df = reader(path, columns=columns)
+        if filters is not None:
+            df = df[filter_mask(df, filters)]
+    if index_col is not None and index_col in df.columns:
+        df = df.set_index(index_col)
+    return df
+
+
+def filter_mask(df, filters):
+    """
+    Mask of the rows matching filters in the form of pyarrow, for the readers that do not support them
+    """
+    operations = {"==": lambda s, v: s == v, "!=": lambda s, v: s != v, "<": lambda s, v: s < v,
+                  "<=": lambda s, v: s <= v, ">": lambda s, v: s > v, ">=": lambda s, v: s >= v,
+                  "in": lambda s, v: s.isin(v), "not in": lambda s, v: ~s.isin(v)}
+    mask = pd.Series(True, index=df.index)
+    for column, operation, value in filters:
+        mask &= operations[operation](df[column], value)
+    return mask.to_numpy()
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.harmonization.cost_calculations import ref_input_cols, cc_input_cols, ref_output_cols, cc_output_cols, \
+    general_input_cols
+
+FUEL_MATCH = {"Hard Coal": "coal", "Lignite": "coal", "Natural Gas": "natural_gas", "Bioenergy": "bioenergy"}
+
+
+@pytest.fixture
+def studies():
+    """
+    Random studies where part of the reported LCOE components, fixed O&M costs and capture data are missing
+    """
+    n = 200
+    rng = np.random.default_rng(0)
+    columns = list(dict.fromkeys(ref_input_cols + cc_input_cols + ref_output_cols + cc_output_cols +
+                                 general_input_cols + ["fuel_emission_factor", "capture_efficiency"]))
+    df = pd.DataFrame(rng.uniform(0.1, 2, (n, len(columns))), columns=columns)
+    for column in ref_output_cols + cc_output_cols + ["fixed_om", "fixed_om_cc"]:
+        df.loc[rng.random(n) < 0.5, column] = np.nan
+    df.loc[rng.random(n) < 0.1, "capture_efficiency"] = 0
+    return df
+
+
+@pytest.fixture
+def plants():
+    """
+    Random power plants of the fuels of the cost matching with their matched fuel
+    """
+    n = 100
+    rng = np.random.default_rng(0)
+    data = pd.DataFrame({"Fueltype": rng.choice(list(FUEL_MATCH), n), "Capacity": rng.uniform(50, 1000, n),
+                         "predicted_efficiency": rng.uniform(0.3, 0.6, n)},
+                        index=pd.Index(np.arange(n) + 1000, name="id"))
+    data["fuel_match"] = data["Fueltype"].map(FUEL_MATCH)
+    return data
+
+
+@pytest.fixture
+def matched_plants(plants):
+    """
+    Random power plants with the delta values of the cost matching
+    """
+    rng = np.random.default_rng(1)
+    n = len(plants)
+    return plants.assign(delta_capex=rng.uniform(500, 2500, n), delta_om=rng.uniform(0.001, 0.004, n),
+                         heatrate=rng.uniform(6000, 11000, n), delta_heatrate=rng.uniform(1000, 3000, n))
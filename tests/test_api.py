@@ -0,0 +1,12 @@
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).parents[1]
+
+
+def test_import_does_not_load_configuration():
+    # A fresh interpreter, the other tests already created the configuration
+    code = "import src.api; from src.tools.config_loader import Configuration; " \
+           "assert Configuration._Configuration__instance is None"
+    subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True)
@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.harmonization.cost_calculations import calc_cc_lcoe_df, ref_output_cols, cc_output_cols
+
+
+def test_lcoe_of_hand_checked_studies():
+    # The first study reports no LCOE components, the second reports all of them and has no capture data
+    nan = np.nan
+    df = pd.DataFrame({"capital_cost": [2190, 1], "capital_cost_cc": [4380, 1], "FCF": [0.1, 0.1],
+                       "fixed_om": [43, nan], "fixed_om_cc": [86, nan], "variable_om": [0.002, 1],
+                       "variable_om_cc": [0.003, 1], "heat_rate": [9000, 1], "heat_rate_cc": [12000, 1],
+                       "fuel_cost": [2, 1], "capacity_factor": [0.5, 0.5], "power_net": [500, 500],
+                       "lcoe_capex": [nan, 0.04], "lcoe_om": [nan, 0.01], "lcoe_fu": [nan, 0.02],
+                       "lcoe_capex_cc": [nan, 0.07], "lcoe_om_cc": [nan, 0.015], "lcoe_fu_cc": [nan, 0.03],
+                       "fuel_emission_factor": [0.1, 0.1], "capture_efficiency": [0.5, 0]})
+    result = calc_cc_lcoe_df(df)
+    # 2190 * 0.1 / (0.5 * 8760) + 43 / (0.5 * 8600) + 0.002 + 9000 * 2 / 1e6
+    assert result["lcoe"].to_list() == pytest.approx([0.05 + 0.012 + 0.018, 0.07])
+    assert result["lcoe_cc"].to_list() == pytest.approx([0.1 + 0.023 + 0.024, 0.115])
+    # 12000 * 0.1 * 0.5 captured
+    assert result["captured"].to_list() == pytest.approx([600, 0])
+    assert result["cost_of_cc"].iloc[0] == pytest.approx(1000 * 0.067 / 600)
+    assert result["cc_capex"].iloc[0] == pytest.approx(1000 * 0.05 / 600)
+    assert result["cost_of_cc"].iloc[1] == np.inf
+
+
+def test_reported_lcoe_components_are_kept(studies):
+    result = calc_cc_lcoe_df(studies.copy())
+    for column in ref_output_cols + cc_output_cols:
+        reported = studies[column].notna()
+        pd.testing.assert_series_equal(result.loc[reported, column], studies.loc[reported, column])
+        assert result[column].notna().all()
+    np.testing.assert_allclose(result["lcoe"], result[ref_output_cols].sum(axis=1))
+    np.testing.assert_allclose(result["lcoe_cc"], result[cc_output_cols].sum(axis=1))
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.homogenization.cost_of_carbon_capture_powerplants import calculate_capex_lcoe_dataframe, \
+    calculate_om_lcoe_dataframe, calculate_fuel_lcoe_dataframe, calculate_reference_emissions_dataframe, \
+    calculate_yearly_emissions_dataframe, map_capacity_factor, default_values
+from src.tools.config_loader import current_config, use_config
+
+
+def fuel_map():
+    # The order differs from the configured fuels so the lookups have to go through the fuel codes
+    return pd.DataFrame({"fuel_cost": [7.5, 2.1, 1.4, 3.3], "emission_factor": [56.1, 94.6, 101.0, 100.0]},
+                        index=["Natural Gas", "Hard Coal", "Lignite", "Bioenergy"])
+
+
+@pytest.fixture
+def config():
+    with use_config(current_config().override(True, "InputHomogenization", "IncludeBio")) as config:
+        yield config
+
+
+def test_lcoe_columns(config, matched_plants):
+    data, map = matched_plants, fuel_map()
+    fcf = default_values()["FCF"]
+    cf = data["Fueltype"].map(map_capacity_factor)
+    result = calculate_fuel_lcoe_dataframe(calculate_om_lcoe_dataframe(calculate_capex_lcoe_dataframe(data.copy())),
+                                           map)
+    np.testing.assert_allclose(result["capex_lcoe"], data["delta_capex"] * fcf / (cf * 8760), rtol=1e-12)
+    np.testing.assert_allclose(result["om_lcoe"], data["delta_om"], rtol=1e-12)
+    np.testing.assert_allclose(result["fuel_lcoe"],
+                               data["delta_heatrate"] * data["Fueltype"].map(map["fuel_cost"]) / 1e6, rtol=1e-12)
+
+
+def test_emission_columns(config, matched_plants):
+    data, map = matched_plants, fuel_map()
+    capture_efficiency = default_values()["CaptureEfficiency"]
+    result = calculate_yearly_emissions_dataframe(calculate_reference_emissions_dataframe(data.copy(), map))
+    captured_ref = (data["heatrate"] + data["delta_heatrate"]) * data["Fueltype"].map(map["emission_factor"]) * \
+        capture_efficiency
+    cf = data["Fueltype"].map(map_capacity_factor)
+    np.testing.assert_allclose(result["captured_ref"], captured_ref, rtol=1e-12)
+    np.testing.assert_allclose(result["captured"], captured_ref * data["Capacity"] * cf * 8760 / 1000000, rtol=1e-12)
+
+
+def test_unknown_fuel_raises(config, matched_plants):
+    matched_plants.loc[matched_plants.index[0], "Fueltype"] = "Hydro"
+    with pytest.raises(ValueError):
+        calculate_capex_lcoe_dataframe(matched_plants)
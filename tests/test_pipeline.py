@@ -0,0 +1,53 @@
+import pandas as pd
+from src.harmonization.cost_transformation_functions import create_index_map
+from src.tools.config_loader import current_config
+from src.tools.pipeline import Pipeline, Stage
+
+INDEX_SOURCES = ["ihs_path", "cepci_path", "coalidx_path", "eurusd_path", "ngidx_path"]
+
+
+def write_index_map():
+    create_index_map([2018, 2019]).to_csv(current_config()["IO"]["test_output_csv"], index=False)
+
+
+def index_config(tmp_path):
+    """
+    Configuration reading synthetic index sources, the CEPCI file has a second column with other values
+    """
+    pd.DataFrame({"YEAR": [2018, 2019], "UOCI": [1.0, 1.1], "UCCI": [2.0, 2.2]}).to_csv(tmp_path / "ihs.csv",
+                                                                                      sep=";", index=False)
+    pd.DataFrame({"Year": [2018, 2019], "CEPCI": [600.0, 610.0], "CEPCI_alt": [500.0, 550.0]}).to_csv(
+        tmp_path / "cepci.csv", sep=";", index=False)
+    pd.DataFrame({"Year": [2018, 2019], "Nominal": [80.0, 70.0]}).to_csv(tmp_path / "coal.csv", sep=";",
+                                                                        index=False)
+    pd.DataFrame({"Date": ["2018-01-01", "2019-01-01"], "USD": [1.2, 1.1]}).to_csv(tmp_path / "eurusd.csv",
+                                                                                  index=False)
+    (tmp_path / "ng.csv").write_text("Date;Rate\n2018-01-01;3,1\n2019-01-01;2,6\n")
+    config = current_config()
+    paths = {"ihs_path": "ihs.csv", "cepci_path": "cepci.csv", "coalidx_path": "coal.csv",
+             "eurusd_path": "eurusd.csv", "ngidx_path": "ng.csv", "test_output_csv": "index_map.csv",
+             "harmonization_index_store_path": "index_store.npz"}
+    for key, name in paths.items():
+        config = config.override(tmp_path / name, "IO", key)
+    return config
+
+
+def run(config, tmp_path):
+    stage = Stage("index_map", write_index_map, inputs=INDEX_SOURCES, outputs=["test_output_csv"],
+                  config_keys=[("InputConfig", "index")])
+    pipeline = Pipeline([stage], config["IO"], config, tmp_path / "cache", tmp_path / "manifest.json")
+    executed = pipeline.run()
+    return executed, pd.read_csv(config["IO"]["test_output_csv"])
+
+
+def test_index_settings_of_snapshot_are_used(tmp_path):
+    config = index_config(tmp_path)
+    variant = config.override("CEPCI_alt", "InputConfig", "index", "cepci", "value_column")
+    _, reference = run(config, tmp_path)
+    _, changed = run(variant, tmp_path)
+    assert reference["CEPCI"].to_list() == [600.0, 610.0]
+    assert changed["CEPCI"].to_list() == [500.0, 550.0]
+    # The artifact of the first snapshot is restored with its own values
+    executed, restored = run(config, tmp_path)
+    assert executed == []
+    pd.testing.assert_frame_equal(restored, reference)
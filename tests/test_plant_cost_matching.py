@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.homogenization.plant_cost_matching import add_assumptions, do_hr_regression, bio_map
+from src.tools.config_loader import current_config, use_config
+
+LEVELS = ["range_low", "reference_value", "range_high"]
+
+
+def matching_config(tmp_path, cost_level, hr_level):
+    assumptions = pd.DataFrame({"fuel_type": 3 * ["coal"] + 3 * ["natural_gas"],
+                                "value": 2 * ["delta_capex", "delta_om", "delta_heatrate"],
+                                "range_low": [1000, 0.001, 1500, 600, 0.002, 900],
+                                "reference_value": [1500, 0.002, 2500, 900, 0.003, 1200],
+                                "range_high": [2000, 0.003, 3500, 1200, 0.004, 1500]})
+    assumptions.to_csv(tmp_path / "assumptions.csv", index=False)
+    pd.DataFrame({"Fuel": ["coal"], "slope": [0.2], "intercept": [100.0], "slope_err": [0.05],
+                  "intersect_err": [10.0]}).to_csv(tmp_path / "regression.csv", index=False)
+    config = current_config().override(tmp_path / "assumptions.csv", "IO", "harmonization_output_assumption_path")
+    config = config.override(tmp_path / "regression.csv", "IO", "harmonization_output_regression_path")
+    config = config.override(True, "InputHomogenization", "IncludeBio")
+    config = config.override(cost_level, "InputHomogenization", "CostLevel")
+    return config.override(hr_level, "InputHomogenization", "HRLevel"), pd.concat([assumptions, bio_map])
+
+
+@pytest.mark.parametrize("cost_level", LEVELS)
+@pytest.mark.parametrize("hr_level", LEVELS)
+def test_assumptions_of_matched_fuel_and_level(tmp_path, plants, cost_level, hr_level):
+    config, assumptions = matching_config(tmp_path, cost_level, hr_level)
+    with use_config(config):
+        result = add_assumptions(plants.copy())
+    table = assumptions.set_index(["fuel_type", "value"])
+    for name, level in [("delta_capex", cost_level), ("delta_om", cost_level), ("delta_heatrate", hr_level)]:
+        expected = table.loc[[(fuel, name) for fuel in plants["fuel_match"]], level]
+        np.testing.assert_array_equal(result[name].to_numpy(), expected.to_numpy())
+    pd.testing.assert_frame_equal(result[plants.columns], plants)
+
+
+@pytest.mark.parametrize("hr_level", LEVELS)
+def test_hr_regression_of_coal_plants(tmp_path, plants, hr_level):
+    config, _ = matching_config(tmp_path, "reference_value", hr_level)
+    with use_config(config):
+        data = add_assumptions(plants)
+        result = do_hr_regression(data.copy())
+    correction = {"range_low": -1, "reference_value": 0, "range_high": 1}[hr_level]
+    slope, intercept = 0.2 + 0.05 * correction, 100.0 + 10.0 * correction
+    heatrate = 3600 / data["predicted_efficiency"]
+    expected = np.where(data["fuel_match"] == "coal", slope * heatrate + intercept, data["delta_heatrate"])
+    np.testing.assert_allclose(result["delta_heatrate"].to_numpy(), expected, rtol=1e-12)
+    np.testing.assert_allclose(result["heatrate"].to_numpy(), heatrate.to_numpy())
+
+
+def test_unknown_fuel_raises(tmp_path, plants):
+    config, _ = matching_config(tmp_path, "reference_value", "reference_value")
+    plants.loc[plants.index[0], "fuel_match"] = "hydrogen"
+    with use_config(config), pytest.raises(ValueError):
+        add_assumptions(plants)
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.harmonization.unit_transformation_functions import hr_dimension_match, hr_dimension_match_array, \
+    plant_emf_dimension_match, plant_emf_dimension_match_array, fuel_emf_dimension_match, \
+    fuel_emf_dimension_match_array, fom_harmonization, fom_harmonization_array, fuel_dimension_match, \
+    fuel_dimension_match_array, unit_factors, hr_unit_factors
+
+HR_UNITS = ["KJ_KWH", "BTU_KWH", "GJ_MWH", "mj_kwh", "MMBTU_MWH", "KJ", "TJ_KWH"]
+EF_PLANT_UNITS = ["KG_KWH", "LB_MWH", "TON_MWH", "kg_mj", "g_kwh", np.nan]
+EF_FUEL_UNITS = ["KG_GJ", "LB_MMBTU", "TON_KJ", "kg_mj", np.nan]
+FOM_UNITS = ["EUR_KW", "EUR_KWY", "EUR_Y", "EUR", "EUR_MWH", np.nan]
+FC_UNITS = ["USD_TON", "USD_MMBTU", "USD_GJ", "USD", np.nan]
+FUELS = ["illinois_6", "Lignite", "Bituminous", "natural_gas"]
+
+
+def column(units, n=60, seed=0):
+    """
+    Random values with units taken from the list, every tenth value is missing
+    """
+    rng = np.random.default_rng(seed)
+    values = rng.uniform(1, 100, n)
+    values[::10] = np.nan
+    return values, pd.Series(rng.choice(np.array(units, dtype=object), n))
+
+
+def scalar(function, values, units, *args):
+    return np.array([function(value, unit, *(arg[i] for arg in args)) for i, (value, unit) in
+                     enumerate(zip(values, units))], dtype=float)
+
+
+def test_unit_factors_are_parsed_per_row():
+    units = pd.Series(["KJ_KWH", np.nan, "GJ_MWH", "KJ_KWH"])
+    factors = unit_factors(units, hr_unit_factors)
+    np.testing.assert_array_equal(factors, [hr_unit_factors(u) for u in units])
+
+
+def test_dimension_match_arrays_match_scalars():
+    cases = [(hr_dimension_match, hr_dimension_match_array, HR_UNITS),
+             (plant_emf_dimension_match, plant_emf_dimension_match_array, EF_PLANT_UNITS),
+             (fuel_emf_dimension_match, fuel_emf_dimension_match_array, EF_FUEL_UNITS)]
+    for scalar_function, array_function, units in cases:
+        values, unit_column = column(units)
+        np.testing.assert_allclose(array_function(values, unit_column), scalar(scalar_function, values, unit_column),
+                                   rtol=1e-12)
+
+
+def test_fom_harmonization_array_matches_scalar():
+    values, units = column(FOM_UNITS)
+    rng = np.random.default_rng(1)
+    power, life = rng.uniform(100, 1000, len(values)), rng.uniform(20, 40, len(values))
+    np.testing.assert_allclose(fom_harmonization_array(values, units, power, life),
+                               scalar(fom_harmonization, values, units, power, life), rtol=1e-12)
+
+
+def test_fuel_dimension_match_array_matches_scalar():
+    values, units = column(FC_UNITS)
+    fuel = np.random.default_rng(2).choice(FUELS, len(values))
+    np.testing.assert_allclose(fuel_dimension_match_array(values, units, fuel),
+                               scalar(fuel_dimension_match, values, units, fuel), rtol=1e-12)
+
+
+def test_heat_rates_without_units_raise():
+    units = pd.Series(["KJ_KWH", np.nan, np.nan])
+    np.testing.assert_allclose(hr_dimension_match_array(np.array([1.0, np.nan, np.nan]), units)[0], 1.0)
+    with pytest.raises(ValueError):
+        hr_dimension_match_array(np.array([1.0, np.nan, 2.0]), units)